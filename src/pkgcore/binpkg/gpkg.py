@@ -0,0 +1,444 @@
+"""
+GPKG binary package support
+
+GPKG packages (see GLEP 78) are uncompressed tar archives holding a format
+marker, a compressed archive of the package metadata and a compressed archive
+of the package image::
+
+    foo-1/gpkg-1
+    foo-1/metadata.tar.zst
+    foo-1/image.tar.zst
+
+Since the container itself isn't compressed, its members are read in place;
+the metadata is accessible without decompressing the image.  Members are
+compressed and decompressed by streaming through the multithreaded
+compression tools where available, falling back to the python modules.
+"""
+
+__all__ = ("Gpkg", "MalformedGpkg", "compressors", "write_gpkg")
+
+import os
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from importlib import import_module
+from io import BytesIO
+
+from snakeoil import klass, process
+
+from ..exceptions import PkgcoreException
+from ..fs import tar
+from ..fs._tar import tarfile as image_tarfile
+
+
+class MalformedGpkg(PkgcoreException):
+    def __init__(self, path, msg):
+        super().__init__(f"malformed gpkg {path!r}: {msg}")
+        self.path = path
+        self.msg = msg
+
+
+class _Compressor:
+    """Compression format used for GPKG members.
+
+    :param name: compressor name
+    :param extension: member file extension
+    :param binaries: sequence of (binary, compression args, decompression args)
+        tuples, in order of preference
+    :param module: python module used if none of the binaries are available
+    :param level_kwarg: compression level keyword of the module's open function
+    """
+
+    def __init__(self, name, extension, binaries, module, level_kwarg):
+        self.name = name
+        self.extension = extension
+        self.binaries = binaries
+        self.module_name = module
+        self.level_kwarg = level_kwarg
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name}>"
+
+    @klass.jit_attr
+    def binary(self):
+        for binary, compress_args, decompress_args in self.binaries:
+            try:
+                path = process.find_binary(binary)
+            except process.CommandNotFound:
+                continue
+            return path, compress_args, decompress_args
+        return None
+
+    @klass.jit_attr
+    def module(self):
+        try:
+            return import_module(self.module_name)
+        except ImportError:
+            return None
+
+    @property
+    def available(self):
+        return self.binary is not None or self.module is not None
+
+    def _unavailable(self):
+        names = ", ".join(x[0] for x in self.binaries)
+        return PkgcoreException(
+            f"{self.name} support requires one of: {names} or the "
+            f"{self.module_name} python module"
+        )
+
+    def compress(self, handle, level=None):
+        """Return a writable stream compressing into an open file."""
+        if self.binary is not None:
+            binary, args, _ = self.binary
+            args = [binary, *args, "-c"]
+            if level is not None:
+                args.append(f"-{level}")
+            return _ProcessWriter(args, handle)
+        if self.module is not None:
+            kwds = {} if level is None else {self.level_kwarg: level}
+            return self.module.open(handle, "wb", **kwds)
+        raise self._unavailable()
+
+    def decompress(self, path, offset, size):
+        """Return a readable stream decompressing a range of a file."""
+        if self.binary is not None:
+            binary, _, args = self.binary
+            return _ProcessReader([binary, *args, "-c"], path, offset, size)
+        if self.module is not None:
+            return self.module.open(_FileRange(path, offset, size), "rb")
+        raise self._unavailable()
+
+
+# in order of preference; multithreaded implementations first
+compressors = {
+    x.name: x
+    for x in (
+        _Compressor(
+            "zstd",
+            ".zst",
+            (("zstd", ("-q", "-T0"), ("-q", "-d")),),
+            "compression.zstd",
+            "level",
+        ),
+        _Compressor("xz", ".xz", (("xz", ("-T0",), ("-d", "-T0")),), "lzma", "preset"),
+        _Compressor(
+            "bzip2",
+            ".bz2",
+            (
+                ("lbzip2", (), ("-d",)),
+                ("pbzip2", (), ("-d",)),
+                ("bzip2", (), ("-d",)),
+            ),
+            "bz2",
+            "compresslevel",
+        ),
+        _Compressor(
+            "gzip",
+            ".gz",
+            (("pigz", (), ("-d",)), ("gzip", (), ("-d",))),
+            "gzip",
+            "compresslevel",
+        ),
+    )
+}
+
+
+class _FileRange:
+    """Read-only file object restricted to a range of a file."""
+
+    def __init__(self, path, offset, size):
+        self._handle = open(path, "rb")  # noqa: SIM115
+        self._start = offset
+        self._end = offset + size
+        self._handle.seek(offset)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        remaining = self._end - self._handle.tell()
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self._handle.read(size)
+
+    def readinto(self, buf):
+        data = self.read(len(buf))
+        buf[: len(data)] = data
+        return len(data)
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.tell()
+        elif whence == os.SEEK_END:
+            offset += self._end - self._start
+        offset = max(0, min(offset, self._end - self._start))
+        self._handle.seek(self._start + offset)
+        return offset
+
+    def tell(self):
+        return self._handle.tell() - self._start
+
+    def close(self):
+        self._handle.close()
+
+    @property
+    def closed(self):
+        return self._handle.closed
+
+
+class _ProcessWriter:
+    """Writable stream compressed by an external process into an open file."""
+
+    def __init__(self, args, handle):
+        self.args = args
+        self._process = subprocess.Popen(
+            args, stdin=subprocess.PIPE, stdout=handle, stderr=subprocess.PIPE
+        )
+
+    def write(self, data):
+        self._process.stdin.write(data)
+        return len(data)
+
+    def close(self):
+        if self._process.returncode is not None:
+            return
+        self._process.stdin.close()
+        stderr = self._process.stderr.read()
+        self._process.stderr.close()
+        if self._process.wait():
+            raise PkgcoreException(
+                f"{self.args[0]} failed with exit code "
+                f"{self._process.returncode}: {stderr.decode(errors='replace').strip()}"
+            )
+
+
+class _ProcessReader:
+    """Readable stream decompressing a file range via an external process.
+
+    Forward seeks read and discard data, backward seeks restart the process.
+    """
+
+    def __init__(self, args, path, offset, size):
+        self.args = args
+        self._source = (path, offset, size)
+        self._process = None
+        self._start()
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            self.args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._feeder = threading.Thread(
+            target=self._feed, args=(self._process.stdin,), daemon=True
+        )
+        self._feeder.start()
+        self.position = 0
+
+    def _feed(self, pipe):
+        path, offset, size = self._source
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while size:
+                    data = f.read(min(size, 1 << 20))
+                    if not data:
+                        break
+                    pipe.write(data)
+                    size -= len(data)
+        except (BrokenPipeError, ValueError):
+            # decompressor exited early or the stream was closed
+            pass
+        finally:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._process.stdout.read()
+        else:
+            data = self._process.stdout.read(size)
+        self.position += len(data)
+        return data
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            position += self.position
+        elif whence != os.SEEK_SET:
+            raise OSError("decompression streams don't support seeking from the end")
+        if position < self.position:
+            self._stop()
+            self._start()
+        while position > self.position:
+            if not self.read(min(position - self.position, 1 << 16)):
+                break
+        return self.position
+
+    def _stop(self):
+        if self._process is None:
+            return
+        self._process.stdout.close()
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._feeder.join()
+        self._process = None
+
+    def close(self):
+        self._stop()
+
+    def __del__(self):
+        self._stop()
+
+
+class Gpkg:
+    """GPKG binary package.
+
+    :param path: location of the package
+    """
+
+    marker = "gpkg-1"
+
+    def __init__(self, path):
+        self.path = path
+
+    @klass.jit_attr
+    def members(self):
+        """Mapping of member names to (offset, size) tuples of their data."""
+        members = {}
+        try:
+            with tarfile.open(self.path, "r:") as archive:
+                for member in archive:
+                    if not member.isreg():
+                        continue
+                    # members are stored in a top level directory
+                    _, _, name = member.name.partition("/")
+                    members[name] = (member.offset_data, member.size)
+        except tarfile.TarError as e:
+            raise MalformedGpkg(self.path, str(e)) from e
+        if self.marker not in members:
+            raise MalformedGpkg(self.path, f"missing {self.marker!r} format marker")
+        return members
+
+    def _open_member(self, name):
+        """Open a decompressed stream of a member archive."""
+        for member, (offset, size) in self.members.items():
+            if member == name:
+                return _FileRange(self.path, offset, size)
+            if not member.startswith(f"{name}."):
+                continue
+            ext = member[len(name) :]
+            for compressor in compressors.values():
+                if compressor.extension == ext:
+                    return compressor.decompress(self.path, offset, size)
+            raise MalformedGpkg(self.path, f"unsupported compression: {member!r}")
+        raise MalformedGpkg(self.path, f"missing {name!r} archive")
+
+    @klass.jit_attr
+    def metadata(self):
+        """Mapping of metadata keys to their values.
+
+        Environment values are returned as bytes, everything else decoded.
+        """
+        metadata = {}
+        handle = self._open_member("metadata.tar")
+        try:
+            with tarfile.open(fileobj=handle, mode="r|") as archive:
+                for member in archive:
+                    if not member.isreg():
+                        continue
+                    key = member.name.split("/", 1)[-1]
+                    data = archive.extractfile(member).read()
+                    if not key.startswith("environment"):
+                        data = data.decode()
+                    metadata[key] = data
+        except tarfile.TarError as e:
+            raise MalformedGpkg(self.path, f"metadata: {e}") from e
+        finally:
+            handle.close()
+        return metadata
+
+    def contents(self):
+        """Generate a contents set of the package image."""
+        handle = self._open_member("image.tar")
+        try:
+            archive = image_tarfile.TarFile(name=self.path, fileobj=handle, mode="r")
+        except image_tarfile.ReadError as e:
+            if not str(e).endswith("empty header"):
+                raise MalformedGpkg(self.path, f"image: {e}") from e
+            archive = []
+        return tar.convert_archive(archive, prefix="image")
+
+
+def _add_member(archive, name, handle, size):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = 0o644
+    info.mtime = int(time.time())
+    info.uname = info.gname = "root"
+    archive.addfile(info, fileobj=handle)
+
+
+def _write_member(archive, name, compressor, level, writer):
+    """Write a compressed archive into the container via a temporary file."""
+    directory = os.path.dirname(os.path.abspath(archive.name))
+    with tempfile.TemporaryFile(dir=directory) as tmp:
+        stream = compressor.compress(tmp, level=level)
+        try:
+            with image_tarfile.open(fileobj=stream, mode="w|") as member:
+                writer(member)
+        finally:
+            stream.close()
+        size = tmp.seek(0, os.SEEK_END)
+        tmp.seek(0)
+        _add_member(archive, f"{name}{compressor.extension}", tmp, size)
+
+
+def write_gpkg(path, basename, metadata, contents_set, compressor="zstd", level=None):
+    """Write a GPKG binary package.
+
+    :param path: location to write the package to
+    :param basename: name of the top level directory, e.g. ``foo-1``
+    :param metadata: mapping of metadata keys to string or bytes values
+    :param contents_set: :obj:`pkgcore.fs.contents.contentsSet` of the image
+    :param compressor: name of the compressor used for the archives, see
+        :obj:`compressors`
+    :param level: compression level, defaults to the compressor's default
+    """
+    compressor = compressors[compressor]
+
+    def write_metadata(archive):
+        for key, value in sorted(metadata.items()):
+            if isinstance(value, str):
+                value = value.encode()
+            info = image_tarfile.TarInfo(f"metadata/{key}")
+            info.size = len(value)
+            info.mode = 0o644
+            info.mtime = int(time.time())
+            archive.addfile(info, fileobj=BytesIO(value))
+
+    def write_image(archive):
+        tar.add_contents_to_tarfile(contents_set, archive, prefix="image")
+
+    with tarfile.open(path, "w", format=tarfile.USTAR_FORMAT) as archive:
+        _add_member(archive, f"{basename}/{Gpkg.marker}", None, 0)
+        _write_member(
+            archive, f"{basename}/metadata.tar", compressor, level, write_metadata
+        )
+        _write_member(archive, f"{basename}/image.tar", compressor, level, write_image)
@@ -5,16 +5,19 @@ Currently this primarily just holds the Packages cache used for remote, and
 local binpkg repositories
 """
 
-__all__ = ("PackagesCacheV0", "PackagesCacheV1")
+__all__ = ("PackagesCacheV0", "PackagesCacheV1", "PackagesIndex")
 
+import mmap
 import os
+import re
 import typing
+from collections.abc import MutableMapping
 from operator import itemgetter
 from time import time
 
 from snakeoil.chksum import get_chksums
 from snakeoil.containers import RefCountingSet
-from snakeoil.fileutils import AtomicWriteFile, readlines
+from snakeoil.fileutils import AtomicWriteFile
 from snakeoil.mappings import ImmutableDict, StackedDict
 
 from .. import cache
@@ -30,6 +33,113 @@ def _iter_till_empty_newline(data):
         yield k, v.strip()
 
 
+def _iter_entry(data):
+    """Yield the (key, value) pairs of a raw Packages entry."""
+    return _iter_till_empty_newline(
+        x.strip() for x in data.decode("utf8", "replace").split("\n")
+    )
+
+
+_cpv_re = re.compile(rb"^CPV:[ \t]*(\S+)", re.MULTILINE)
+_category_re = re.compile(rb"^CATEGORY:[ \t]*(\S+)", re.MULTILINE)
+_pf_re = re.compile(rb"^PF:[ \t]*(\S+)", re.MULTILINE)
+
+
+class PackagesIndex(MutableMapping):
+    """Lazily parsed entries of a Packages file.
+
+    The byte ranges of all entries are indexed in a single pass over the
+    file, entries themselves are parsed on access.
+
+    :param cache: :obj:`PackagesCacheV0` instance the entries are parsed for
+    :param buf: file contents, either bytes or a :obj:`mmap.mmap` instance
+    :param start: offset of the first entry
+    :param stat: stat result of the file when it was indexed
+    """
+
+    def __init__(self, cache, buf, start, stat):
+        self._cache = cache
+        self.buf = buf
+        self.stat = stat
+        # size of the preamble on disk, excluding its terminating empty line
+        self.preamble_size = start - 1
+        # cpv -> (start, end) byte ranges of entries on disk
+        self.offsets = {}
+        # parsed or updated entries
+        self.entries = {}
+        # cpvs of entries written to the file after it was indexed
+        self.written = set()
+        self._index(start)
+
+    def _index(self, pos):
+        buf = self.buf
+        size = len(buf)
+        while pos < size:
+            end = buf.find(b"\n\n", pos)
+            if end == -1:
+                end = size
+            if end == pos:
+                # an empty entry terminates the file
+                break
+            if match := _cpv_re.search(buf, pos, end):
+                cpv = match.group(1).decode()
+            else:
+                category = _category_re.search(buf, pos, end)
+                pf = _pf_re.search(buf, pos, end)
+                if category is None or pf is None:
+                    break
+                cpv = f"{category.group(1).decode()}/{pf.group(1).decode()}"
+            self.offsets[cpv] = (pos, end)
+            pos = end + 2
+
+    def on_disk(self, cpv):
+        """Return True if the file holds an entry for a cpv."""
+        return cpv in self.offsets or cpv in self.written
+
+    def raw(self, cpv):
+        """Return the unparsed entry for a cpv if it's unmodified, else None."""
+        if cpv in self.entries or cpv not in self.offsets:
+            return None
+        start, end = self.offsets[cpv]
+        return self.buf[start:end]
+
+    def __getitem__(self, cpv):
+        try:
+            return self.entries[cpv]
+        except KeyError:
+            start, end = self.offsets[cpv]
+        entry = self._cache._parse_entry(_iter_entry(self.buf[start:end]))
+        self.entries[cpv] = entry
+        return entry
+
+    def __setitem__(self, cpv, value):
+        self.entries[cpv] = value
+
+    def __delitem__(self, cpv):
+        found = self.offsets.pop(cpv, None) is not None
+        self.written.discard(cpv)
+        if self.entries.pop(cpv, None) is None and not found:
+            raise KeyError(cpv)
+
+    def __contains__(self, cpv):
+        return cpv in self.entries or cpv in self.offsets
+
+    def __iter__(self):
+        yield from self.offsets
+        for cpv in self.entries:
+            if cpv not in self.offsets:
+                yield cpv
+
+    def __len__(self):
+        return len(self.offsets) + sum(
+            1 for cpv in self.entries if cpv not in self.offsets
+        )
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+
+
 class CacheEntry(StackedDict):
     """Customized version of StackedDict blocking pop from modifying the target.
 
@@ -111,6 +221,9 @@ class PackagesCacheV0(cache.bulk):
 
     version = 0
 
+    # map the file when reading it instead of loading it into memory
+    use_mmap = True
+
     def __init__(self, location, *args, **kwds):
         self._location = location
         vkeys = {"CPV"}
@@ -119,21 +232,31 @@ class PackagesCacheV0(cache.bulk):
         kwds["auxdbkeys"] = vkeys
         super().__init__(*args, **kwds)
 
-    def _handle(self):
-        return readlines(self._location, True, False, False)
-
     def read_preamble(self, handle):
         return ImmutableDict(
             (self._header_mangling_map.get(k, k), v)
             for k, v in _iter_till_empty_newline(handle)
         )
 
+    def _read_buffer(self, f, size):
+        if self.use_mmap and size:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
     def _read_data(self):
         try:
-            handle = self._handle()
+            with open(self._location, "rb") as f:
+                st = os.fstat(f.fileno())
+                buf = self._read_buffer(f, st.st_size)
         except FileNotFoundError:
             return {}
-        self.preamble = self.read_preamble(handle)
+        end = buf.find(b"\n\n")
+        if end == -1:
+            end = len(buf)
+        self.raw_preamble = dict(_iter_entry(buf[:end]))
+        self.preamble = self.read_preamble(
+            x.strip() for x in buf[:end].decode().split("\n")
+        )
 
         defaults = dict(self._deserialized_defaults.items())
         defaults.update(
@@ -141,31 +264,32 @@ class PackagesCacheV0(cache.bulk):
             for k, v in self.preamble.items()
             if k in self.deserialized_inheritable
         )
-        defaults = ImmutableDict(defaults)
+        self._defaults = ImmutableDict(defaults)
+
+        pkgs = PackagesIndex(self, buf, end + 2, st)
+        count = int(self.preamble.get("PACKAGES", len(pkgs)))
+        if count != len(pkgs):
+            logger.warning(
+                f"binpkg cache {self._location!r} lists {count} packages, "
+                f"found {len(pkgs)}"
+            )
+        return pkgs
 
-        pkgs = {}
-        count = 0
+    def _parse_entry(self, items):
+        """Convert the (key, value) pairs of an entry to a cache entry."""
         vkeys = self._known_keys
-        while True:
-            raw_d = dict(_iter_till_empty_newline(handle))
+        d = {k: v for k, v in items if k in vkeys}
+        d.pop("CPV", None)
+        d.pop("CATEGORY", None)
+        d.pop("PF", None)
 
-            d = {k: v for k, v in raw_d.items() if k in vkeys}
-            if not d:
-                break
-            count += 1
-            cpv = d.pop("CPV", None)
-            if cpv is None:
-                cpv = f"{d.pop('CATEGORY')}/{d.pop('PF')}"
-
-            if "USE" in d:
-                d.setdefault("IUSE", d.get("USE", ""))
-            for src, dst in self._deserialize_map.items():
-                if src in d:
-                    d.setdefault(dst, d.pop(src))
-
-            pkgs[cpv] = CacheEntry(d, defaults)
-        assert count == int(self.preamble.get("PACKAGES", count))
-        return pkgs
+        if "USE" in d:
+            d.setdefault("IUSE", d.get("USE", ""))
+        for src, dst in self._deserialize_map.items():
+            if src in d:
+                d.setdefault(dst, d.pop(src))
+
+        return CacheEntry(d, self._defaults)
 
     @classmethod
     def _assemble_preamble_dict(cls, target_dicts):
@@ -207,17 +331,123 @@ class PackagesCacheV0(cache.bulk):
         return d
 
     def _write_data(self):
+        try:
+            if not (self._append_data() or self._compact_data()):
+                self._rewrite_data()
+        except PermissionError as e:
+            logger.error(f"failed writing binpkg cache to {self._location!r}: {e}")
+
+    def _index_current(self):
+        """Return the loaded index if the file hasn't changed since, else None."""
+        index = self.data
+        if not isinstance(index, PackagesIndex) or not self.raw_preamble:
+            return None
+        try:
+            st = os.stat(self._location)
+        except FileNotFoundError:
+            return None
+        if (st.st_ino, st.st_size, st.st_mtime_ns) != (
+            index.stat.st_ino,
+            index.stat.st_size,
+            index.stat.st_mtime_ns,
+        ):
+            return None
+        return index
+
+    @property
+    def _inherited(self):
+        """Preamble values inherited by the entries of the existing file."""
+        return {
+            k: v
+            for k, v in self.raw_preamble.items()
+            if k in self.deserialized_inheritable
+        }
+
+    def _updated_preamble(self, count):
+        preamble = dict(self.raw_preamble)
+        preamble["PACKAGES"] = str(count)
+        preamble["TIMESTAMP"] = str(int(time()))
+        return "".join(f"{k}: {v}\n" for k, v in preamble.items())
+
+    def _append_data(self):
+        """Append new packages to the existing file.
+
+        Only possible if all pending updates add packages missing from the
+        file, and the rewritten preamble keeps its size.
+        """
+        index = self._index_current()
+        if index is None:
+            return False
+        inherited = self._inherited
+        added = {}
+        for cpv, value in self._pending_updates:
+            if value is None or index.on_disk(cpv):
+                return False
+            added[cpv] = index[cpv]
+
+        preamble = self._updated_preamble(len(index)).encode()
+        if len(preamble) != index.preamble_size:
+            return False
+
+        with open(self._location, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            for cpv in sorted(added):
+                lines = []
+                self._serialize_entry(cpv, added[cpv], inherited, lines.append)
+                f.write("".join(lines).encode())
+            # written after the entries, so an interrupted append only loses
+            # them from the count
+            f.seek(0)
+            f.write(preamble)
+            f.flush()
+            index.stat = os.fstat(f.fileno())
+        index.written.update(added)
+        return True
+
+    def _compact_data(self):
+        """Rewrite the file, copying unmodified entries verbatim."""
+        index = self._index_current()
+        if index is None:
+            return False
+        inherited = self._inherited
+        handler = AtomicWriteFile(self._location, binary=True)
+        preamble = self._updated_preamble(len(index)).encode()
+        try:
+            handler.write(preamble)
+            handler.write(b"\n")
+            for cpv in sorted(index):
+                raw = index.raw(cpv)
+                if raw is not None:
+                    handler.write(raw)
+                    handler.write(b"\n\n")
+                else:
+                    lines = []
+                    self._serialize_entry(cpv, index[cpv], inherited, lines.append)
+                    handler.write("".join(lines).encode())
+            handler.close()
+        finally:
+            handler.discard()
+        index.stat = os.stat(self._location)
+        index.preamble_size = len(preamble)
+        index.written.update(index.entries)
+        return True
+
+    def _rewrite_data(self):
         handler = None
         try:
-            try:
-                handler = AtomicWriteFile(self._location)
-                self._serialize_to_handle(list(self.data.items()), handler)
-                handler.close()
-            except PermissionError as e:
-                logger.error(f"failed writing binpkg cache to {self._location!r}: {e}")
+            handler = AtomicWriteFile(self._location)
+            self._serialize_to_handle(list(self.data.items()), handler)
+            handler.close()
         finally:
             if handler is not None:
                 handler.discard()
+        if isinstance(self.data, PackagesIndex):
+            # entries are all parsed, the file is indexed anew when needed
+            self.data.offsets.clear()
+            self.data.written = set(self.data.entries)
+            # unknown, the next update compacts the file
+            self.data.preamble_size = None
+            self.data.stat = os.stat(self._location)
 
     def _serialize_to_handle(self, data, handler):
         preamble = self._assemble_preamble_dict(data)
@@ -228,29 +458,42 @@ class PackagesCacheV0(cache.bulk):
             handler.write(f"{convert_key(key, key)}: {preamble[key]}\n")
         handler.write("\n")
 
+        for cpv, pkg_data in sorted(data, key=itemgetter(0)):
+            self._serialize_entry(cpv, pkg_data, preamble, handler.write)
+
+    def _serialize_entry(self, cpv, pkg_data, preamble, write):
         spacer = " "
         if self.version != 0:
             spacer = ""
 
+        convert_key = self._serialize_map.get
         vkeys = self._known_keys
-        for cpv, pkg_data in sorted(data, key=itemgetter(0)):
-            handler.write(f"CPV:{spacer}{cpv}\n")
-            data = [(convert_key(key, key), value) for key, value in pkg_data.items()]
-            for write_key, value in sorted(data):
-                if write_key not in vkeys:
-                    continue
-                value = str(value).strip()
-                if write_key in preamble:
-                    if value != preamble[write_key]:
-                        if value:
-                            handler.write(f"{write_key}:{spacer}{value}\n")
-                        else:
-                            handler.write(f"{write_key}:\n")
-                elif value:
-                    handler.write(f"{write_key}:{spacer}{value}\n")
-            handler.write("\n")
+        write(f"CPV:{spacer}{cpv}\n")
+        data = [(convert_key(key, key), value) for key, value in pkg_data.items()]
+        for write_key, value in sorted(data):
+            if write_key not in vkeys:
+                continue
+            value = str(value).strip()
+            if write_key in preamble:
+                if value != preamble[write_key]:
+                    if value:
+                        write(f"{write_key}:{spacer}{value}\n")
+                    else:
+                        write(f"{write_key}:\n")
+            elif value:
+                write(f"{write_key}:{spacer}{value}\n")
+        write("\n")
 
     def update_from_xpak(self, pkg, xpak):
+        new_dict = self.entry_from_xpak(pkg, xpak)
+        self[pkg.cpvstr] = new_dict
+        return new_dict
+
+    def entry_from_xpak(self, pkg, xpak):
+        """Generate the cache entry of a binpkg without storing it.
+
+        This doesn't modify the cache, so it's safe to call from threads.
+        """
         # invert the lookups here; if you do .items() on an xpak,
         # it'll load up the contents in full.
         new_dict = {k: xpak[k] for k in self._known_keys if k in xpak}
@@ -260,7 +503,6 @@ class PackagesCacheV0(cache.bulk):
             if key != "size":
                 value = f"{value:x}"
             new_dict[key.upper()] = value
-        self[pkg.cpvstr] = new_dict
         return new_dict
 
     def update_from_repo(self, repo):
@@ -17,10 +17,11 @@ from os.path import join as pjoin
 from snakeoil.compression import compress_data
 from snakeoil.osutils import ensure_dirs, unlink_if_exists
 
+from .. import operations as operations_mod
 from ..fs import tar
 from ..log import logger
 from ..operations import repo as repo_interfaces
-from . import xpak
+from . import gpkg, xpak
 
 
 def discern_loc(base, pkg, extension=".tbz2"):
@@ -83,14 +84,27 @@ class install(repo_interfaces.install):
                 f"failed creating directory: {os.path.dirname(tmp_path)!r}"
             )
         try:
-            start(f"generating tarball: {tmp_path}")
-            tar.write_set(pkg.contents, tmp_path, compressor="bzip2", parallelize=True)
-            end("tarball created", True)
-            start("writing Xpak")
-            # ok... got a tarball.  now add xpak.
-            xpak.Xpak.write_xpak(tmp_path, generate_attr_dict(pkg))
-            end("wrote Xpak", True)
-            # ok... we tagged the xpak on.
+            if self.repo.binpkg_format == "gpkg":
+                start(f"generating gpkg: {tmp_path}")
+                gpkg.write_gpkg(
+                    tmp_path,
+                    f"{pkg.package}-{pkg.fullver}",
+                    generate_attr_dict(pkg),
+                    pkg.contents,
+                    compressor=self.repo.binpkg_compression,
+                )
+                end("gpkg created", True)
+            else:
+                start(f"generating tarball: {tmp_path}")
+                tar.write_set(
+                    pkg.contents, tmp_path, compressor="bzip2", parallelize=True
+                )
+                end("tarball created", True)
+                start("writing Xpak")
+                # ok... got a tarball.  now add xpak.
+                xpak.Xpak.write_xpak(tmp_path, generate_attr_dict(pkg))
+                end("wrote Xpak", True)
+                # ok... we tagged the xpak on.
             os.chmod(tmp_path, 0o644)
         except Exception:
             try:
@@ -107,10 +121,12 @@ class install(repo_interfaces.install):
 
 class uninstall(repo_interfaces.uninstall):
     def remove_data(self):
+        # the existing binpkg may use a different format than new ones
+        self.old_path = self.repo._get_path(self.old_pkg)
         return True
 
     def finalize_data(self):
-        os.unlink(discern_loc(self.repo.base, self.old_pkg, self.repo.extension))
+        os.unlink(self.old_path)
         return True
 
 
@@ -119,6 +135,8 @@ class replace(install, uninstall, repo_interfaces.replace):
         # we just invoke install finalize_data, since it atomically
         # transfers the new pkg in
         install.finalize_data(self)
+        if self.old_path != self.final_path:
+            unlink_if_exists(self.old_path)
         return True
 
 
@@ -131,3 +149,9 @@ class operations(repo_interfaces.operations):
 
     def _cmd_implementation_replace(self, *args):
         return replace(self.repo, *args)
+
+    @operations_mod.is_standalone
+    def _cmd_api_regen_cache(self, observer=None, threads=1, force=False, **kwargs):
+        return self.repo.regen_cache(
+            jobs=threads, force=force, observer=self._get_observer(observer)
+        )
@@ -7,6 +7,8 @@ __all__ = ("ConfiguredTree", "force_unpacking", "tree")
 import errno
 import os
 import typing
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
 from os.path import join as pjoin
 
 from snakeoil import chksum, compression
@@ -25,8 +27,9 @@ from ..fs.tar import generate_contents
 from ..merge import engine, triggers
 from ..package import base as pkg_base
 from ..repository import errors, prototype, wrapper
-from . import remote, repo_ops
-from .xpak import Xpak
+from ..restrictions import packages
+from . import gpkg, remote, repo_ops
+from .xpak import MalformedXpak, Xpak
 
 
 class force_unpacking(triggers.base):
@@ -91,7 +94,15 @@ class BinPkg(ebuild_built.generate_new_factory):
 
 
 class StackedXpakDict(DictMixin):
-    __slots__ = ("_chf_obj", "_parent", "_pkg", "_wipes", "_xpak", "contents")
+    __slots__ = (
+        "_chf_obj",
+        "_gpkg",
+        "_parent",
+        "_pkg",
+        "_wipes",
+        "_xpak",
+        "contents",
+    )
 
     _metadata_rewrites: typing.ClassVar[dict[str, str]] = {
         "bdepend": "BDEPEND",
@@ -105,13 +116,25 @@ class StackedXpakDict(DictMixin):
         "fullslot": "SLOT",
     }
 
-    def __init__(self, parent, pkg):
+    def __init__(self, parent, pkg, xpak=None):
         self._pkg = pkg
         self._parent = parent
         self._wipes = set()
+        if xpak is not None:
+            # metadata already read in bulk
+            self._xpak = xpak
+
+    @jit_attr
+    def gpkg(self):
+        path = self._parent._get_path(self._pkg)
+        if path.endswith(self._parent.gpkg_extension):
+            return gpkg.Gpkg(path)
+        return None
 
     @jit_attr
     def xpak(self):
+        if self.gpkg is not None:
+            return self.gpkg.metadata
         return Xpak(self._parent._get_path(self._pkg))
 
     mtime = alias_attr("_chf_.mtime")
@@ -125,7 +148,10 @@ class StackedXpakDict(DictMixin):
         if key in self._wipes:
             raise KeyError(self, key)
         if key == "contents":
-            data = generate_contents(self._parent._get_path(self._pkg))
+            if self.gpkg is not None:
+                data = self.gpkg.contents()
+            else:
+                data = generate_contents(self._parent._get_path(self._pkg))
             object.__setattr__(self, "contents", data)
         elif key == "environment":
             data = self.xpak.get("environment.bz2")
@@ -197,6 +223,8 @@ class tree(prototype.tree):
     # yes, the period is required. no, do not try and remove it
     # (harring says it stays)
     extension = ".tbz2"
+    gpkg_extension = ".gpkg.tar"
+    binpkg_formats = ("xpak", "gpkg")
 
     configured = False
     configurables = ("settings",)
@@ -204,14 +232,31 @@ class tree(prototype.tree):
     cache_name = "Packages"
 
     pkgcore_config_type = ConfigHint(
-        types={"location": "str", "repo_id": "str"}, typename="repo"
+        types={
+            "location": "str",
+            "repo_id": "str",
+            "binpkg_format": "str",
+            "binpkg_compression": "str",
+        },
+        typename="repo",
     )
 
-    def __init__(self, location, repo_id=None, cache_version="0"):
+    def __init__(
+        self,
+        location,
+        repo_id=None,
+        cache_version="0",
+        binpkg_format="xpak",
+        binpkg_compression="zstd",
+    ):
         """
-        :param location: root of the tbz2 repository
+        :param location: root of the binpkg repository
         :keyword repo_id: unique repository id to use; else defaults to
             the location
+        :keyword binpkg_format: format of binpkgs added to the repository,
+            either xpak (tbz2) or gpkg; both are read regardless
+        :keyword binpkg_compression: compressor used for gpkg binpkgs, see
+            :obj:`pkgcore.binpkg.gpkg.compressors`
         """
         super().__init__()
         self.base = self.location = location
@@ -219,6 +264,23 @@ class tree(prototype.tree):
             repo_id = location
         self.repo_id = repo_id
         self._versions_tmp_cache = {}
+        # binpkg paths of packages not using the default format
+        self._paths = {}
+
+        if binpkg_format not in self.binpkg_formats:
+            raise errors.InitializationError(
+                f"unsupported binpkg format {binpkg_format!r}, "
+                f"expected one of: {', '.join(self.binpkg_formats)}"
+            )
+        if binpkg_compression not in gpkg.compressors:
+            raise errors.InitializationError(
+                f"unsupported binpkg compression {binpkg_compression!r}, "
+                f"expected one of: {', '.join(gpkg.compressors)}"
+            )
+        self.binpkg_format = binpkg_format
+        self.binpkg_compression = binpkg_compression
+        if binpkg_format == "gpkg":
+            self.extension = self.gpkg_extension
 
         # XXX rewrite this when snakeoil.osutils grows an access equivalent.
         if not os.access(self.base, os.X_OK | os.R_OK):
@@ -251,20 +313,32 @@ class tree(prototype.tree):
         cpath = pjoin(self.base, category.lstrip(os.path.sep))
         l = set()
         d = {}
-        lext = len(self.extension)
+        # prefer the default format if a package exists in both
+        extensions = (self.extension,) + tuple(
+            x for x in (".tbz2", self.gpkg_extension) if x != self.extension
+        )
         try:
-            for x in listdir_files(cpath):
+            for x in sorted(listdir_files(cpath)):
                 # don't use lstat; symlinks may exist
-                if (
-                    x.endswith(".lockfile")
-                    or x[-lext:].lower() != self.extension
-                    or x.startswith(".tmp.")
-                ):
+                if x.endswith(".lockfile") or x.startswith(".tmp."):
+                    continue
+                for ext in extensions:
+                    if x[-len(ext) :].lower() == ext:
+                        break
+                else:
                     continue
-                pv = x[:-lext]
+                pv = x[: -len(ext)]
                 pkg = VersionedCPV(f"{category}/{pv}")
+                versions = d.setdefault((category, pkg.package), [])
+                if ext != self.extension:
+                    if pkg.fullver in versions:
+                        continue
+                    self._paths[pkg.cpvstr] = pjoin(cpath, x)
+                elif pkg.fullver in versions:
+                    self._paths.pop(pkg.cpvstr, None)
+                    continue
                 l.add(pkg.package)
-                d.setdefault((category, pkg.package), []).append(pkg.fullver)
+                versions.append(pkg.fullver)
         except OSError as e:
             raise KeyError(
                 f"failed fetching packages for category {pjoin(self.base, category.lstrip(os.path.sep))}: {e!s}"
@@ -277,7 +351,10 @@ class tree(prototype.tree):
         return tuple(self._versions_tmp_cache.pop(catpkg))
 
     def _get_path(self, pkg):
-        return pjoin(self.base, pkg.category, f"{pkg.package}-{pkg.fullver}.tbz2")
+        path = self._paths.get(pkg.cpvstr)
+        if path is None:
+            path = repo_ops.discern_loc(self.base, pkg, self.extension)
+        return path
 
     _get_ebuild_path = _get_path
 
@@ -286,22 +363,98 @@ class tree(prototype.tree):
         try:
             if force:
                 raise KeyError
-            cache_data = self.cache[pkg.cpvstr]
-            if int(cache_data["mtime"]) != int(xpak.mtime):
-                raise KeyError
+            cache_data = self._cached(pkg, xpak.mtime)
         except KeyError:
             cache_data = self.cache.update_from_xpak(pkg, xpak)
         obj = StackedCache(cache_data, xpak)
         return obj
 
+    def _cached(self, pkg, mtime):
+        """Return the cache entry of a package, raising KeyError if it's stale."""
+        cache_data = self.cache[pkg.cpvstr]
+        cached_mtime = cache_data.get(self.cache._chf_key)
+        if cached_mtime is None:
+            # MTIME as written by portage
+            cached_mtime = cache_data["mtime"]
+        if int(float(cached_mtime)) != int(mtime):
+            raise KeyError(pkg.cpvstr)
+        return cache_data
+
+    def _read_cache_entry(self, pkg):
+        path = self._get_path(pkg)
+        xpak = None
+        if not path.endswith(self.gpkg_extension):
+            xpak = Xpak.read_xpak(path)
+        xpak = StackedXpakDict(self, pkg, xpak=xpak)
+        # stat while we're at it, caching the mtime on the entry's _chf_
+        _ = xpak.mtime
+        return self.cache.entry_from_xpak(pkg, xpak)
+
+    def regen_cache(self, pkgs=None, jobs=None, force=False, observer=None):
+        """Update the Packages cache for stale or missing packages.
+
+        The metadata of the binpkgs is read in parallel, each worker only
+        keeping a single file open at a time.
+
+        :param pkgs: packages to update, defaults to all packages in the repo
+            in which case cache entries of packages no longer present are
+            dropped as well
+        :param jobs: number of threads to use, defaults to the number of CPUs
+        :param force: update the cache entries of all given packages
+        :param observer: observer used to report unreadable binpkgs
+        :return: number of binpkgs that failed to be read
+        """
+        cache = self.cache
+        clean = pkgs is None
+        if clean:
+            pkgs = list(self.itermatch(packages.AlwaysTrue, pkg_filter=None))
+
+        stale = []
+        for pkg in pkgs:
+            if not force:
+                try:
+                    self._cached(pkg, os.stat(self._get_path(pkg)).st_mtime)
+                    continue
+                except (KeyError, OSError):
+                    pass
+            stale.append(pkg)
+
+        if jobs is None:
+            jobs = cpu_count()
+        jobs = max(1, min(jobs, len(stale)))
+        errors = 0
+        sync_rate = cache.sync_rate
+        cache.set_sync_rate(1000000)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    (pkg, executor.submit(self._read_cache_entry, pkg)) for pkg in stale
+                ]
+                for pkg, future in futures:
+                    try:
+                        cache[pkg.cpvstr] = future.result()
+                    except (OSError, MalformedXpak, gpkg.MalformedGpkg) as e:
+                        errors += 1
+                        if observer is not None:
+                            observer.error(f"{pkg.cpvstr}: failed reading binpkg: {e}")
+            if clean:
+                present = frozenset(pkg.cpvstr for pkg in pkgs)
+                for cpv in [x for x in cache.data if x not in present]:
+                    del cache[cpv]
+        finally:
+            cache.set_sync_rate(sync_rate)
+            cache.commit()
+        return errors
+
     def notify_add_package(self, pkg):
         prototype.tree.notify_add_package(self, pkg)
-        # XXX horrible hack.
-        self._get_metadata(self.match(pkg.versioned_atom)[0], force=True)
-        self.cache.commit()
+        # newly added packages use the default format
+        self._paths.pop(pkg.cpvstr, None)
+        self.regen_cache(self.match(pkg.versioned_atom), force=True)
 
     def notify_remove_package(self, pkg):
         prototype.tree.notify_remove_package(self, pkg)
+        self._paths.pop(pkg.cpvstr, None)
         try:
             os.rmdir(pjoin(self.base, pkg.category))
         except OSError as oe:
@@ -46,6 +46,10 @@ class Xpak:
     header_pre_magic = "XPAKPACK"
     header = struct.Struct(f">{len(header_pre_magic)}sLL")
 
+    # index entries: key length, key, data offset and length
+    index_key_len = struct.Struct(">L")
+    index_data = struct.Struct(">LL")
+
     trailer_post_magic = trailer_post_magic.encode("ascii")
     trailer_pre_magic = trailer_pre_magic.encode("ascii")
     header_pre_magic = header_pre_magic.encode("ascii")
@@ -135,6 +139,80 @@ class Xpak:
         handle.close()
         return Xpak(target_source)
 
+    @classmethod
+    def read_xpak(cls, path):
+        """
+        read all keys and values of a binpkg's xpak segment
+
+        The segment is located via its trailer and then read in full with a
+        single ``pread`` call, instead of seeking per key.
+
+        :param path: string path of the binpkg
+        :return: ordered mapping of keys to values
+        """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            end = os.fstat(fd).st_size
+            try:
+                pre, size, post = cls.trailer.unpack(
+                    os.pread(fd, cls.trailer.size, max(end - cls.trailer.size, 0))
+                )
+            except struct.error as e:
+                raise MalformedXpak(
+                    f"not an xpak segment, failed parsing trailer: {path!r}"
+                ) from e
+            if pre != cls.trailer_pre_magic or post != cls.trailer_post_magic:
+                raise MalformedXpak(
+                    f"not an xpak segment, trailer didn't match: {path!r}"
+                )
+            # see _check_magic for the off by 8
+            start = end - (size + 8)
+            if start < 0:
+                raise MalformedXpak(f"xpak segment larger than the file: {path!r}")
+            segment = os.pread(fd, size + 8, start)
+        finally:
+            os.close(fd)
+
+        try:
+            pre, index_len, data_len = cls.header.unpack_from(segment)
+        except struct.error as e:
+            raise MalformedXpak(
+                f"not an xpak segment, failed parsing header: {path!r}"
+            ) from e
+        if pre != cls.header_pre_magic:
+            raise MalformedXpak(f"not an xpak segment, header didn't match: {path!r}")
+
+        data = OrderedDict()
+        key_rewrite = cls._reading_key_rewrites.get
+        pos = cls.header.size
+        data_start = pos + index_len
+        while pos < data_start:
+            try:
+                (key_len,) = cls.index_key_len.unpack_from(segment, pos)
+                key = segment[pos + 4 : pos + 4 + key_len].decode("ascii")
+                offset, value_len = cls.index_data.unpack_from(
+                    segment, pos + 4 + key_len
+                )
+            except struct.error as e:
+                raise MalformedXpak(
+                    f"key {len(data) + 1}, index truncated: {path!r}"
+                ) from e
+            pos += key_len + 12
+            if offset + value_len > data_len:
+                raise MalformedXpak(
+                    f"key {key!r}, value exceeds the data segment: {path!r}"
+                )
+            value = segment[data_start + offset : data_start + offset + value_len]
+            if len(value) != value_len:
+                raise MalformedXpak(
+                    f"key {key!r}, tried reading {value_len} bytes of data but hit EOF"
+                )
+            key = key_rewrite(key, key)
+            if not key.startswith("environment"):
+                value = value.decode()
+            data[key] = value
+        return data
+
     @klass.jit_attr
     def keys_dict(self):
         fd = self._fd
@@ -20,6 +20,7 @@ __all__ = (
 import os.path
 from collections import defaultdict, namedtuple
 from collections.abc import Iterable, Reversible
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from itertools import chain
 
@@ -623,13 +624,42 @@ class PayloadDict(ChunkedDataDict):
     pull_data = render_pkg
 
 
+def _sanity_check_pkg(pkg, domain):
+    """Return the sanity check failures for a package, if any."""
+    pkg_ops = domain.get_pkg_operations(pkg)
+    if pkg_ops.supports("sanity_check"):
+        return pkg_ops.sanity_check()
+    return None
+
+
 def run_sanity_checks(pkgs, domain, threads=None):
-    """Run all sanity checks for a sequence of packages."""
+    """Run all sanity checks for a sequence of packages.
+
+    Checks are run across a pool of worker threads, each one pulling ebuild
+    processors from the shared processor pool as required. Exceptions raised
+    by a check are propagated to the caller, regardless of the thread count.
+
+    :param pkgs: iterable of packages to check
+    :param domain: domain the packages are configured for
+    :param threads: number of worker threads to use, defaults to the number of
+        available processors
+    :return: mapping of failing packages to their failures, ordered in the
+        same way as the passed in packages
+    """
+    pkgs = tuple(pkgs)
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if threads == 1 or len(pkgs) <= 1:
+        results = [_sanity_check_pkg(pkg, domain) for pkg in pkgs]
+    else:
+        with ThreadPoolExecutor(max_workers=min(threads, len(pkgs))) as executor:
+            futures = [executor.submit(_sanity_check_pkg, pkg, domain) for pkg in pkgs]
+            # result() re-raises any exception thrown in a worker thread
+            results = [future.result() for future in futures]
+
     sanity_failures = defaultdict(list)
-    # TODO: parallelize this across separate processes
-    for pkg in pkgs:
-        pkg_ops = domain.get_pkg_operations(pkg)
-        if pkg_ops.supports("sanity_check") and (failures := pkg_ops.sanity_check()):
+    for pkg, failures in zip(pkgs, results):
+        if failures:
             sanity_failures[pkg] = failures
     return sanity_failures
 
@@ -739,4 +739,7 @@ class PortageConfig(DictMixin):
             "repo_id": repo_name,
             "location": repo_opts["location"],
         }
+        for opt in ("binpkg-format", "binpkg-compression"):
+            if opt in repo_opts:
+                repo[opt.replace("-", "_")] = repo_opts[opt]
         return repo
@@ -342,31 +342,72 @@ class ConfigProtectInstall_restore(triggers.base):
         self.renames.clear()
 
 
+def gen_uninstall_ignore_filter(uninstall_ignore):
+    ignore = [
+        values.StrRegex(fnmatch.translate(x), match=True) for x in uninstall_ignore
+    ]
+    return values.OrRestriction(*ignore)
+
+
 class ConfigProtectUninstall(triggers.base):
-    required_csets = ("uninstall_existing", "uninstall")
+    """Keep protected and ignored files when unmerging.
+
+    Modified config protected files and files matching ``UNINSTALL_IGNORE``
+    patterns are both dropped from the files to unmerge, partitioned in a
+    single pass over the existing files.
+    """
+
+    required_csets: typing.ClassVar[dict] = {
+        const.REPLACE_MODE: ("uninstall_existing", "uninstall", "old_cset"),
+        const.UNINSTALL_MODE: ("uninstall_existing", "uninstall"),
+    }
     _hooks = ("pre_unmerge",)
+    _engine_types = triggers.UNINSTALLING_MODES
+
+    def __init__(self, uninstall_ignore=()):
+        super().__init__()
+        self.uninstall_ignore = uninstall_ignore
 
-    def trigger(self, engine, existing_cset, uninstall_cset):
+    def trigger(self, engine, existing_cset, uninstall_cset, old_cset=None):
+        if old_cset is None:
+            old_cset = {}
         protected_filter = gen_config_protect_filter(engine.offset).match
         ignore_filter = gen_collision_ignore_filter(engine.offset).match
+        uninstall_ignore_filter = gen_uninstall_ignore_filter(
+            self.uninstall_ignore
+        ).match
 
-        remove = []
+        protected = []
+        ignored = []
         for x in existing_cset.iterfiles():
-            if not ignore_filter(x.location) and protected_filter(x.location):
+            if uninstall_ignore_filter(x.location):
+                ignored.append(x)
+            elif not ignore_filter(x.location) and protected_filter(x.location):
                 recorded_ent = uninstall_cset[x]
                 try:
                     if not simple_chksum_compare(recorded_ent, x):
                         # chksum differs.  file stays.
-                        remove.append(recorded_ent)
+                        protected.append(recorded_ent)
                 # If a file doesn't exist we don't need to remove it
                 except (FileNotFoundError, NotADirectoryError):
                     pass
 
-        for x in remove:
+        for x in protected:
+            del uninstall_cset[x]
+        for x in ignored:
+            # don't remove matching files being uninstalled
             del uninstall_cset[x]
+            # don't remove matching files being replaced
+            old_cset.discard(x)
 
 
 class UninstallIgnore(triggers.base):
+    """Keep files matching ``UNINSTALL_IGNORE`` patterns when unmerging.
+
+    Note that :obj:`ConfigProtectUninstall` handles this as well, this is
+    only for standalone usage.
+    """
+
     required_csets: typing.ClassVar[dict] = {
         const.REPLACE_MODE: ("uninstall_existing", "uninstall", "old_cset"),
         const.UNINSTALL_MODE: ("uninstall_existing", "uninstall"),
@@ -382,11 +423,7 @@ class UninstallIgnore(triggers.base):
     def trigger(self, engine, existing_cset, uninstall_cset, old_cset=None):
         if old_cset is None:
             old_cset = {}
-        ignore = [
-            values.StrRegex(fnmatch.translate(x), match=True)
-            for x in self.uninstall_ignore
-        ]
-        ignore_filter = values.OrRestriction(*ignore).match
+        ignore_filter = gen_uninstall_ignore_filter(self.uninstall_ignore).match
 
         remove = [x for x in existing_cset.iterfiles() if ignore_filter(x.location)]
         for x in remove:
@@ -486,14 +523,22 @@ class ProtectOwned(FileCollision):
         self.vdb = vdb
 
     def collision(self, colliding):
-        real_pkgs = (pkg for repo in self.vdb for pkg in repo if pkg.package_is_real)
         collisions = {}
-
-        # TODO: worth parallelizing this vdb scanning?
-        for pkg in real_pkgs:
-            pkg_file_collisions = pkg.contents.intersection(colliding)
-            if pkg_file_collisions:
-                collisions[pkg.cpvstr] = pkg_file_collisions
+        for repo in self.vdb:
+            index = getattr(repo, "owners", None)
+            if index is not None:
+                for path, cpvs in index.owners(x.location for x in colliding).items():
+                    for cpv in cpvs:
+                        collisions.setdefault(cpv, set()).add(colliding[path])
+                continue
+            # fallback to scanning the contents of all installed pkgs
+            for pkg in repo:
+                if pkg.package_is_real:
+                    pkg_file_collisions = pkg.contents.intersection(colliding)
+                    if pkg_file_collisions:
+                        collisions.setdefault(pkg.cpvstr, set()).update(
+                            pkg_file_collisions
+                        )
 
         if collisions:
             pkg_collisions = ", ".join(
@@ -643,7 +688,7 @@ class GenerateTriggers:
         yield ConfigProtectInstall(
             self.opts["CONFIG_PROTECT"], self.opts["CONFIG_PROTECT_MASK"]
         )
-        yield ConfigProtectUninstall()
+        yield ConfigProtectUninstall(self.opts["UNINSTALL_IGNORE"])
 
         if "collision-protect" in self.domain.features:
             yield CollisionProtect(
@@ -722,5 +767,4 @@ class GenerateTriggers:
             # note that if this wipes all /usr/share/ entries, should
             # wipe the empty dir.
 
-        yield UninstallIgnore(self.opts["UNINSTALL_IGNORE"])
         yield InfoRegen()
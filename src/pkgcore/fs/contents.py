@@ -14,9 +14,10 @@ from snakeoil.klass import GenericEquality, alias_method
 
 from . import fs
 
+path_sep = os.path.sep
+
 
 def change_offset_rewriter(orig_offset, new_offset, iterable):
-    path_sep = os.path.sep
     offset_len = len(orig_offset.rstrip(path_sep))
     # localize it.
     npf = normpath
@@ -50,6 +51,9 @@ class contentsSet(GenericEquality):
         :param mutable: controls if it modifiable after initialization
         """
         self._dict = self.__dict_kls__()
+        # path trie indexing locations by component, built on demand for
+        # subtree queries and kept up to date afterwards
+        self._trie = None
         if initial is not None:
             self._dict.update(check_instance(x) for x in initial)
         self.mutable = mutable
@@ -78,6 +82,8 @@ class contentsSet(GenericEquality):
         if not fs.isfs_obj(obj):
             raise TypeError(f"'{obj}' is not a fs.fsBase class")
         self._dict[obj.location] = obj
+        if self._trie is not None:
+            self._trie_add(obj.location)
 
     def __delitem__(self, obj):
         """
@@ -91,19 +97,18 @@ class contentsSet(GenericEquality):
         if not self.mutable:
             # weird, but keeping with set.
             raise AttributeError(f"{self.__class__} is frozen; no remove functionality")
-        if fs.isfs_obj(obj):
-            del self._dict[obj.location]
-        else:
-            del self._dict[normpath(obj)]
+        location = obj.location if fs.isfs_obj(obj) else normpath(obj)
+        del self._dict[location]
+        if self._trie is not None:
+            self._trie_discard(location)
 
     def remove(self, obj):
         del self[obj]
 
     def discard(self, obj):
-        if fs.isfs_obj(obj):
-            self._dict.pop(obj.location, None)
-        else:
-            self._dict.pop(obj, None)
+        location = obj.location if fs.isfs_obj(obj) else obj
+        if self._dict.pop(location, None) is not None and self._trie is not None:
+            self._trie_discard(location)
 
     def __getitem__(self, obj):
         if fs.isfs_obj(obj):
@@ -124,6 +129,7 @@ class contentsSet(GenericEquality):
             # weird, but keeping with set.
             raise AttributeError(f"{self.__class__} is frozen; no clear functionality")
         self._dict.clear()
+        self._trie = None
 
     @staticmethod
     def _convert_loc(iterable):
@@ -224,8 +230,41 @@ class contentsSet(GenericEquality):
 
     def update(self, iterable):
         d = self._dict
-        for x in iterable:
-            d[x.location] = x
+        if self._trie is None:
+            for x in iterable:
+                d[x.location] = x
+        else:
+            trie_add = self._trie_add
+            for x in iterable:
+                d[x.location] = x
+                trie_add(x.location)
+
+    def _trie_add(self, location):
+        node = self._trie
+        for part in location.split(path_sep):
+            child = node.get(part)
+            if child is None:
+                child = node[part] = {}
+            node = child
+
+    def _trie_discard(self, location):
+        parts = location.split(path_sep)
+        node = self._trie
+        for part in parts[:-1]:
+            node = node.get(part)
+            if node is None:
+                return
+        # only leaves are pruned, directories keep their child nodes
+        if not node.get(parts[-1], True):
+            del node[parts[-1]]
+
+    def _trie_nodes(self):
+        if self._trie is None:
+            self._trie = {}
+            trie_add = self._trie_add
+            for location in self._dict:
+                trie_add(location)
+        return self._trie
 
     def iterfiles(self, invert=False):
         """A generator yielding just :obj:`pkgcore.fs.fs.fsFile` instances.
@@ -318,6 +357,9 @@ class contentsSet(GenericEquality):
         """Yield a stream of nodes that are fs entries contained within the
         passed in start point.
 
+        Lookups use a path trie, so the cost is proportional to the number of
+        child nodes instead of the size of the set.
+
         :param start_point: fs filepath all yielded nodes must be within.
         """
 
@@ -326,11 +368,22 @@ class contentsSet(GenericEquality):
                 start_point = start_point.target
             else:
                 start_point = start_point.location
-        for x in self:
-            cn_path = normpath(start_point).rstrip(os.path.sep) + os.path.sep
-            # what about sym targets?
-            if x.location.startswith(cn_path):
-                yield x
+        start_point = normpath(start_point).rstrip(path_sep)
+        node = self._trie_nodes()
+        for part in start_point.split(path_sep):
+            node = node.get(part)
+            if not node:
+                return
+        d = self._dict
+        stack = [(start_point, node)]
+        while stack:
+            path, node = stack.pop()
+            for part, child in node.items():
+                child_path = f"{path}{path_sep}{part}"
+                if child_path in d:
+                    yield d[child_path]
+                if child:
+                    stack.append((child_path, child))
 
     def child_nodes(self, start_point):
         """Return a clone of this instance, w/ just the child nodes returned
@@ -6,16 +6,24 @@ Shouldn't be accessed directly for the most part, use
 """
 
 import errno
+import fcntl
 import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from multiprocessing import cpu_count
 from os.path import join as pjoin
 
+from snakeoil.data_source import local_source
 from snakeoil.osutils import ensure_dirs, unlink_if_exists
 from snakeoil.process.spawn import spawn
 
 from . import contents, fs
 from .livefs import gen_obj
 
+# linux ioctl cloning a file's extents, see ioctl_ficlone(2)
+_FICLONE = 0x40049409
+
 
 def ensure_perms(d1, d2=None):
     """Enforce a fs objects attributes on the livefs.
@@ -197,15 +205,147 @@ def do_link(src, trg):
     return True
 
 
-def merge_contents(cset, offset=None, callback=None):
+# errors signifying a copy method isn't supported for the given files
+_unsupported_copy_errnos = frozenset(
+    (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ETXTBSY)
+)
+
+
+def _copy_file_range(src_fd, dst_fd):
+    while os.copy_file_range(src_fd, dst_fd, 1 << 30):
+        pass
+
+
+def _sendfile(src_fd, dst_fd):
+    while os.sendfile(dst_fd, src_fd, None, 1 << 30):
+        pass
+
+
+def _read_write(src_fd, dst_fd):
+    while data := os.read(src_fd, 1 << 20):
+        while data:
+            data = data[os.write(dst_fd, data) :]
+
+
+def copy_data(src_fd, dst_fd):
+    """Copy file data between file descriptors.
+
+    Extents are shared via reflinks where the filesystem supports it,
+    otherwise data is copied in kernel via :func:`os.copy_file_range` or
+    :func:`os.sendfile`, falling back to reading and writing it.
+    """
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return
+    except OSError:
+        pass
+    methods = [_sendfile, _read_write]
+    if hasattr(os, "copy_file_range"):
+        methods.insert(0, _copy_file_range)
+    for method in methods[:-1]:
+        try:
+            # file offsets are updated as data is copied, so a fallback
+            # continues where the previous method stopped
+            method(src_fd, dst_fd)
+            return
+        except OSError as e:
+            if e.errno not in _unsupported_copy_errnos:
+                raise
+    methods[-1](src_fd, dst_fd)
+
+
+def _merge_file(obj, dir_fd):
+    """Merge a regular file backed by a local file relative to its dir fd.
+
+    Matches :func:`copyfile`, enforcing attributes via the open file
+    descriptor instead of separate path based calls.
+    """
+    name = os.path.basename(obj.location)
+    try:
+        st = os.lstat(name, dir_fd=dir_fd)
+    except FileNotFoundError:
+        existent = False
+    else:
+        if stat.S_ISDIR(st.st_mode):
+            raise CannotOverwrite(obj, gen_obj(obj.location, stat=st))
+        existent = True
+
+    target = name + "#new" if existent else name
+    src_fd = os.open(obj.data.path, os.O_RDONLY)
+    try:
+        dst_fd = os.open(
+            target,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW,
+            0o600,
+            dir_fd=dir_fd,
+        )
+        try:
+            copy_data(src_fd, dst_fd)
+            uid = -1 if obj.uid is None else obj.uid
+            gid = -1 if obj.gid is None else obj.gid
+            if uid != -1 or gid != -1:
+                os.fchown(dst_fd, uid, gid)
+            if obj.mode is not None:
+                os.fchmod(dst_fd, obj.mode)
+            if obj.mtime is not None:
+                os.utime(dst_fd, (obj.mtime, obj.mtime))
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    if existent:
+        os.rename(target, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+
+def _merge_dir_files(dirname, objs):
+    """Merge regular files sharing a parent directory."""
+    try:
+        dir_fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+    except FileNotFoundError as e:
+        if not ensure_dirs(dirname, mode=0o750, minimal=True):
+            raise FailedCopy(objs[0], str(e))
+        dir_fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        for obj in objs:
+            _merge_file(obj, dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _process_batches(func, batches, jobs=None):
+    """Apply a function to per directory batches using a thread pool."""
+    if jobs is None:
+        jobs = cpu_count()
+    jobs = max(1, min(jobs, len(batches)))
+    if jobs == 1:
+        for dirname, entries in batches.items():
+            func(dirname, entries)
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(func, dirname, entries)
+            for dirname, entries in batches.items()
+        ]
+        for future in futures:
+            future.result()
+
+
+def merge_contents(cset, offset=None, callback=None, jobs=None):
     """
     merge a :class:`pkgcore.fs.contents.contentsSet` instance to the livefs
 
+    Directories are merged first, in sorted order.  Regular files are then
+    copied per directory in parallel, while other entries and hardlinks to
+    already merged files are handled serially.
+
     :param cset: :class:`pkgcore.fs.contents.contentsSet` instance
     :param offset: if not None, offset to prefix all locations with.
         Think of it as target dir.
     :param callback: callable to report each entry being merged; given a single arg,
         the fs object being merged.
+    :param jobs: number of threads used to copy regular files, defaults to
+        the number of CPUs
     :raise EnvironmentError: Thrown for permission failures.
     """
 
@@ -252,10 +392,16 @@ def merge_contents(cset, offset=None, callback=None):
             ensure_perms(x)
     del d
 
+    # regular files backed by local files are batched per directory for
+    # parallel copying, the first file of each set of hardlinks included
+    batches = {}
+    # hardlinks to files in the batches, handled once those are merged
+    hardlinks = []
+    merged_inodes = {}
+
     # might look odd, but what this does is minimize the try/except cost
     # to one time, assuming everything behaves, rather then per item.
     i = iterate(cset.iterdirs(invert=True))
-    merged_inodes = {}
     while True:
         try:
             for x in i:
@@ -263,18 +409,13 @@ def merge_contents(cset, offset=None, callback=None):
 
                 if x.is_reg:
                     key = (x.dev, x.inode)
-                    # This logic could be made smarter- instead of
-                    # blindly trying candidates, we could inspect the st_dev
-                    # of the final location.  This however can be broken by
-                    # overlayfs's potentially.  Brute force is in use either
-                    # way.
-                    candidates = merged_inodes.setdefault(key, [])
-                    if any(
-                        target._can_be_hardlinked(x) and do_link(target, x)
-                        for target in candidates
-                    ):
+                    if None not in key and key in merged_inodes:
+                        hardlinks.append(x)
+                        continue
+                    merged_inodes.setdefault(key, []).append(x)
+                    if type(x.data) is local_source:
+                        batches.setdefault(os.path.dirname(x.location), []).append(x)
                         continue
-                    candidates.append(x)
 
                 copyfile(x, mkdirs=True)
 
@@ -290,17 +431,55 @@ def merge_contents(cset, offset=None, callback=None):
                     raise
             except OSError:
                 raise cf
+
+    _process_batches(_merge_dir_files, batches, jobs)
+    del batches
+
+    for x in hardlinks:
+        # This logic could be made smarter- instead of
+        # blindly trying candidates, we could inspect the st_dev
+        # of the final location.  This however can be broken by
+        # overlayfs's potentially.  Brute force is in use either
+        # way.
+        candidates = merged_inodes[(x.dev, x.inode)]
+        if any(
+            target._can_be_hardlinked(x) and do_link(target, x) for target in candidates
+        ):
+            continue
+        candidates.append(x)
+        copyfile(x, mkdirs=True)
     return True
 
 
-def unmerge_contents(cset, offset=None, callback=None):
+def _unmerge_dir_entries(dirname, names):
+    """Unlink entries sharing a parent directory."""
+    try:
+        dir_fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    try:
+        for name in names:
+            try:
+                os.unlink(name, dir_fd=dir_fd)
+            except FileNotFoundError:
+                pass
+    finally:
+        os.close(dir_fd)
+
+
+def unmerge_contents(cset, offset=None, callback=None, jobs=None):
     """
     unmerge a :obj:`pkgcore.fs.contents.contentsSet` instance to the livefs
 
+    Non-directory entries are unlinked per directory in parallel, then
+    directories left empty are removed bottom-up.
+
     :param cset: :obj:`pkgcore.fs.contents.contentsSet` instance
     :param offset: if not None, offset to prefix all locations with.
         Think of it as target dir.
     :param callback: callable to report each entry being unmerged
+    :param jobs: number of threads used to unlink entries, defaults to
+        the number of CPUs
     :return: True, or an exception is thrown on failure
         (OSError, although see copyfile for specifics).
     :raise EnvironmentError: see :func:`copyfile` and :func:`mkdir`
@@ -315,9 +494,14 @@ def unmerge_contents(cset, offset=None, callback=None):
     if offset is not None:
         iterate = partial(contents.offset_rewriter, offset.rstrip(os.path.sep))
 
+    batches = {}
     for x in iterate(cset.iterdirs(invert=True)):
         callback(x)
-        unlink_if_exists(x.location)
+        dirname, name = os.path.split(x.location)
+        batches.setdefault(dirname, []).append(name)
+
+    _process_batches(_unmerge_dir_entries, batches, jobs)
+    del batches
 
     # this is a fair sight faster then using sorted/reversed
     l = list(iterate(cset.iterdirs()))
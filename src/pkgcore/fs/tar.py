@@ -8,7 +8,6 @@ from functools import partial
 from itertools import count
 
 from snakeoil import compression
-from snakeoil.compatibility import cmp, sorted_cmp
 from snakeoil.data_source import invokable_data_source
 
 from . import contents
@@ -41,17 +40,21 @@ def write_set(
         handle.close()
 
 
-def add_contents_to_tarfile(contents_set, tar_fd, absolute_paths=False):
+def add_contents_to_tarfile(contents_set, tar_fd, absolute_paths=False, prefix="."):
+    """Add a contents set to a tarfile.
+
+    :param prefix: directory relative paths are stored beneath
+    """
     # first add directories, then everything else
     # this is just a pkgcore optimization, it prefers to see the dirs first.
     dirs = contents_set.dirs()
     dirs.sort()
     for x in dirs:
-        tar_fd.addfile(fsobj_to_tarinfo(x, absolute_paths))
+        tar_fd.addfile(fsobj_to_tarinfo(x, absolute_paths, prefix))
     del dirs
     inodes = {}
     for x in contents_set.iterdirs(invert=True):
-        t = fsobj_to_tarinfo(x, absolute_paths)
+        t = fsobj_to_tarinfo(x, absolute_paths, prefix)
         if t.isreg():
             key = (x.dev, x.inode)
             existing = inodes.get(key)
@@ -59,7 +62,7 @@ def add_contents_to_tarfile(contents_set, tar_fd, absolute_paths=False):
             if existing is not None:
                 if x._can_be_hardlinked(existing):
                     t.type = tarfile.LNKTYPE
-                    t.linkname = "./{}".format(existing.location.lstrip("/"))
+                    t.linkname = "{}/{}".format(prefix, existing.location.lstrip("/"))
                     t.size = 0
             else:
                 inodes[key] = x
@@ -70,7 +73,20 @@ def add_contents_to_tarfile(contents_set, tar_fd, absolute_paths=False):
             tar_fd.addfile(t)
 
 
-def archive_to_fsobj(src_tar):
+def _strip_prefix(name, prefix):
+    name = name.removeprefix("./")
+    if name == prefix:
+        return ""
+    if name.startswith(f"{prefix}/"):
+        return name[len(prefix) + 1 :]
+    return name
+
+
+def archive_to_fsobj(src_tar, prefix=None):
+    """Generate fs objects from tarfile members.
+
+    :param prefix: directory member paths are relative to, if any
+    """
     psep = os.path.sep
     dev = _unique_inode()
     # inode cache used for supporting hardlinks.
@@ -85,15 +101,21 @@ def archive_to_fsobj(src_tar):
             "mtime": member.mtime,
             "mode": member.mode,
         }
-        location = os.path.abspath(os.path.join(psep, member.name.strip(psep)))
+        name = member.name.strip(psep)
+        if prefix is not None:
+            name = _strip_prefix(name, prefix)
+        location = os.path.abspath(os.path.join(psep, name))
         if member.isdir():
-            if member.name.strip(psep) == ".":
+            if name in (".", ""):
                 continue
             yield fsDir(location, **d)
         elif member.isreg() or member.islnk():
             d["dev"] = dev
             if member.islnk():
-                target = os.path.abspath(os.path.join(psep, member.linkname))
+                linkname = member.linkname
+                if prefix is not None:
+                    linkname = _strip_prefix(linkname.strip(psep), prefix)
+                target = os.path.abspath(os.path.join(psep, linkname))
                 inode = inodes.get(target)
                 if inode is None:
                     raise AssertionError(
@@ -111,7 +133,7 @@ def archive_to_fsobj(src_tar):
             # later lookup.
             inodes[location] = inode
             d["data"] = invokable_data_source.wrap_function(
-                partial(src_tar.extractfile, member.name),
+                partial(src_tar.extractfile, member),
                 returns_text=False,
                 returns_handle=True,
             )
@@ -130,7 +152,7 @@ def archive_to_fsobj(src_tar):
             )
 
 
-def fsobj_to_tarinfo(fsobj, absolute_path=True):
+def fsobj_to_tarinfo(fsobj, absolute_path=True, prefix="."):
     t = tarfile.TarInfo()
     if fsobj.is_reg:
         t.type = tarfile.REGTYPE
@@ -151,7 +173,7 @@ def fsobj_to_tarinfo(fsobj, absolute_path=True):
         t.devminor = fsobj.minor
     t.name = fsobj.location
     if not absolute_path:
-        t.name = f"./{fsobj.location.lstrip('/')}"
+        t.name = f"{prefix}/{fsobj.location.lstrip('/')}"
     t.mode = fsobj.mode
     t.uid = fsobj.uid
     t.gid = fsobj.gid
@@ -185,67 +207,91 @@ def generate_contents(filepath, compressor="bz2", parallelize=True):
     return convert_archive(tar_handle)
 
 
-def convert_archive(archive):
-    # regarding the usage of del in this function... bear in mind these sets
-    # could easily have 10k -> 100k entries in extreme cases; thus the del
-    # usage, explicitly trying to ensure we don't keep refs long term.
-
-    # this one is a bit fun.
-    raw = list(archive_to_fsobj(archive))
-    # we use the data source as the unique key to get position.
-    files_ordering = list(enumerate(x for x in raw if x.is_reg))
-    files_ordering = {x.data: idx for idx, x in files_ordering}
-    t = contents.contentsSet(raw, mutable=True)
-    del raw, archive
-
-    # first rewrite affected syms.
-    raw_syms = t.links()
-    syms = contents.contentsSet(raw_syms)
-    while True:
-        for x in sorted(syms):
-            affected = syms.child_nodes(x.location)
-            if not affected:
-                continue
-            syms.difference_update(affected)
-            syms.update(affected.change_offset(x.location, x.resolved_target))
-            del affected
-            break
-        else:
-            break
+def _relocate_symlinked_dirs(cset, syms):
+    """Move entries beneath symlinked directories onto the symlink targets.
 
-    t.difference_update(raw_syms)
-    t.update(syms)
+    Symlinks are handled shallowest first, so those beneath other symlinks are
+    relocated before their own targets are resolved.  Entries are only looked
+    up via the path trie of the contents set, and relocated once each.
+    """
+    # symlink location, both original and relocated -> resolved target
+    links = {}
+
+    def resolve(path):
+        # bounded, symlinks may form cycles
+        for _ in range(len(syms)):
+            parent = path
+            while parent not in links:
+                if parent == os.path.sep:
+                    return path
+                parent = os.path.dirname(parent)
+            rest = path[len(parent) :].lstrip(os.path.sep)
+            path = os.path.normpath(os.path.join(links[parent], rest))
+        return path
+
+    affected = {}
+    for sym in sorted(syms, key=lambda x: (x.location.count(os.path.sep), x)):
+        dirname = resolve(sym.dirname)
+        if dirname != sym.dirname:
+            relocated = sym.change_attributes(
+                location=os.path.join(dirname, sym.basename)
+            )
+            links[relocated.location] = relocated.resolved_target
+        else:
+            relocated = sym
+        links[sym.location] = relocated.resolved_target
+        for x in cset.iter_child_nodes(sym.location):
+            affected[x.location] = x
 
-    del raw_syms
-    syms = sorted(syms, reverse=True)
-    # ok, syms are correct.  now we get the rest.
-    # we shift the readds into a separate list so that we don't reinspect
-    # them on later runs; this slightly reduces the working set.
     additions = []
-    for x in syms:
-        affected = t.child_nodes(x.location)
-        if not affected:
-            continue
-        t.difference_update(affected)
-        additions.extend(affected.change_offset(x.location, x.resolved_target))
-
-    t.update(additions)
+    resolved = {}
+    for location, x in affected.items():
+        orig_dirname = location.rsplit(os.path.sep, 1)[0] or os.path.sep
+        dirname = resolved.get(orig_dirname)
+        if dirname is None:
+            dirname = resolved[orig_dirname] = resolve(orig_dirname)
+        if dirname != orig_dirname:
+            del cset[location]
+            additions.append(
+                x.change_attributes(location=os.path.join(dirname, x.basename))
+            )
+    # relocated entries take precedence over existing ones
+    cset.update(additions)
+
+
+def convert_archive(archive, prefix=None):
+    """Generate a contents set from a tarfile.
+
+    Members are streamed into the contents set, then entries beneath
+    symlinked directories are relocated onto the symlink targets.  The result
+    is ordered with directories first, then other entries by path, and
+    regular files last in archive order.
+
+    :param prefix: directory member paths are relative to, if any
+    """
+    t = contents.contentsSet(mutable=True)
+    # archive position of regular files, keyed by their unique data source
+    files_ordering = {}
+    syms = []
+    for x in archive_to_fsobj(archive, prefix):
+        if x.is_reg:
+            files_ordering[x.data] = len(files_ordering)
+        elif x.is_sym:
+            syms.append(x)
+        t.add(x)
+    del archive
+
+    # drop symlinks overridden by later members
+    syms = [x for x in syms if t[x.location] is x]
+    if syms:
+        _relocate_symlinked_dirs(t, syms)
     t.add_missing_directories()
 
-    # finally... an insane sort.
-    def sort_func(x, y):
+    def sort_key(x):
         if x.is_dir:
-            if not y.is_dir:
-                return -1
-            return cmp(x, y)
-        elif y.is_dir:
-            return +1
+            return (0, x.location)
         elif x.is_reg:
-            if y.is_reg:
-                return cmp(files_ordering[x.data], files_ordering[y.data])
-            return +1
-        elif y.is_reg:
-            return -1
-        return cmp(x, y)
-
-    return contents.OrderedContentsSet(sorted_cmp(t, sort_func), mutable=False)
+            return (2, files_ordering[x.data])
+        return (1, x.location)
+
+    return contents.OrderedContentsSet(sorted(t, key=sort_key), mutable=False)
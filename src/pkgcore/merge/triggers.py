@@ -9,6 +9,7 @@ __all__ = (
     "BinaryDebug",
     "BlockFileType",
     "CommonDirectoryModes",
+    "GenerateChksums",
     "InfoRegen",
     "PruneFiles",
     "SavePkg",
@@ -436,7 +437,11 @@ class merge(base):
     suppress_exceptions = False
 
     def trigger(self, engine, merging_cset):
-        return merge_contents(merging_cset, callback=engine.observer.installing_fs_obj)
+        return merge_contents(
+            merging_cset,
+            callback=engine.observer.installing_fs_obj,
+            jobs=engine.parallelism,
+        )
 
 
 class unmerge(base):
@@ -448,7 +453,9 @@ class unmerge(base):
 
     def trigger(self, engine, unmerging_cset):
         return unmerge_contents(
-            unmerging_cset, callback=engine.observer.removing_fs_obj
+            unmerging_cset,
+            callback=engine.observer.removing_fs_obj,
+            jobs=engine.parallelism,
         )
 
 
@@ -914,6 +921,35 @@ class BinaryDebug(ThreadedTrigger):
         del self._modified
 
 
+class GenerateChksums(ThreadedTrigger):
+    """Generate the chksums of files being merged in parallel.
+
+    File chksums are otherwise generated lazily and serially, e.g. by config
+    protection comparisons or when recording the installed contents.  This
+    runs after the other pre_merge triggers that modify files, with the
+    results cached on the fs objects for later consumers.
+    """
+
+    required_csets = ("install",)
+    priority = 99
+    _engine_types = INSTALLING_MODES
+    _hooks = ("pre_merge",)
+
+    def identify_work(self, engine, cset):
+        for fs_obj in cset.iterfiles():
+            if isinstance(fs_obj.chksums, fs._LazyChksums):
+                yield fs_obj
+
+    def thread_trigger(self, iterable, observer):
+        for fs_obj in iterable:
+            try:
+                # lazy chksums are all loaded on first access
+                tuple(fs_obj.chksums.values())
+            except OSError as e:
+                # left for the consumers to handle
+                observer.debug(f"failed generating chksums for {fs_obj}: {e}")
+
+
 def default_plugins_triggers() -> tuple[type[base]]:
     triggers = (
         ldconfig,
@@ -926,5 +962,6 @@ def default_plugins_triggers() -> tuple[type[base]]:
         InfoRegen,
         CommonDirectoryModes,
         BaseSystemUnmergeProtection,
+        GenerateChksums,
     )
     return tuple(sorted(triggers, reverse=True, key=lambda x: (x.priority, x.__name__)))
@@ -12,6 +12,7 @@ __all__ = (
     "uninstall",
 )
 
+import threading
 import typing
 from functools import partial
 
@@ -131,6 +132,9 @@ class replace(install, uninstall):
         install.__init__(self, repo, newpkg, observer)
 
 
+_sync_steps_lock = threading.Lock()
+
+
 class sync_operations(operations_mod.base):
     def __init__(self, repository, disable_overrides=(), enable_overrides=()):
         self.repo = repository
@@ -140,9 +144,13 @@ class sync_operations(operations_mod.base):
     def _cmd_api_sync(self, observer=None, **kwargs):
         # often enough, the syncer is a lazy_ref
         syncer = self._get_syncer()
-        self.repo._pre_sync()
+        # repos may be synced in parallel, pre and post sync steps can touch
+        # process wide state such as mounts so serialize them
+        with _sync_steps_lock:
+            self.repo._pre_sync()
         ret = syncer.sync(**kwargs)
-        self.repo._post_sync()
+        with _sync_steps_lock:
+            self.repo._post_sync()
         return ret
 
     def _get_syncer(self, lazy=False):
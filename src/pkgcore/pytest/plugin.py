@@ -318,3 +318,14 @@ def make_repo(tmp_path_factory):
         return EbuildRepo(path, **kwargs)
 
     return _make_repo
+
+
+@pytest.fixture
+def synthetic_repos():
+    """Factory for synthetic source repo and vdb generation.
+
+    See :obj:`pkgcore.test.synthetic.generate_repos` for supported arguments.
+    """
+    from ..test.synthetic import generate_repos
+
+    return generate_repos
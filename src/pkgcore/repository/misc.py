@@ -1,5 +1,7 @@
 __all__ = ("caching_repo", "nodeps_repo")
 
+from collections import Counter, OrderedDict
+
 from snakeoil.iterables import caching_iter, iter_sort
 from snakeoil.klass import DirProxy, GetAttrProxy
 
@@ -91,27 +93,68 @@ class caching_repo:
     in memory till the cache is cleared.  General use, not usually what
     you want- if you're making a lot of random queries that are duplicates
     (resolver does this for example), caching helps.
+
+    To bound that cost, the cache can be limited by number of entries and by
+    approximate weight- the number of pkg instances loaded by the cached
+    results.  Least recently used entries are evicted first; entries that
+    are pinned via :py:meth:`pin` are never evicted.
     """
 
     operations_kls = operations_proxy
 
-    def __init__(self, db, strategy):
+    def __init__(self, db, strategy, max_entries=None, max_weight=None):
         """
         :param db: an instance supporting the repository protocol to cache
           queries from.
         :param strategy: forced sorting strategy for results.  If you don't
           need sorting, pass in iter.
+        :param max_entries: maximum number of cached queries, unbounded
+          if None.
+        :param max_weight: maximum number of pkg instances held by cached
+          queries, unbounded if None.  Since results are loaded on demand
+          this is approximate; weights are refreshed as entries are reused.
         """
         self.__db__ = db
         self.__strategy__ = strategy
-        self.__cache__ = {}
+        self.__cache__ = OrderedDict()
+        self.__weights__ = {}
+        self.__pinned__ = Counter()
+        self.__last__ = None
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weight = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def bounded(self):
+        return self.max_entries is not None or self.max_weight is not None
 
     def match(self, restrict):
         v = self.__cache__.get(restrict)
         if v is None:
+            self.misses += 1
             v = self.__cache__[restrict] = caching_iter(
                 self.__db__.itermatch(restrict, sorter=self.__strategy__)
             )
+            if self.bounded:
+                # results are loaded on demand, so refresh the weight of the
+                # previous query- it's usually been consumed by now.
+                last = self.__last__
+                if (
+                    last is not None
+                    and (last_v := self.__cache__.get(last)) is not None
+                ):
+                    self._update_weight(last, last_v)
+                self.__last__ = restrict
+                self.__weights__[restrict] = 0
+                self._evict(restrict)
+        else:
+            self.hits += 1
+            if self.bounded:
+                self.__cache__.move_to_end(restrict)
+                self._update_weight(restrict, v)
+                if self.max_weight is not None:
+                    self._evict(restrict)
         return v
 
     def itermatch(self, restrict):
@@ -120,8 +163,57 @@ class caching_repo:
     __getattr__ = GetAttrProxy("__db__")
     __dir__ = DirProxy("__db__")
 
+    def _update_weight(self, restrict, v):
+        weight = len(v.cached_list)
+        self.weight += weight - self.__weights__[restrict]
+        self.__weights__[restrict] = weight
+
+    def _evict(self, current):
+        """Evict least recently used, unpinned entries until within limits.
+
+        :param current: restriction of the entry being returned to the
+            caller, never evicted
+        """
+        cache = self.__cache__
+        weights = self.__weights__
+        max_entries = self.max_entries
+        max_weight = self.max_weight
+        entries, weight = len(cache), self.weight
+        victims = []
+        for restrict in cache:
+            if (max_entries is None or entries <= max_entries) and (
+                max_weight is None or weight <= max_weight
+            ):
+                break
+            if restrict == current or restrict in self.__pinned__:
+                continue
+            victims.append(restrict)
+            entries -= 1
+            weight -= weights[restrict]
+        for restrict in victims:
+            del cache[restrict]
+            self.weight -= weights.pop(restrict)
+        self.evictions += len(victims)
+
+    def pin(self, restrict):
+        """Prevent the cache entry for a restriction from being evicted.
+
+        Pins are reference counted; every call must be paired with a call
+        to :py:meth:`unpin`.
+        """
+        self.__pinned__[restrict] += 1
+
+    def unpin(self, restrict):
+        pinned = self.__pinned__
+        pinned[restrict] -= 1
+        if pinned[restrict] <= 0:
+            del pinned[restrict]
+
     def clear(self):
         self.__cache__.clear()
+        self.__weights__.clear()
+        self.__last__ = None
+        self.weight = 0
 
 
 class multiplex_sorting_repo:
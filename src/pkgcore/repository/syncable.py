@@ -1,6 +1,7 @@
 __all__ = ("tree",)
 
 from ..operations.repo import sync_operations
+from ..sync.journal import ChangeJournal
 
 
 class tree:
@@ -16,6 +17,16 @@ class tree:
     def get_operations(self, observer=None):
         return self.operations_kls(self)
 
+    @property
+    def sync_journal(self):
+        """Journal of the changes made by syncs of the repo.
+
+        Caches of repo data can use it to only invalidate the paths changed
+        since they were last updated, see
+        :class:`pkgcore.sync.journal.ChangeJournal`.
+        """
+        return ChangeJournal.for_repo(self.location)
+
     def _pre_sync(self):
         """Run any required pre-sync repo operations."""
 
@@ -0,0 +1,291 @@
+"""
+pure python CDCL SAT solver
+
+Conflict driven clause learning with two watched literals, first UIP
+learning, non-chronological backjumping and activity based branching.
+Variables are positive ints, literals are signed ints as in the DIMACS
+format; ``-v`` is the negation of ``v``.
+"""
+
+__all__ = ("cdcl_solver",)
+
+import heapq
+
+
+class cdcl_solver:
+    """Incremental SAT solver.
+
+    Clauses can be added between :py:meth:`solve` calls, while clauses learnt
+    while solving are kept since they're implied by the existing ones.
+
+    Branching can be customized by passing a ``decide`` callable to
+    :py:meth:`solve`, called with the solver instance whenever a decision is
+    needed; it returns the literal to assign next, or None to defer to the
+    default branching which picks the most active unassigned variable and
+    assigns it its last (default false) polarity.
+    """
+
+    # activity decay for the branching heuristic
+    var_decay = 0.95
+
+    def __init__(self):
+        self.num_vars = 0
+        # var indexed; position 0 is unused
+        self.assigns = [None]
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.watches = {}
+        self.clauses = []
+        self.learnts = []
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.var_inc = 1.0
+        self._heap = []
+        self.ok = True
+        self.conflicts = self.decisions = self.propagations = 0
+
+    def new_var(self):
+        """Allocate a new variable, returning it."""
+        self.num_vars += 1
+        v = self.num_vars
+        self.assigns.append(None)
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.phase.append(False)
+        self.watches[v] = []
+        self.watches[-v] = []
+        heapq.heappush(self._heap, (0.0, v))
+        return v
+
+    def value(self, lit):
+        """Return the value of a literal; True, False or None if unassigned."""
+        v = self.assigns[lit if lit > 0 else -lit]
+        if v is None or lit > 0:
+            return v
+        return not v
+
+    def model(self):
+        """Return the set of variables assigned true."""
+        return {v for v in range(1, self.num_vars + 1) if self.assigns[v]}
+
+    @property
+    def decision_level(self):
+        return len(self.trail_lim)
+
+    def add_clause(self, lits):
+        """Add a clause, returning False if the formula became unsatisfiable."""
+        if not self.ok:
+            return False
+        if self.trail_lim:
+            self._cancel_until(0)
+        clause = []
+        for lit in dict.fromkeys(lits):
+            if -lit in clause:
+                # tautology
+                return True
+            value = self.value(lit)
+            if value:
+                return True
+            elif value is None:
+                clause.append(lit)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self._enqueue(clause[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self.clauses.append(clause)
+            self.watches[clause[0]].append(clause)
+            self.watches[clause[1]].append(clause)
+        return self.ok
+
+    def _enqueue(self, lit, reason):
+        v = lit if lit > 0 else -lit
+        self.assigns[v] = lit > 0
+        self.levels[v] = len(self.trail_lim)
+        self.reasons[v] = reason
+        self.trail.append(lit)
+
+    def _propagate(self):
+        """Unit propagate pending assignments, returning a conflicting clause."""
+        trail = self.trail
+        watches = self.watches
+        assigns = self.assigns
+        while self.qhead < len(trail):
+            false_lit = -trail[self.qhead]
+            self.qhead += 1
+            self.propagations += 1
+            ws = watches[false_lit]
+            watches[false_lit] = kept = []
+            i, count = 0, len(ws)
+            while i < count:
+                clause = ws[i]
+                i += 1
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                fv = assigns[first if first > 0 else -first]
+                if fv is not None and fv == (first > 0):
+                    # already satisfied
+                    kept.append(clause)
+                    continue
+                for k in range(2, len(clause)):
+                    lit = clause[k]
+                    lv = assigns[lit if lit > 0 else -lit]
+                    if lv is None or lv == (lit > 0):
+                        clause[1], clause[k] = lit, false_lit
+                        watches[lit].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if fv is None:
+                        self._enqueue(first, clause)
+                    else:
+                        kept.extend(ws[i:])
+                        self.qhead = len(trail)
+                        return clause
+        return None
+
+    def _bump(self, v):
+        activity = self.activity
+        activity[v] += self.var_inc
+        if activity[v] > 1e100:
+            for x in range(1, self.num_vars + 1):
+                activity[x] *= 1e-100
+            self.var_inc *= 1e-100
+            self._heap = [(-activity[x], x) for x in range(1, self.num_vars + 1)]
+            heapq.heapify(self._heap)
+        elif self.assigns[v] is None:
+            heapq.heappush(self._heap, (-activity[v], v))
+
+    def _analyze(self, conflict):
+        """First UIP conflict analysis.
+
+        :return: (learnt clause, backjump level) with the asserting literal
+            first in the clause
+        """
+        levels = self.levels
+        trail = self.trail
+        current = len(self.trail_lim)
+        seen = set()
+        learnt = [None]
+        counter = 0
+        lit = None
+        idx = len(trail) - 1
+        clause = conflict
+        while True:
+            for q in clause:
+                if q == lit:
+                    continue
+                v = q if q > 0 else -q
+                if v not in seen and levels[v] > 0:
+                    seen.add(v)
+                    self._bump(v)
+                    if levels[v] >= current:
+                        counter += 1
+                    else:
+                        learnt.append(q)
+            while True:
+                lit = trail[idx]
+                idx -= 1
+                if (lit if lit > 0 else -lit) in seen:
+                    break
+            v = lit if lit > 0 else -lit
+            clause = self.reasons[v]
+            counter -= 1
+            if counter <= 0:
+                break
+        learnt[0] = -lit
+        self.var_inc /= self.var_decay
+
+        if len(learnt) == 1:
+            return learnt, 0
+        # watch the literal with the highest level second
+        best = max(range(1, len(learnt)), key=lambda i: levels[abs(learnt[i])])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, levels[abs(learnt[1])]
+
+    def _cancel_until(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        for lit in reversed(self.trail[start:]):
+            v = lit if lit > 0 else -lit
+            self.phase[v] = lit > 0
+            self.assigns[v] = None
+            self.reasons[v] = None
+            heapq.heappush(self._heap, (-self.activity[v], v))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def _pick_branch(self):
+        heap = self._heap
+        assigns = self.assigns
+        while heap:
+            _, v = heapq.heappop(heap)
+            if assigns[v] is None:
+                return v if self.phase[v] else -v
+        return None
+
+    def solve(self, assumptions=(), decide=None):
+        """Search for a satisfying assignment.
+
+        :param assumptions: literals forced true for this call only
+        :param decide: optional branching callback, see class docs
+        :return: True if satisfiable, False otherwise; on success the
+            assignment is available via :py:meth:`value` and :py:meth:`model`
+            until the solver is modified.
+        """
+        if not self.ok:
+            return False
+        self._cancel_until(0)
+        if self._propagate() is not None:
+            self.ok = False
+            return False
+        assumptions = tuple(assumptions)
+
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learnt, level = self._analyze(conflict)
+                self._cancel_until(level)
+                if len(learnt) == 1:
+                    self._enqueue(learnt[0], None)
+                else:
+                    self.learnts.append(learnt)
+                    self.watches[learnt[0]].append(learnt)
+                    self.watches[learnt[1]].append(learnt)
+                    self._enqueue(learnt[0], learnt)
+                continue
+
+            lit = None
+            while len(self.trail_lim) < len(assumptions):
+                # assumptions each get their own decision level
+                p = assumptions[len(self.trail_lim)]
+                value = self.value(p)
+                if value is False:
+                    self._cancel_until(0)
+                    return False
+                self.trail_lim.append(len(self.trail))
+                if value is None:
+                    lit = p
+                    break
+            if lit is None:
+                if decide is not None:
+                    lit = decide(self)
+                if lit is None:
+                    lit = self._pick_branch()
+                    if lit is None:
+                        return True
+                self.trail_lim.append(len(self.trail))
+            self.decisions += 1
+            self._enqueue(lit, None)
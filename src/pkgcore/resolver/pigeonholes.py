@@ -9,11 +9,21 @@ class PigeonHoledSlots:
     """class for tracking slotting to a specific atom/obj key
     no atoms present, just prevents conflicts of obj.key; atom present, assumes
     it's a blocker and ensures no obj matches the atom for that key
+
+    Slotted objs are indexed both by key and by (key, slot), and limiters by
+    key; entries are tracked by identity so inserts, removals, and slot
+    conflict lookups don't scan everything stored for a key.
     """
 
     def __init__(self):
+        # key -> {id(obj): obj}, kept in insertion order
         self.slot_dict = {}
+        # (key, slot) -> {id(obj): obj}; more than one obj only when forced
+        self.slots = {}
+        # key -> {id(atom): atom}, kept in insertion order
         self.limiters = {}
+        # set of keys accessed, only tracked when set
+        self.touched = None
 
     def fill_slotting(self, obj, force=False):
         """Try to insert obj in.
@@ -24,23 +34,35 @@ class PigeonHoledSlots:
         l = self.check_limiters(obj)
 
         key = obj.key
-        dslot = obj.slot
-        l.extend(x for x in self.slot_dict.get(key, ()) if x.slot == dslot)
+        slot_key = (key, obj.slot)
+        slotted = self.slots.get(slot_key)
+        if slotted:
+            l.extend(slotted.values())
 
         if not l or force:
-            self.slot_dict.setdefault(key, []).append(obj)
+            if slotted is None:
+                slotted = self.slots[slot_key] = {}
+            slotted[id(obj)] = obj
+            self.slot_dict.setdefault(key, {})[id(obj)] = obj
         return l
 
     def get_conflicting_slot(self, pkg):
-        for x in self.slot_dict.get(pkg.key, ()):
-            if pkg.slot == x.slot:
-                return x
+        if self.touched is not None:
+            self.touched.add(pkg.key)
+        slotted = self.slots.get((pkg.key, pkg.slot))
+        if slotted:
+            return next(iter(slotted.values()))
         return None
 
     def find_atom_matches(self, atom, key=None):
         if key is None:
             key = atom.key
-        return list(filter(atom.match, self.slot_dict.get(key, ())))
+        if self.touched is not None:
+            self.touched.add(key)
+        slotted = self.slot_dict.get(key)
+        if not slotted:
+            return []
+        return list(filter(atom.match, slotted.values()))
 
     def add_limiter(self, atom, key=None):
         """add a limiter, returning any conflicting objs"""
@@ -52,38 +74,46 @@ class PigeonHoledSlots:
 
         if key is None:
             key = atom.key
-        self.limiters.setdefault(key, []).append(atom)
+        self.limiters.setdefault(key, {})[id(atom)] = atom
         return self.find_atom_matches(atom, key=key)
 
     def check_limiters(self, obj):
         """return any limiters conflicting w/ the passed in obj"""
-        key = obj.key
-        return [x for x in self.limiters.get(key, ()) if x.match(obj)]
+        if self.touched is not None:
+            self.touched.add(obj.key)
+        limiters = self.limiters.get(obj.key)
+        if not limiters:
+            return []
+        return [x for x in limiters.values() if x.match(obj)]
 
     def remove_slotting(self, obj):
         key = obj.key
+        if self.touched is not None:
+            self.touched.add(key)
         # let the key error be thrown if they screwed up.
-        slots = self.slot_dict.get(key, ())
-        l = [x for x in slots if x is not obj]
-        if len(l) == len(slots):
+        slotted = self.slot_dict.get(key)
+        if not slotted or slotted.pop(id(obj), None) is None:
             raise KeyError(f"obj {obj} isn't slotted")
-        if l:
-            self.slot_dict[key] = l
-        else:
+        if not slotted:
             del self.slot_dict[key]
+        slot_key = (key, obj.slot)
+        slotted = self.slots[slot_key]
+        del slotted[id(obj)]
+        if not slotted:
+            del self.slots[slot_key]
 
     def remove_limiter(self, atom, key=None):
         if key is None:
             key = atom.key
-        l = [x for x in self.limiters[key] if x is not atom]
-        if len(l) == len(self.limiters[key]):
+        if self.touched is not None:
+            self.touched.add(key)
+        limiters = self.limiters[key]
+        if limiters.pop(id(atom), None) is None:
             raise KeyError(f"obj {atom} isn't slotted")
-        if not l:
+        if not limiters:
             del self.limiters[key]
-        else:
-            self.limiters[key] = l
 
     def __contains__(self, obj):
         if isinstance(obj, restriction.base):
-            return obj in self.limiters.get(obj.key, ())
-        return obj in self.slot_dict.get(obj.key, ())
+            return obj in self.limiters.get(obj.key, {}).values()
+        return obj in self.slots.get((obj.key, obj.slot), {}).values()
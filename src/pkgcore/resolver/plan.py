@@ -15,6 +15,7 @@ from ..repository import filtered, misc, multiplex, util
 from ..restrictions import packages, restriction, values
 from . import state
 from .choice_point import choice_point
+from .stats import resolver_stats
 
 limiters = {"cycle"}
 
@@ -110,7 +111,7 @@ def lowest_iter_sort(l, pkg_grabber=pkg_grabber):
     return l
 
 
-class MutableContainmentRestriction(values.base):
+class MutableContainmentRestriction(values.base, caching=False):
     __slots__ = ("_blacklist", "match")
 
     def __init__(self, blacklist):
@@ -213,8 +214,9 @@ class resolver_stack(deque):
     # this *has* to be a property, else it creates a cycle.
     parent = property(lambda s: s)
 
-    def __init__(self):
+    def __init__(self, stats=None):
         self.events = []
+        self.stats = stats
 
     def __str__(self):
         return "resolver stack:\n  {}".format("\n  ".join(str(x) for x in self))
@@ -241,6 +243,8 @@ class resolver_stack(deque):
             vdb_limited=vdb_limited,
         )
         self.append(frame)
+        if self.stats is not None:
+            self.stats.incr("frames_pushed")
         return frame
 
     def add_event(self, event):
@@ -251,6 +255,8 @@ class resolver_stack(deque):
 
     def pop_frame(self, result):
         frame = self.pop()
+        if self.stats is not None:
+            self.stats.incr("frames_popped")
         frame.succeeded = bool(result)
         frame.parent.events.append(frame)
 
@@ -303,6 +309,10 @@ class merge_plan:
         debug=False,
         debug_handle=None,
         pdb_intercept=None,
+        stats=False,
+        cache_max_entries=None,
+        cache_max_weight=None,
+        memoize_failures=True,
     ):
         if debug:
             if debug_handle is None:
@@ -328,7 +338,15 @@ class merge_plan:
             depset_reorder_strategy = self.default_depset_reorder_strategy
 
         self.depset_reorder = depset_reorder_strategy
-        self.all_raw_dbs = [misc.caching_repo(x, per_repo_strategy) for x in dbs]
+        self.all_raw_dbs = [
+            misc.caching_repo(
+                x,
+                per_repo_strategy,
+                max_entries=cache_max_entries,
+                max_weight=cache_max_weight,
+            )
+            for x in dbs
+        ]
         self.all_dbs = global_strategy(self.all_raw_dbs)
         self.default_dbs = self.all_dbs
 
@@ -352,6 +370,33 @@ class merge_plan:
             )
             self._debugging_depth = 0
             self._debugging_drop_cycles = False
+        if cache_max_entries is not None or cache_max_weight is not None:
+            # keep query results for atoms of live frames cached
+            self._rec_add_atom = partial(
+                self._cache_pinning_rec_add_atom, self._rec_add_atom
+            )
+
+        # (atom, mode, dbs, drop_cycles) -> recent failures for the atom
+        self.failures = {}
+        self._failure_tracking = []
+        if memoize_failures:
+            self._rec_add_atom = partial(
+                self._memoizing_rec_add_atom, self._rec_add_atom
+            )
+
+        self.stats = None
+        if stats:
+            self._enable_stats()
+
+    def _enable_stats(self):
+        """Instrument this resolver instance, see :obj:`resolver_stats`."""
+        self.stats = stats = resolver_stats()
+        stats.track_backtracks(self.state)
+        for attr in ("add_atoms", "_viable", "process_dependencies", "insert_choice"):
+            setattr(self, attr, stats.timed(attr.lstrip("_"), getattr(self, attr)))
+        self.notify_trying_choice = stats.counted(
+            "choices_tried", self.notify_trying_choice
+        )
 
     @property
     def forced_restrictions(self):
@@ -414,7 +459,7 @@ class merge_plan:
 
     def add_atoms(self, restricts, finalize=False):
         if restricts:
-            stack = resolver_stack()
+            stack = resolver_stack(self.stats)
             for restrict in restricts:
                 state.add_hardref_op(restrict).apply(self.state)
             dbs = self.default_dbs
@@ -465,6 +510,100 @@ class merge_plan:
             self._debugging_drop_cycles = False
         return ret
 
+    def _cache_pinning_rec_add_atom(self, func, atom, stack, dbs, **kwds):
+        for repo in self.all_raw_dbs:
+            repo.pin(atom)
+        try:
+            return func(atom, stack, dbs, **kwds)
+        finally:
+            for repo in self.all_raw_dbs:
+                repo.unpin(atom)
+
+    def _memoizing_rec_add_atom(
+        self, func, atom, stack, dbs, mode="none", drop_cycles=False
+    ):
+        """Memoize atom failures across backtracking.
+
+        The outcome of resolving an atom is determined by the state of the
+        pkg keys accessed while resolving it, along with whether any stack
+        frame above it collides with the cycle checks done below it.  Failures
+        are recorded with a fingerprint of both, and are replayed when the
+        same atom is requested again in a matching state.  Failures due to
+        cycles with the frames above it are never recorded.
+        """
+        memo_key = (atom, mode, id(dbs), drop_cycles)
+        tracking = self._failure_tracking
+        if entries := self.failures.get(memo_key):
+            stack_slots = self._stack_slots(stack)
+            for keys, cycle_slots, fingerprint, failure in entries:
+                if stack_slots.isdisjoint(cycle_slots) and (
+                    self.state.fingerprint(keys) == fingerprint
+                ):
+                    if tracking:
+                        tracking[-1][0].update(keys)
+                        tracking[-1][1].update(cycle_slots)
+                    stack.add_frame(
+                        mode,
+                        atom,
+                        choice_point(atom, ()),
+                        dbs,
+                        self.state.current_state,
+                        drop_cycles,
+                        vdb_limited=dbs == self.livefs_dbs,
+                    )
+                    self.notify_viable(
+                        stack, atom, False, "previously failed in an identical state"
+                    )
+                    stack.pop_frame(False)
+                    if self.stats is not None:
+                        self.stats.incr("failure_memo_hits")
+                    return list(failure)
+
+        slots = self.state.state
+        start_point = self.state.current_state
+        keys, cycle_slots = set(), set()
+        tracking.append((keys, cycle_slots))
+        slots.touched = keys
+        try:
+            ret = func(atom, stack, dbs, mode=mode, drop_cycles=drop_cycles)
+        finally:
+            tracking.pop()
+            if tracking:
+                parent_keys, parent_cycle_slots = tracking[-1]
+                parent_keys.update(keys)
+                parent_cycle_slots.update(cycle_slots)
+                slots.touched = parent_keys
+            else:
+                slots.touched = None
+
+        if (
+            ret
+            and self.state.current_state == start_point
+            and self._stack_slots(stack).isdisjoint(cycle_slots)
+        ):
+            keys = frozenset(keys)
+            entries = self.failures.setdefault(
+                memo_key, deque(maxlen=self._memoized_failures_per_atom)
+            )
+            entries.append(
+                (keys, frozenset(cycle_slots), self.state.fingerprint(keys), tuple(ret))
+            )
+            if self.stats is not None:
+                self.stats.incr("failures_memoized")
+        return ret
+
+    # limit the number of failure states tracked per atom
+    _memoized_failures_per_atom = 16
+
+    @staticmethod
+    def _stack_slots(stack):
+        """Return the (key, slot) pairs of the pkgs for all frames in a stack."""
+        return {
+            (pkg.key, pkg.slot)
+            for pkg in (frame.current_pkg for frame in stack)
+            if pkg is not None
+        }
+
     def _rec_add_atom(self, atom, stack, dbs, mode="none", drop_cycles=False):
         """Add an atom.
 
@@ -645,6 +784,8 @@ class merge_plan:
                 matches = caching_iter(dbs.itermatch(atom))
                 if matches:
                     choices = choice_point(atom, matches)
+                    if self.stats is not None:
+                        self.stats.incr("choice_points")
                     # ignore what dropped out, at this juncture we don't care.
                     choices.reduce_atoms(self.insoluble)
                     if not choices:
@@ -689,6 +830,10 @@ class merge_plan:
             value to return after collapsing the calling frame
         """
         force_vdb = False
+        if self._failure_tracking:
+            # the result depends on the frames matching this slot
+            pkg = cur_frame.current_pkg
+            self._failure_tracking[-1][1].add((pkg.key, pkg.slot))
         for frame in stack.slot_cycles(cur_frame, reverse=True):
             if not any(
                 f.mode == "pdepend"
@@ -0,0 +1,215 @@
+"""
+persisted resolver plans
+
+Resolving large targets such as ``@world`` repeatedly while nothing changed
+produces the same plan each time.  :obj:`plan_cache` stores the final ops of a
+plan keyed by a fingerprint of everything resolution depends on- the targets,
+resolver options, the on disk state of the source and installed repos and the
+domain configuration- so later runs with a matching fingerprint can skip
+resolution entirely.
+
+Repo state is tracked via the modification times of repo directories two
+levels deep, i.e. the category and package directories of ebuild repos and
+vdbs, along with their metadata caches.  Adding, removing or replacing
+packages is detected that way, while files modified in place aren't.
+"""
+
+__all__ = ("plan_cache",)
+
+import hashlib
+import json
+import os
+from collections.abc import Mapping
+from operator import itemgetter
+from os.path import join as pjoin
+
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.osutils import ensure_dirs
+
+from ..ebuild.atom import atom
+from ..log import logger
+from ..repository.util import get_raw_repos
+from . import state
+
+
+def _normalize(value):
+    """Convert a value into a deterministic, JSON serializable form."""
+    if isinstance(value, (set, frozenset)):
+        # sort on the serialized form, the iteration order of sets depends on
+        # the per process hash seed
+        return sorted((_normalize(x) for x in value), key=json.dumps)
+    elif isinstance(value, (list, tuple)):
+        return [_normalize(x) for x in value]
+    elif isinstance(value, Mapping):
+        items = ((str(k), _normalize(v)) for k, v in value.items())
+        return dict(sorted(items, key=itemgetter(0)))
+    elif value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def _tree_state(path, depth=2):
+    """Yield (path, mtime) for a directory and its subdirectories up to a depth."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    yield path, st.st_mtime_ns
+    if not depth:
+        return
+    try:
+        entries = sorted(os.scandir(path), key=lambda x: x.name)
+    except (NotADirectoryError, PermissionError):
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _tree_state(entry.path, depth - 1)
+        else:
+            # top level files such as metadata/timestamp.chk or a vdb COUNTER
+            yield entry.path, entry.stat(follow_symlinks=False).st_mtime_ns
+
+
+def _files_state(path):
+    """Yield (path, mtime) for all files below a path."""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = pjoin(root, name)
+            try:
+                yield file_path, os.stat(file_path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+
+class plan_cache:
+    """Persisted resolver plans.
+
+    :param location: directory plans are stored in
+    :param max_plans: number of plans kept, older ones are removed when new
+        plans are stored
+    """
+
+    # bump when the stored format or fingerprinted data changes
+    version = 2
+
+    def __init__(self, location, max_plans=8):
+        self.location = location
+        self.max_plans = max_plans
+
+    def fingerprint(self, targets, options, source_repos, installed_repos, domain):
+        """Return a fingerprint of the inputs to dependency resolution.
+
+        :param targets: target restrictions
+        :param options: mapping of options affecting resolution
+        :param source_repos: repos packages are merged from
+        :param installed_repos: repos of installed packages
+        :param domain: :obj:`pkgcore.ebuild.domain.domain` instance
+        """
+        chf = hashlib.sha256()
+
+        def update(*data):
+            chf.update(json.dumps(_normalize(data)).encode())
+            chf.update(b"\0")
+
+        update("version", self.version)
+        update("targets", sorted(map(str, targets)))
+        update("options", options)
+        for kind, repos in (("source", source_repos), ("installed", installed_repos)):
+            for repo in get_raw_repos(repos):
+                location = getattr(repo, "location", None)
+                update(kind, getattr(repo, "repo_id", None), location)
+                if location and os.path.isdir(location):
+                    for path_state in _tree_state(location):
+                        update(path_state)
+        update("settings", domain.settings)
+        for node in domain.profile.stack:
+            update("profile", node.path)
+            for path_state in _files_state(node.path):
+                update(path_state)
+        if os.path.isdir(domain.config_dir):
+            for path_state in _files_state(domain.config_dir):
+                update(path_state)
+        return chf.hexdigest()
+
+    def _path(self, fingerprint):
+        return pjoin(self.location, fingerprint)
+
+    def store(self, fingerprint, ops):
+        """Store the ops of a plan under a fingerprint."""
+        entries = []
+        for op in ops:
+            entry = {"op": op.desc, "pkg": self._pkg_key(op.pkg)}
+            if op.desc == "replace":
+                entry["old"] = self._pkg_key(op.old_pkg)
+            entries.append(entry)
+        try:
+            ensure_dirs(self.location, mode=0o755)
+            with AtomicWriteFile(self._path(fingerprint)) as f:
+                json.dump({"version": self.version, "ops": entries}, f)
+        except OSError as e:
+            logger.warning("failed storing resolver plan: %s", e)
+            return False
+        self.prune()
+        return True
+
+    def load(self, fingerprint, source_repos, installed_repos):
+        """Return the stored ops for a fingerprint.
+
+        Packages are looked up again in the given repos, returning None if
+        there's no stored plan or its packages can't be found anymore.
+        """
+        try:
+            with open(self._path(fingerprint)) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("failed loading resolver plan: %s", e)
+            return None
+        if data.get("version") != self.version:
+            return None
+
+        ops = []
+        try:
+            for entry in data["ops"]:
+                if entry["op"] == "remove":
+                    pkg = self._find_pkg(installed_repos, entry["pkg"])
+                    op = state.remove_op(None, pkg)
+                else:
+                    pkg = self._find_pkg(source_repos, entry["pkg"])
+                    if entry["op"] == "replace":
+                        op = state.replace_op(None, pkg)
+                        op.old_pkg = self._find_pkg(installed_repos, entry["old"])
+                    else:
+                        op = state.add_op(None, pkg)
+                ops.append(op)
+        except (KeyError, TypeError, LookupError):
+            return None
+        # mark the plan as recently used
+        os.utime(self._path(fingerprint))
+        return ops
+
+    def prune(self):
+        """Remove the least recently used plans beyond the cache size limit."""
+        try:
+            entries = [x for x in os.scandir(self.location) if x.is_file()]
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda x: x.stat().st_mtime_ns, reverse=True)
+        for entry in entries[self.max_plans :]:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _pkg_key(pkg):
+        return [pkg.cpvstr, getattr(pkg.repo, "repo_id", None)]
+
+    @staticmethod
+    def _find_pkg(repos, key):
+        cpvstr, repo_id = key
+        for pkg in repos.itermatch(atom(f"={cpvstr}")):
+            if getattr(pkg.repo, "repo_id", None) == repo_id:
+                return pkg
+        raise LookupError(cpvstr)
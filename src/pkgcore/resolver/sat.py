@@ -0,0 +1,412 @@
+"""
+SAT based resolver backend
+
+Alternative to the depth first search of :obj:`pkgcore.resolver.plan.merge_plan`
+that encodes the dependency problem into CNF and solves it with the in-tree
+:obj:`pkgcore.resolver.cdcl.cdcl_solver`.  Every pkg reachable from the
+targets gets a variable that's true if the pkg is part of the resulting
+system; clauses encode dependencies, blockers, slot uniqueness, and that
+installed pkgs stay unless replaced within their slot; the dependencies of
+installed pkgs are only enforced once something depends on them, as the
+default resolver leaves untouched installed pkgs alone.
+
+Branching follows the default resolver: requirements are walked depth first
+from the targets in the order :obj:`pkgcore.resolver.plan.merge_plan`
+processes dependencies, or-groups are ordered by the resolver's depset reorder
+strategy- the default strategy being evaluated against the current assignment,
+as it depends on the resolver state- and matches are tried in the order the
+configured strategies return them.  Plans match those of the default resolver
+apart from two cases:
+
+* alternatives the default resolver rejects because of a dependency cycle
+  through the pkgs it's currently resolving; the SAT backend isn't bound to a
+  resolution order and may pick such alternatives instead.
+* blockers against installed pkgs already reused by the plan; the default
+  resolver replaces the blocked pkg, while the SAT backend keeps its earlier
+  choice and picks another alternative where possible.
+
+The solution is converted into regular :obj:`pkgcore.resolver.state` ops
+against a :obj:`pkgcore.resolver.state.plan_state`, so consumers of
+:obj:`merge_plan` results need no changes.
+"""
+
+__all__ = ("sat_merge_plan",)
+
+from collections import defaultdict
+from itertools import chain
+
+from . import plan, state
+from .cdcl import cdcl_solver
+from .choice_point import choice_point
+
+
+class _encoder:
+    """Incrementally encode the pkgs reachable from a set of atoms into CNF."""
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.solver = cdcl_solver()
+        self.pkg_vars = {}
+        self.var_pkgs = {}
+        # installed pkgs required by dependencies, only these get their own
+        # dependencies enforced
+        self.used_vars = {}
+        self.slots = defaultdict(list)
+        self.matches = {}
+        self.livefs_matches = {}
+        self.deps = {}
+        # requirement clauses: (guard var, alternatives), alternatives being
+        # (installed flag, candidate vars) tuples
+        self.requirements = []
+        self.target_requirements = []
+        self.pkg_requirements = defaultdict(list)
+        # installed pkgs staying or being replaced within their slot, only
+        # branched on once all other requirements are satisfied
+        self.installed = []
+        self.targets = {}
+        # the default strategy depends on the resolver state, so it's
+        # applied while branching instead
+        self.dynamic_reorder = (
+            resolver.depset_reorder == resolver.default_depset_reorder_strategy
+        )
+        # dependencies without any matches
+        self.unmatched = set()
+        self._queue = []
+        # depth first walk state, kept across decisions until backtracking
+        self._walk = None
+
+    def match(self, restrict):
+        """Return the ordered candidate pkgs for a restriction."""
+        matches = self.matches.get(restrict)
+        if matches is None:
+            matches = self.matches[restrict] = tuple(
+                self.resolver.default_dbs.itermatch(restrict)
+            )
+        return matches
+
+    def match_livefs(self, restrict):
+        """Return installed pkgs matching a restriction.
+
+        Unlike :obj:`merge_plan.livefs_dbs` this isn't filtered by the pkgs
+        replaced in the current plan.
+        """
+        matches = self.livefs_matches.get(restrict)
+        if matches is None:
+            matches = self.livefs_matches[restrict] = tuple(
+                chain.from_iterable(
+                    repo.itermatch(restrict)
+                    for repo in self.resolver.all_raw_dbs
+                    if repo.livefs
+                )
+            )
+        return matches
+
+    def var(self, pkg):
+        """Return the variable for a pkg, queueing it for encoding if new."""
+        v = self.pkg_vars.get(pkg)
+        if v is None:
+            v = self.pkg_vars[pkg] = self.solver.new_var()
+            self.var_pkgs[v] = pkg
+            if pkg.repo.livefs:
+                used = self.used_vars[pkg] = self.solver.new_var()
+                self.var_pkgs[used] = pkg
+                self.solver.add_clause([-used, v])
+            self._queue.append(pkg)
+        return v
+
+    def dep_var(self, pkg):
+        """Return the variable for a pkg satisfying a dependency."""
+        v = self.var(pkg)
+        return self.used_vars.get(pkg, v)
+
+    def add_target(self, restrict):
+        """Encode a target, returning its assumption variable."""
+        v = self.targets.get(restrict)
+        if v is None:
+            v = self.targets[restrict] = self.solver.new_var()
+            candidates = [self.dep_var(pkg) for pkg in self.match(restrict)]
+            self.target_requirements.append((v, [(False, candidates)]))
+            self.solver.add_clause([-v, *candidates])
+            self.process()
+        return v
+
+    def dep_groups(self, pkg):
+        attrs = ["rdepend", "idepend", "pdepend"]
+        if not pkg.built or self.resolver.process_built_depends:
+            attrs = ["depend", "bdepend"] + attrs
+        for attr in attrs:
+            for or_group in getattr(pkg, attr).cnf_solutions():
+                yield attr, or_group
+
+    def reorder(self, attr, or_group):
+        """Order or-group alternatives using the resolver's reorder strategy."""
+        if len(or_group) == 1 or self.dynamic_reorder:
+            return or_group
+        return next(iter(self.resolver.depset_reorder([or_group], attr)), or_group)
+
+    def process(self):
+        """Encode all queued pkgs, along with anything they pull in."""
+        solver = self.solver
+        while self._queue:
+            pkg = self._queue.pop(0)
+            v = self.pkg_vars[pkg]
+
+            # at most one pkg per slot
+            slot_key = (pkg.key, pkg.slot)
+            slotted = self.slots[slot_key]
+            for other in slotted:
+                solver.add_clause([-v, -other])
+            slotted.append(v)
+
+            if pkg.repo.livefs:
+                # installed pkgs stay unless replaced within their slot
+                candidates = [v] + [self.var(x) for x in self.match(pkg.slotted_atom)]
+                self.installed.append((None, [(True, candidates)]))
+                solver.add_clause(candidates)
+            else:
+                for installed in self.match_livefs(pkg.slotted_atom):
+                    self.var(installed)
+
+            # untouched installed pkgs aren't checked for broken dependencies
+            guard = self.used_vars.get(pkg, v)
+            deps = self.deps[pkg] = []
+            for attr, or_group in self.dep_groups(pkg):
+                alternatives = []
+                for atom in self.reorder(attr, or_group):
+                    if atom.blocks:
+                        blocked_pkgs = self.match(atom) + self.match_livefs(atom)
+                        for blocked in dict.fromkeys(blocked_pkgs):
+                            if blocked is not pkg:
+                                solver.add_clause([-guard, -self.var(blocked)])
+                        continue
+                    matches = [self.dep_var(x) for x in self.match(atom)]
+                    if not matches:
+                        self.unmatched.add(atom)
+                    deps.append((attr, matches))
+                    alternatives.append((bool(self.match_livefs(atom)), matches))
+                if alternatives:
+                    self.requirements.append((guard, alternatives))
+                    self.pkg_requirements[pkg].append((guard, alternatives))
+                    solver.add_clause(
+                        [-guard, *chain.from_iterable(x for _, x in alternatives)]
+                    )
+
+    def _branch(self, alternatives, assigns):
+        """Return the literal to branch on for a requirement, if any.
+
+        Returns a (literal, pkg) tuple, with pkg being the pkg satisfying the
+        requirement if it's already satisfied.
+        """
+        if self.dynamic_reorder and len(alternatives) > 1:
+            # default_depset_reorder_strategy() against the current
+            # assignment: alternatives matching installed or already selected
+            # pkgs come first
+            def reused(alternative):
+                installed, candidates = alternative
+                return installed or any(assigns[x] for x in candidates)
+
+            alternatives = sorted(alternatives, key=lambda x: not reused(x))
+        for _, candidates in alternatives:
+            lit = None
+            for candidate in candidates:
+                value = assigns[candidate]
+                if value:
+                    return None, self.var_pkgs[candidate]
+                elif value is None and lit is None:
+                    lit = candidate
+            if lit is not None:
+                return lit, None
+            # all matches excluded, try the next alternative
+        return None, None
+
+    def solve(self, targets):
+        """Solve for the given target assumption variables."""
+        self._walk = None
+        return self.solver.solve(targets, decide=self.decide)
+
+    def decide(self, solver):
+        """Branch on the first viable alternative of the first unsatisfied requirement.
+
+        Requirements are walked depth first from the targets, matching the
+        order the default resolver processes dependencies in.  As with the
+        default resolver, or-group alternatives are tried in the order of the
+        depset reorder strategy- evaluated against the current assignment for
+        the default strategy- and an alternative is only skipped once all its
+        matches have been excluded.  Dependencies are branched on before
+        installed pkgs are kept, so the version picked for a dependency
+        follows the match order of the configured strategies, e.g. upgrading
+        installed pkgs for :obj:`pkgcore.ebuild.resolver.upgrade_resolver`.
+        Once all requirements are satisfied the remaining pkgs are excluded,
+        keeping the solver from pulling in anything that isn't needed.
+        """
+        assigns = solver.assigns
+        walk = self._walk
+        if walk is None or walk[0] != solver.conflicts or walk[1] > len(solver.trail):
+            visited = set()
+            stack = [iter(chain(self.target_requirements, self.installed))]
+        else:
+            stack, visited = walk[2:]
+        while stack:
+            requirement = next(stack[-1], None)
+            if requirement is None:
+                stack.pop()
+                continue
+            guard, alternatives = requirement
+            if guard is not None and not assigns[guard]:
+                continue
+            lit, pkg = self._branch(alternatives, assigns)
+            if lit is not None:
+                # revisit the requirement once the decision is propagated
+                stack.append(iter((requirement,)))
+                self._walk = (solver.conflicts, len(solver.trail), stack, visited)
+                return lit
+            if pkg is not None and pkg not in visited:
+                visited.add(pkg)
+                stack.append(iter(self.pkg_requirements[pkg]))
+        self._walk = (solver.conflicts, len(solver.trail), stack, visited)
+        # requirements of selected pkgs that weren't reached
+        for guard, alternatives in self.requirements:
+            if assigns[guard]:
+                lit, _ = self._branch(alternatives, assigns)
+                if lit is not None:
+                    return lit
+        for v in self.var_pkgs:
+            if assigns[v] is None:
+                return -v
+        return None
+
+
+class sat_merge_plan(plan.merge_plan):
+    """Resolver solving the dependency problem as a SAT instance.
+
+    Accepts the same arguments as :obj:`pkgcore.resolver.plan.merge_plan`;
+    cycle dropping and debug output only apply to the default resolver.
+    """
+
+    def __init__(self, *args, **kwds):
+        super().__init__(*args, **kwds)
+        self._encoder = None
+
+    def reset(self, point=0):
+        super().reset(point)
+        self._encoder = None
+
+    def add_atoms(self, restricts, finalize=False):
+        if restricts:
+            for restrict in restricts:
+                state.add_hardref_op(restrict).apply(self.state)
+            if self._encoder is None:
+                self._encoder = _encoder(self)
+            encoder = self._encoder
+            targets = [encoder.add_target(restrict) for restrict in restricts]
+            solver = encoder.solver
+            if not encoder.solve(targets):
+                self._update_stats(solver)
+                return self._failure(restricts, targets)
+            self._update_stats(solver)
+            self._apply_solution(restricts)
+        if finalize:
+            self.process_finalize()
+        return ()
+
+    def _update_stats(self, solver):
+        if self.stats is None:
+            return
+        encoder = self._encoder
+        stats = {
+            "sat_vars": solver.num_vars,
+            "sat_clauses": len(solver.clauses),
+            "sat_learnt_clauses": len(solver.learnts),
+            "sat_conflicts": solver.conflicts,
+            "sat_decisions": solver.decisions,
+            "sat_pkgs": len(encoder.pkg_vars),
+        }
+        for name, value in stats.items():
+            self.stats.counters[name] = value
+
+    def _failure(self, restricts, targets):
+        """Find the first target that can't be added and describe why."""
+        solver = self._encoder.solver
+        for idx, restrict in enumerate(restricts):
+            if not solver.solve(targets[: idx + 1]):
+                break
+        matches = self._encoder.match(restrict)
+        if matches:
+            self.insoluble.update(self._encoder.unmatched)
+            msg = "conflicts with other dependencies or targets"
+        else:
+            self.insoluble.add(restrict)
+            msg = "no matches"
+        stack = plan.resolver_stack()
+        stack.add_frame(
+            "none",
+            restrict,
+            choice_point(restrict, matches),
+            self.default_dbs,
+            self.state.current_state,
+            False,
+        )
+        for pkg in matches:
+            stack.add_event(("inspecting", pkg))
+            self.notify_viable(stack, restrict, False, msg)
+        if not matches:
+            self.notify_viable(stack, restrict, False, msg)
+        stack.pop_frame(False)
+        return [restrict], stack.events[-1]
+
+    def _ordered_solution(self, restricts):
+        """Return selected pkgs ordered so dependencies come first."""
+        encoder = self._encoder
+        solver = encoder.solver
+        selected = set()
+        for v, pkg in encoder.var_pkgs.items():
+            if solver.value(v):
+                selected.add(pkg)
+
+        ordered = []
+        visited = set()
+        post_deps = []
+
+        def visit(pkg):
+            if pkg in visited:
+                return
+            visited.add(pkg)
+            for attr, matches in encoder.deps[pkg]:
+                for v in matches:
+                    dep = encoder.var_pkgs[v]
+                    if dep in selected:
+                        if attr == "pdepend":
+                            post_deps.append(dep)
+                        else:
+                            visit(dep)
+                        break
+            ordered.append(pkg)
+
+        for restrict in restricts:
+            for pkg in encoder.match(restrict):
+                if pkg in selected:
+                    visit(pkg)
+                    break
+            while post_deps:
+                visit(post_deps.pop(0))
+        return ordered
+
+    def _apply_solution(self, restricts):
+        for pkg in self._ordered_solution(restricts):
+            if pkg in self.state.pkg_choices:
+                continue
+            choices = choice_point(pkg.versioned_atom, [pkg])
+            if pkg.repo.livefs:
+                state.add_op(choices, pkg, force=True).apply(self.state)
+                continue
+            for old in self._encoder.match_livefs(pkg.slotted_atom):
+                if (
+                    old not in self.state.pkg_choices
+                    and old not in self.state.vdb_filter
+                ):
+                    old_choices = choice_point(old.versioned_atom, [old])
+                    state.add_op(old_choices, old, force=True).apply(self.state)
+            if self.state.state.get_conflicting_slot(pkg) is not None:
+                state.replace_op(choices, pkg).apply(self.state)
+            else:
+                state.add_op(choices, pkg).apply(self.state)
@@ -78,6 +78,26 @@ class plan_state:
             i = (x for x in i if x.pkg.package_is_real)
         return ops_sequence(i)
 
+    def fingerprint(self, keys):
+        """Return a hashable snapshot of the state for the given pkg keys.
+
+        Covers everything slotted and all limiters for the keys, along with
+        any of their pkgs filtered from the vdb.
+        """
+        slot_dict = self.state.slot_dict
+        limiters = self.state.limiters
+        return (
+            frozenset(
+                (
+                    key,
+                    frozenset(slot_dict.get(key, {}).values()),
+                    frozenset(limiters.get(key, {}).values()),
+                )
+                for key in keys
+            ),
+            frozenset(x for x in self.vdb_filter if x.key in keys),
+        )
+
     def __getitem__(self, slice):
         return self.plan[slice]
 
@@ -0,0 +1,122 @@
+"""
+resolver instrumentation
+
+Counters and timers collected by :obj:`pkgcore.resolver.plan.merge_plan` when
+instantiated with ``stats=True``; disabled resolvers carry none of the
+bookkeeping overhead.
+"""
+
+__all__ = ("resolver_stats",)
+
+import json
+from collections import defaultdict
+from functools import wraps
+from time import perf_counter
+
+
+class resolver_stats:
+    """Counters and timers for a single resolver instance.
+
+    Timers are cumulative; recursive invocations of the same timed function
+    are only measured at the outermost call so nested work isn't counted
+    multiple times.
+    """
+
+    counter_names = (
+        "frames_pushed",
+        "frames_popped",
+        "backtracks",
+        "ops_reverted",
+        "choice_points",
+        "choices_tried",
+        "failures_memoized",
+        "failure_memo_hits",
+    )
+
+    def __init__(self):
+        self.counters = dict.fromkeys(self.counter_names, 0)
+        self.timers = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._depth = defaultdict(int)
+
+    def incr(self, name, count=1):
+        self.counters[name] += count
+
+    def counted(self, name, functor):
+        """Wrap a callable, counting its invocations under ``name``."""
+
+        @wraps(functor)
+        def _inner(*args, **kwargs):
+            self.counters[name] += 1
+            return functor(*args, **kwargs)
+
+        return _inner
+
+    def timed(self, name, functor):
+        """Wrap a callable, tracking its call count and cumulative runtime."""
+
+        @wraps(functor)
+        def _inner(*args, **kwargs):
+            self.calls[name] += 1
+            depth = self._depth[name]
+            if depth:
+                # recursive call; the outermost invocation is timing this.
+                return functor(*args, **kwargs)
+            self._depth[name] = 1
+            start = perf_counter()
+            try:
+                return functor(*args, **kwargs)
+            finally:
+                self.timers[name] += perf_counter() - start
+                self._depth[name] = 0
+
+        return _inner
+
+    def track_backtracks(self, plan_state):
+        """Wrap the backtrack method of a plan state instance."""
+        functor = plan_state.backtrack
+
+        @wraps(functor)
+        def _inner(state_pos):
+            reverted = len(plan_state.plan) - state_pos
+            if reverted > 0:
+                self.counters["backtracks"] += 1
+                self.counters["ops_reverted"] += reverted
+            return functor(state_pos)
+
+        plan_state.backtrack = _inner
+
+    def collect(self, resolver):
+        """Return a JSON serializable mapping of all stats for a resolver.
+
+        :param resolver: :obj:`pkgcore.resolver.plan.merge_plan` instance the
+            stats were collected for
+        """
+        repos = {}
+        for repo in resolver.all_raw_dbs:
+            name = str(getattr(repo, "repo_id", None) or repo)
+            queries = repo.hits + repo.misses
+            repos[name] = {
+                "queries": queries,
+                "hits": repo.hits,
+                "misses": repo.misses,
+                "hit_rate": repo.hits / queries if queries else 0.0,
+                # every cache miss results in an itermatch call to the raw repo
+                "itermatch_calls": repo.misses,
+                "evictions": repo.evictions,
+            }
+        return {
+            "counters": dict(self.counters),
+            "insoluble": len(resolver.insoluble),
+            "plan_ops": len(resolver.state.plan),
+            "caching_repos": repos,
+            "timers": {
+                name: {"calls": self.calls[name], "seconds": self.timers[name]}
+                for name in sorted(self.timers)
+            },
+        }
+
+    def dump(self, resolver, handle):
+        """Write the stats for a resolver to a file handle in JSON format."""
+        json.dump(self.collect(resolver), handle, indent=2, sort_keys=True)
+        handle.write("\n")
@@ -3,8 +3,11 @@
 import argparse
 import logging
 import os
+import tempfile
 import textwrap
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from multiprocessing import cpu_count
 from os.path import join as pjoin
 from unittest.mock import patch
@@ -25,6 +28,7 @@ from ..operations import OperationError
 from ..operations import observer as observer_mod
 from ..package import mutated
 from ..package.errors import MetadataException
+from ..sync.delta import BlockManifest, manifest_suffix
 from ..util import commandline
 
 pkgcore_opts = commandline.ArgumentParser(domain=False, script=(__file__, __name__))
@@ -81,31 +85,43 @@ sync.add_argument(
 )
 
 
+sync.add_argument(
+    "-j",
+    "--jobs",
+    type=arghparse.positive_int,
+    default=1,
+    help="number of repos to sync in parallel",
+    docs="""
+        Number of repos to sync in parallel, defaults to syncing one repo at a
+        time. When syncing in parallel, the output of each sync is buffered
+        and shown in the order the repos were specified in.
+    """,
+)
+
+
+def _sync_repo(repo, options, output=None):
+    """Sync a repo, returning its status and a failure message if any."""
+    kwargs = {}
+    if output is not None:
+        kwargs["output"] = output
+    try:
+        ret = repo.operations.sync(
+            force=options.force, verbosity=options.verbosity, **kwargs
+        )
+    except OperationError as e:
+        exc = getattr(e, "__cause__", e)
+        if not isinstance(exc, PkgcoreUserException):
+            raise
+        return False, f": {exc}"
+    return ret, ""
+
+
 @sync.bind_main_func
 def sync_main(options, out, err):
     """Update local repos to match their remotes."""
     succeeded, failed = [], []
 
-    for repo_name, repo in unique_stable(options.repos):
-        # rewrite the name if it has the usual prefix
-        repo_name = repo_name.removeprefix("conf:")
-
-        if not repo.operations.supports("sync"):
-            continue
-        out.write(f"*** syncing {repo_name}")
-        ret = False
-        err_msg = ""
-        # repo operations don't yet take an observer, thus flush
-        # output to keep lines consistent.
-        out.flush()
-        err.flush()
-        try:
-            ret = repo.operations.sync(force=options.force, verbosity=options.verbosity)
-        except OperationError as e:
-            exc = getattr(e, "__cause__", e)
-            if not isinstance(exc, PkgcoreUserException):
-                raise
-            err_msg = f": {exc}"
+    def report(repo_name, ret, err_msg):
         if not ret:
             out.write(f"!!! failed syncing {repo_name}{err_msg}")
             failed.append(repo_name)
@@ -113,6 +129,40 @@ def sync_main(options, out, err):
             succeeded.append(repo_name)
             out.write(f"*** synced {repo_name}")
 
+    repos = []
+    for repo_name, repo in unique_stable(options.repos):
+        # rewrite the name if it has the usual prefix
+        repo_name = repo_name.removeprefix("conf:")
+        if repo.operations.supports("sync"):
+            repos.append((repo_name, repo))
+
+    if options.jobs == 1 or len(repos) == 1:
+        for repo_name, repo in repos:
+            out.write(f"*** syncing {repo_name}")
+            # repo operations don't yet take an observer, thus flush
+            # output to keep lines consistent.
+            out.flush()
+            err.flush()
+            report(repo_name, *_sync_repo(repo, options))
+    else:
+        with (
+            ExitStack() as stack,
+            ThreadPoolExecutor(max_workers=options.jobs) as executor,
+        ):
+            syncs = []
+            for repo_name, repo in repos:
+                output = stack.enter_context(tempfile.TemporaryFile())
+                future = executor.submit(_sync_repo, repo, options, output)
+                syncs.append((repo_name, output, future))
+            for repo_name, output, future in syncs:
+                result = future.result()
+                out.write(f"*** syncing {repo_name}")
+                output.seek(0)
+                if data := output.read().decode(errors="replace").rstrip("\n"):
+                    out.write(data)
+                report(repo_name, *result)
+                out.flush()
+
     out.flush()
     err.flush()
     total = len(succeeded) + len(failed)
@@ -462,6 +512,84 @@ def env_update_main(options, out, err):
     return 0
 
 
+owners_index = subparsers.add_parser(
+    "owners-index",
+    parents=shared_options_domain,
+    description="rebuild the file ownership index of installed packages",
+    docs="""
+        Rebuild the persistent path to owning package index used by
+        ``pquery --owns`` and collision protection from the CONTENTS files of
+        all installed packages.  The index is otherwise kept up to date
+        automatically; rebuilding is only necessary if it was corrupted.
+    """,
+)
+
+
+@owners_index.bind_main_func
+def owners_index_main(options, out, err):
+    ret = 0
+    for repo in options.domain.installed_repos:
+        index = getattr(repo, "_owners_index", None)
+        if index is None:
+            continue
+        out.write(f"rebuilding owners index for {repo.repo_id!r}...")
+        out.flush()
+        start_time = time.time()
+        if not index.rebuild():
+            err.write(f"{owners_index.prog}: failed rebuilding {index.path!r}")
+            ret = 1
+            continue
+        if options.verbosity > 0:
+            out.write(
+                f"indexed {len(index)} packages in "
+                f"{time.time() - start_time:.2f} seconds"
+            )
+    return ret
+
+
+block_manifest = subparsers.add_parser(
+    "block-manifest",
+    parents=shared_options,
+    description="generate block manifests for delta syncing",
+    docs="""
+        Generate block manifests of files published for HTTP based syncing,
+        e.g. squashfs repo snapshots.  Each manifest is written next to its
+        file with a ``.blocks`` suffix and allows syncers to only fetch the
+        parts of the file that changed since their last sync.  Manifests must
+        be regenerated whenever the published files change.
+    """,
+)
+block_manifest.add_argument(
+    "files", nargs="+", help="files to generate block manifests for"
+)
+
+
+@block_manifest.bind_main_func
+def block_manifest_main(options, out, err):
+    ret = 0
+    for path in options.files:
+        target = path + manifest_suffix
+        try:
+            manifest = BlockManifest.generate(path)
+        except OSError as e:
+            err.write(f"{block_manifest.prog}: failed reading {path!r}: {e.strerror}")
+            ret = 1
+            continue
+        try:
+            with AtomicWriteFile(target) as f:
+                f.write(manifest.serialize())
+        except OSError as e:
+            err.write(
+                f"{block_manifest.prog}: failed writing {target!r}: "
+                f"{_write_error(e, target)}"
+            )
+            ret = 1
+            continue
+        if options.verbosity > 0:
+            out.write(f"{target}: {len(manifest.blocks)} blocks")
+    return ret
+
+
 class EclassArgs(argparse.Action):
     """Determine eclass arguments for `pmaint eclass`."""
 
@@ -5,15 +5,19 @@ system. It provides an interface to install, update, and uninstall ebuilds from
 source or binary packages.
 """
 
+import argparse
 import sys
 from functools import partial
+from os.path import join as pjoin
 from textwrap import dedent
 from time import time
 
+from snakeoil.cli import arghparse
 from snakeoil.cli.exceptions import ExitException
 from snakeoil.sequences import iflatten_instance, stable_unique
 from snakeoil.strings import pluralism
 
+from .. import const
 from ..config.basics import ConfigSectionFromStringDict
 from ..ebuild import resolver, restricts
 from ..ebuild.atom import atom
@@ -22,6 +26,8 @@ from ..merge import errors as merge_errors
 from ..operations import format, observer
 from ..repository.util import get_raw_repos
 from ..repository.virtual import RestrictionRepo
+from ..resolver.plan_cache import plan_cache
+from ..resolver.sat import sat_merge_plan
 from ..resolver.util import reduce_to_failures
 from ..restrictions import packages
 from ..restrictions.boolean import OrRestriction
@@ -319,6 +325,77 @@ resolution_options.add_argument(
         (pkg_pretend), fetching, dep resolution, and (un)merging.
     """,
 )
+resolution_options.add_argument(
+    "--resolver-cache-entries",
+    type=arghparse.positive_int,
+    metavar="ENTRIES",
+    help="limit the number of cached resolver queries per repo",
+    docs="""
+        Limit the number of repo queries the resolver caches per repo,
+        evicting the least recently used ones first. Queries for packages
+        currently being resolved are never evicted. By default the cache is
+        unbounded which is fastest, but can use a lot of memory for large
+        resolutions, e.g. deep @world updates.
+    """,
+)
+resolution_options.add_argument(
+    "--resolver-cache-pkgs",
+    type=arghparse.positive_int,
+    metavar="PKGS",
+    help="limit the number of packages held by cached resolver queries per repo",
+    docs="""
+        Limit the approximate number of package instances held by the
+        resolver's query cache per repo, evicting the least recently used
+        queries first. See --resolver-cache-entries.
+    """,
+)
+resolution_options.add_argument(
+    "--resolver",
+    dest="resolver_backend",
+    choices=("default", "sat"),
+    default="default",
+    help="dependency resolver backend to use",
+    docs="""
+        Select the dependency resolver backend. The default resolver performs
+        a depth first search with backtracking. The ``sat`` backend encodes
+        the dependencies of all packages reachable from the targets as a
+        boolean satisfiability problem and solves it with a conflict driven
+        clause learning solver, which handles heavily conflicting dependency
+        graphs better at the cost of extra upfront work. It follows the same
+        package preferences and resolution order as the default resolver,
+        resulting in the same plans apart from ``||`` alternatives the default
+        resolver rejects due to dependency cycles and blockers against
+        installed packages already reused by the plan, where it picks another
+        alternative instead of replacing the blocked package.
+        It can't be used with -e/--empty, and -i/--ignore-cycles and
+        --pdb-intercept only apply to the default resolver.
+    """,
+)
+resolution_options.add_argument(
+    "--reuse-plan",
+    action="store_true",
+    help="reuse the previous plan if nothing affecting it changed",
+    docs="""
+        Store the resolved plan and reuse it on later runs if the targets,
+        resolver options, repos, installed packages, profile, and
+        configuration haven't changed since, skipping dependency resolution.
+
+        Changes are detected via the modification times of repo category and
+        package directories, so e.g. editing an existing ebuild in place
+        isn't noticed. Plans are stored in the user cache directory.
+    """,
+)
+resolution_options.add_argument(
+    "-j",
+    "--jobs",
+    type=arghparse.positive_int,
+    help="number of parallel jobs to run",
+    docs="""
+        Number of parallel jobs to use for tasks that support it, currently
+        the sanity checks (pkg_pretend, REQUIRED_USE) run before merging.
+        Defaults to using all available processors.
+    """,
+)
 resolution_options.add_argument(
     "--force",
     action="store_true",
@@ -393,6 +470,43 @@ debug_options.add_argument(
         Any deviation from this is a bug in the resolver and should be reported.
     """,
 )
+debug_options.add_argument(
+    "--disable-resolver-failure-memoization",
+    dest="memoize_failures",
+    action="store_false",
+    default=True,
+    help="disable memoization of resolver failures across backtracking",
+    docs="""
+        The resolver records dependencies that failed to resolve along with a
+        fingerprint of the resolver state they depend on, skipping identical
+        attempts after backtracking. This option disables that, which should
+        only be needed when debugging the resolver.
+    """,
+)
+debug_options.add_argument(
+    "--resolver-stats",
+    action="store_true",
+    help="display resolver statistics",
+    docs="""
+        Collect and display statistics about the dependency resolution
+        process, such as the number of frames processed, backtracks, caching
+        repo hit rates, and time spent in the main resolver stages.
+
+        This is primarily used for profiling the resolver, spotting why
+        specific resolutions are slow and catching performance regressions.
+    """,
+)
+debug_options.add_argument(
+    "--resolver-stats-file",
+    metavar="FILE",
+    type=argparse.FileType("w"),
+    help="dump resolver statistics in JSON format to a file",
+    docs="""
+        Collect resolver statistics and write them in JSON format to the
+        given file, use ``-`` for stdout. The summary is only displayed when
+        --resolver-stats is passed as well.
+    """,
+)
 
 
 class AmbiguousQuery(parserestrict.ParseError):
@@ -573,6 +687,30 @@ def display_failures(out, sequence, first_level=True, debug=False, _color_index=
             out.first_prefix.pop()
 
 
+def display_resolver_stats(out, resolver_inst, resolve_time):
+    """display statistics collected during dependency resolution"""
+    stats = resolver_inst.stats.collect(resolver_inst)
+    out.write()
+    out.write(out.bold, " * ", out.reset, "resolver stats:")
+    out.first_prefix.append("   ")
+    out.write(f"resolution time: {resolve_time:.2f} seconds")
+    for name, value in stats["counters"].items():
+        out.write(f"{name.replace('_', ' ')}: {value}")
+    out.write(f"insoluble atoms: {stats['insoluble']}")
+    out.write(f"plan ops: {stats['plan_ops']}")
+    for name, data in stats["timers"].items():
+        out.write(f"{name}: {data['calls']} calls, {data['seconds']:.2f} seconds")
+    for repo, data in stats["caching_repos"].items():
+        out.write(
+            f"repo {repo}: {data['queries']} queries, "
+            f"{data['hit_rate']:.1%} cache hit rate, "
+            f"{data['itermatch_calls']} itermatch calls, "
+            f"{data['evictions']} evictions"
+        )
+    out.first_prefix.pop()
+    out.write()
+
+
 def slotatom_if_slotted(repos, checkatom):
     """check repos for more than one slot of given atom"""
 
@@ -626,10 +764,15 @@ def _validate(parser, namespace):
         namespace.sets = ("world", "system")
         namespace.deep = True
         namespace.replace = False
-        if namespace.usepkgonly or namespace.usepkg or namespace.source_only:
+        if (
+            namespace.usepkgonly
+            or namespace.usepkg
+            or namespace.source_only
+            or namespace.reuse_plan
+        ):
             parser.error(
                 "--clean cannot be used with any of the following options: "
-                "--usepkg --usepkgonly --source-only"
+                "--usepkg --usepkgonly --source-only --reuse-plan"
             )
     elif namespace.usepkgonly and namespace.usepkg:
         parser.error("--usepkg is redundant when --usepkgonly is used")
@@ -658,6 +801,9 @@ def _validate(parser, namespace):
     if namespace.newuse:
         namespace.oneshot = True
 
+    if namespace.resolver_backend == "sat" and namespace.empty:
+        parser.error("--resolver=sat can't be used with -e/--empty")
+
     if namespace.upgrade:
         namespace.resolver_kls = resolver.upgrade_resolver
     elif namespace.downgrade:
@@ -747,6 +893,160 @@ def display_pkgsets(out, options):
             out.write(name)
 
 
+# options affecting resolution, see --reuse-plan
+_plan_options = (
+    "upgrade",
+    "downgrade",
+    "deep",
+    "newuse",
+    "ignore_cycles",
+    "with_bdeps",
+    "nodeps",
+    "onlydeps",
+    "replace",
+    "usepkg",
+    "usepkgonly",
+    "source_only",
+    "empty",
+    "excludes",
+    "resolver_backend",
+)
+
+
+def _resolve(
+    options,
+    out,
+    err,
+    formatter,
+    atoms,
+    source_repos,
+    installed_repos,
+    world_set,
+    cache,
+    fingerprint,
+    extra_kwargs,
+):
+    """Resolve the targets.
+
+    Returns an exit code if pmerge is done, otherwise the resolver, its
+    changes, and the time spent resolving.
+    """
+    resolver_inst = options.resolver_kls(
+        vdbs=installed_repos,
+        dbs=source_repos,
+        verify_vdb=options.deep,
+        nodeps=options.nodeps,
+        drop_cycles=options.ignore_cycles,
+        force_replace=options.replace,
+        process_built_depends=options.with_bdeps,
+        **extra_kwargs,
+    )
+
+    # flush warning messages before dep resolution begins
+    out.flush()
+    err.flush()
+
+    failures = []
+    resolve_time = time()
+    if sys.stdout.isatty():
+        out.title("Resolving...")
+        out.write(out.bold, " * ", out.reset, "Resolving...")
+        out.flush()
+    ret = resolver_inst.add_atoms(atoms, finalize=True)
+    while ret:
+        out.error("resolution failed")
+        restrict = ret[0][0]
+        just_failures = reduce_to_failures(ret[1])
+        display_failures(out, just_failures, debug=options.debug)
+        failures.append(restrict)
+        if not options.ignore_failures:
+            break
+        out.write("restarting resolution")
+        atoms[:] = [x for x in atoms if x != restrict]
+        resolver_inst.reset()
+        ret = resolver_inst.add_atoms(atoms, finalize=True)
+    resolve_time = time() - resolve_time
+
+    if resolver_inst.stats is not None:
+        if options.resolver_stats:
+            display_resolver_stats(out, resolver_inst, resolve_time)
+        if options.resolver_stats_file:
+            resolver_inst.stats.dump(resolver_inst, options.resolver_stats_file)
+            options.resolver_stats_file.flush()
+
+    if failures:
+        out.write()
+        out.write("Failures encountered:")
+        for restrict in failures:
+            out.error(f"failed '{restrict}'")
+            out.write("potentials:")
+            match_count = 0
+            for r in get_raw_repos(source_repos):
+                l = r.match(restrict)
+                if l:
+                    out.write(f"repo {r}: [ {', '.join(map(str, l))} ]")
+                    match_count += len(l)
+            if not match_count:
+                out.write("No matches found")
+            if not options.ignore_failures:
+                return 1
+            out.write()
+
+    resolver_inst.free_caches()
+
+    if options.clean:
+        out.write(out.bold, " * ", out.reset, "Packages to be removed:")
+        vset = set(installed_repos.real.combined)
+        len_vset = len(vset)
+        vset.difference_update(x.pkg for x in resolver_inst.state.iter_ops(True))
+        wipes = sorted(x for x in vset if x.package_is_real)
+        for x in wipes:
+            out.write(f"Remove {x}")
+        out.write()
+        if wipes:
+            out.write(
+                f"removing {len(wipes)} packages of {len_vset} installed, "
+                f"{100 * (len(wipes) / float(len_vset)):0.2f}%."
+            )
+        else:
+            out.write("no packages to remove")
+        if options.pretend:
+            return 0
+        if options.ask:
+            if not formatter.ask("Do you wish to proceed?", default_answer=False):
+                return 1
+            out.write()
+        repo_obs = observer.repo_observer(
+            observer.formatter_output(out), debug=options.debug
+        )
+        do_unmerge(
+            options,
+            out,
+            err,
+            installed_repos.real.combined,
+            wipes,
+            world_set,
+            repo_obs,
+        )
+        return 0
+
+    if options.debug:
+        out.write()
+        out.write(out.bold, " * ", out.reset, "debug: all ops")
+        out.first_prefix.append(" ")
+        plan_len = len(str(len(resolver_inst.state.plan)))
+        for pos, op in enumerate(resolver_inst.state.plan):
+            out.write(str(pos + 1).rjust(plan_len), ": ", str(op))
+        out.first_prefix.pop()
+        out.write(out.bold, " * ", out.reset, "debug: end all ops")
+        out.write()
+
+    changes = resolver_inst.state.ops(only_real=True)
+    if cache is not None and not failures:
+        cache.store(fingerprint, changes)
+    return resolver_inst, changes, resolve_time
+
+
 @argparser.bind_main_func
 def main(options, out, err):
     if options.list_sets:
@@ -866,8 +1166,18 @@ def main(options, out, err):
     extra_kwargs = {}
     if options.empty:
         extra_kwargs["resolver_cls"] = resolver.empty_tree_merge_plan
+    elif options.resolver_backend == "sat":
+        extra_kwargs["resolver_cls"] = sat_merge_plan
     if options.debug:
         extra_kwargs["debug"] = True
+    if options.resolver_cache_entries:
+        extra_kwargs["cache_max_entries"] = options.resolver_cache_entries
+    if options.resolver_cache_pkgs:
+        extra_kwargs["cache_max_weight"] = options.resolver_cache_pkgs
+    if not options.memoize_failures:
+        extra_kwargs["memoize_failures"] = False
+    if options.resolver_stats or options.resolver_stats_file:
+        extra_kwargs["stats"] = True
 
     # XXX: This should recurse on deep
     if options.newuse:
@@ -903,104 +1213,40 @@ def main(options, out, err):
 
     extra_kwargs["pdb_intercept"] = tuple(x[1] for x in options.pdb_intercept)
 
-    resolver_inst = options.resolver_kls(
-        vdbs=installed_repos,
-        dbs=source_repos,
-        verify_vdb=options.deep,
-        nodeps=options.nodeps,
-        drop_cycles=options.ignore_cycles,
-        force_replace=options.replace,
-        process_built_depends=options.with_bdeps,
-        **extra_kwargs,
-    )
-
-    # flush warning messages before dep resolution begins
-    out.flush()
-    err.flush()
-
-    failures = []
-    resolve_time = time()
-    if sys.stdout.isatty():
-        out.title("Resolving...")
-        out.write(out.bold, " * ", out.reset, "Resolving...")
-        out.flush()
-    ret = resolver_inst.add_atoms(atoms, finalize=True)
-    while ret:
-        out.error("resolution failed")
-        restrict = ret[0][0]
-        just_failures = reduce_to_failures(ret[1])
-        display_failures(out, just_failures, debug=options.debug)
-        failures.append(restrict)
-        if not options.ignore_failures:
-            break
-        out.write("restarting resolution")
-        atoms = [x for x in atoms if x != restrict]
-        resolver_inst.reset()
-        ret = resolver_inst.add_atoms(atoms, finalize=True)
-    resolve_time = time() - resolve_time
-
-    if failures:
-        out.write()
-        out.write("Failures encountered:")
-        for restrict in failures:
-            out.error(f"failed '{restrict}'")
-            out.write("potentials:")
-            match_count = 0
-            for r in get_raw_repos(source_repos):
-                l = r.match(restrict)
-                if l:
-                    out.write(f"repo {r}: [ {', '.join(map(str, l))} ]")
-                    match_count += len(l)
-            if not match_count:
-                out.write("No matches found")
-            if not options.ignore_failures:
-                return 1
-            out.write()
-
-    resolver_inst.free_caches()
-
-    if options.clean:
-        out.write(out.bold, " * ", out.reset, "Packages to be removed:")
-        vset = set(installed_repos.real.combined)
-        len_vset = len(vset)
-        vset.difference_update(x.pkg for x in resolver_inst.state.iter_ops(True))
-        wipes = sorted(x for x in vset if x.package_is_real)
-        for x in wipes:
-            out.write(f"Remove {x}")
-        out.write()
-        if wipes:
-            out.write(
-                f"removing {len(wipes)} packages of {len_vset} installed, "
-                f"{100 * (len(wipes) / float(len_vset)):0.2f}%."
-            )
-        else:
-            out.write("no packages to remove")
-        if options.pretend:
-            return 0
-        if options.ask:
-            if not formatter.ask("Do you wish to proceed?", default_answer=False):
-                return 1
-            out.write()
-        repo_obs = observer.repo_observer(
-            observer.formatter_output(out), debug=options.debug
+    resolver_inst = None
+    cache = fingerprint = changes = None
+    if options.reuse_plan:
+        cache = plan_cache(pjoin(const.USER_CACHE_PATH, "plans"))
+        fingerprint = cache.fingerprint(
+            atoms,
+            {x: getattr(options, x) for x in _plan_options},
+            source_repos,
+            installed_repos,
+            domain,
         )
-        do_unmerge(
-            options, out, err, installed_repos.real.combined, wipes, world_set, repo_obs
+        changes = cache.load(
+            fingerprint, source_repos.combined, installed_repos.combined
         )
-        return 0
-
-    if options.debug:
-        out.write()
-        out.write(out.bold, " * ", out.reset, "debug: all ops")
-        out.first_prefix.append(" ")
-        plan_len = len(str(len(resolver_inst.state.plan)))
-        for pos, op in enumerate(resolver_inst.state.plan):
-            out.write(str(pos + 1).rjust(plan_len), ": ", str(op))
-        out.first_prefix.pop()
-        out.write(out.bold, " * ", out.reset, "debug: end all ops")
-        out.write()
-
-    changes = resolver_inst.state.ops(only_real=True)
+        if changes is not None:
+            out.write(out.bold, " * ", out.reset, "Reusing cached resolver plan")
+
+    if changes is None:
+        ret = _resolve(
+            options,
+            out,
+            err,
+            formatter,
+            atoms,
+            source_repos,
+            installed_repos,
+            world_set,
+            cache,
+            fingerprint,
+            extra_kwargs,
+        )
+        if isinstance(ret, int):
+            return ret
+        resolver_inst, changes, resolve_time = ret
 
     build_obs = observer.phase_observer(
         observer.formatter_output(out), debug=options.debug
@@ -1024,7 +1270,9 @@ def main(options, out, err):
                 start_time = time()
             # flush output so bash spawned errors are shown in the correct order of events
             out.flush()
-            sanity_failures = run_sanity_checks((x.pkg for x in changes), domain)
+            sanity_failures = run_sanity_checks(
+                (x.pkg for x in changes), domain, threads=options.jobs
+            )
             if sanity_failures:
                 for errors in sanity_failures.values():
                     out.write(
@@ -1077,7 +1325,7 @@ def main(options, out, err):
         return
 
     if options.pretend:
-        if options.verbosity > 0:
+        if options.verbosity > 0 and resolver_inst is not None:
             out.write(
                 out.bold,
                 " * ",
@@ -908,29 +908,83 @@ def parse_eapi(value):
     return packages.PackageRestriction("eapi", values.StrExactMatch(value))
 
 
-@bind_add_query("--owns", action="append", help="exact match on an owned file/dir")
-def parse_owns(value):
-    return packages.PackageRestriction(
-        "contents",
-        values.AnyMatch(
-            values.GetAttrRestriction("location", values.StrExactMatch(value))
-        ),
-    )
+def _owns_index_lookup(paths, namespace, regex=False):
+    """Look up owning packages via the ownership indexes of the searched repos.
+
+    Returns None if any of the repos lacks a usable index.
+    """
+    indexes = []
+    for repo in namespace.repos:
+        index = getattr(repo, "owners", None)
+        if index is None:
+            return None
+        indexes.append(index)
+
+    cpvs = set()
+    for index in indexes:
+        if regex:
+            for path in paths:
+                cpvs.update(index.owners_re(path))
+        else:
+            for owners in index.owners(paths).values():
+                cpvs.update(owners)
+    if not cpvs:
+        return packages.AlwaysFalse
+    return [atom.atom(f"={cpv}") for cpv in sorted(cpvs)]
 
 
 @bind_add_query(
-    "--owns-re", action="append", help='like "owns" but using a regexp for matching'
+    "--owns",
+    action="append",
+    type=None,
+    bind="final_converter",
+    help="exact match on an owned file/dir",
 )
-def parse_ownsre(value):
-    """Value is a regexp matched against the string form of an fs object.
+def parse_owns(paths, namespace):
+    """Match packages owning any of the given paths.
 
-    This means the object kind is prepended to the path the regexp has
-    to match.
+    Uses the ownership indexes of installed repos if available, falling back
+    to searching the contents of all packages.
     """
-    return packages.PackageRestriction(
-        "contents",
-        values.AnyMatch(values.GetAttrRestriction("location", values.StrRegex(value))),
-    )
+    if not paths:
+        return []
+    restrict = _owns_index_lookup(paths, namespace)
+    if restrict is not None:
+        return restrict
+    return [
+        packages.PackageRestriction(
+            "contents",
+            values.AnyMatch(
+                values.GetAttrRestriction("location", values.StrExactMatch(path))
+            ),
+        )
+        for path in paths
+    ]
+
+
+@bind_add_query(
+    "--owns-re",
+    action="append",
+    type=None,
+    bind="final_converter",
+    help='like "owns" but using a regexp for matching',
+)
+def parse_ownsre(regexes, namespace):
+    """Values are regexps matched against the paths of owned fs objects."""
+    if not regexes:
+        return []
+    restrict = _owns_index_lookup(regexes, namespace, regex=True)
+    if restrict is not None:
+        return restrict
+    return [
+        packages.PackageRestriction(
+            "contents",
+            values.AnyMatch(
+                values.GetAttrRestriction("location", values.StrRegex(regex))
+            ),
+        )
+        for regex in regexes
+    ]
 
 
 @bind_add_query("--maintainer", action="append", help="regex to search for maintainers")
@@ -23,6 +23,7 @@ from .. import os_data
 from ..config.hint import ConfigHint, configurable
 from ..exceptions import PkgcoreUserException
 from ..log import logger
+from .journal import ChangeJournal
 
 
 class SyncError(PkgcoreUserException):
@@ -67,6 +68,16 @@ class Syncer:
     # plugin system uses this.
     disabled = False
 
+    # binary file object sync output is written to while syncing, if not stdout
+    output = None
+
+    # record the changes made by syncs in the repo's change journal
+    track_changes = True
+
+    # mapping of paths changed by the current sync to their status, set by
+    # syncers able to determine them, see pkgcore.sync.journal
+    changes = None
+
     pkgcore_config_type = ConfigHint(
         types={"path": "str", "uri": "str", "opts": "str", "usersync": "bool"},
         typename="syncer",
@@ -123,7 +134,12 @@ class Syncer:
         except KeyError as exc:
             raise MissingLocalUser(raw_uri, str(exc))
 
-    def sync(self, verbosity: int | None = None, force=False):
+    def sync(self, verbosity: int | None = None, force=False, output=None):
+        """Sync the repo.
+
+        :param output: binary file object the output of the sync is written
+            to instead of stdout, syncing runs non-interactively in that case
+        """
         if self.disabled:
             return False
         kwds = {}
@@ -131,7 +147,28 @@ class Syncer:
             kwds["force"] = True
         if verbosity is None:
             verbosity = self.verbosity
-        return self._sync(verbosity, **kwds)
+        self.output = output
+        self.changes = None
+        try:
+            ret = self._sync(verbosity, **kwds)
+        finally:
+            self.output = None
+        if ret and self.track_changes:
+            self._record_changes()
+        return ret
+
+    def _record_changes(self):
+        """Add the changes made by a successful sync to the repo's journal."""
+        if self.changes == {}:
+            # nothing changed
+            return
+        journal = ChangeJournal.for_repo(self.basedir)
+        try:
+            journal.record(
+                self.changes, syncer=self.__class__.__name__.removesuffix("_syncer")
+            )
+        except OSError as e:
+            logger.warning(f"failed updating sync journal {journal.path!r}: {e}")
 
     def _sync(self, verbosity: int, **kwds):
         raise NotImplementedError(self, "_sync")
@@ -189,10 +226,18 @@ class ExternalSyncer(Syncer):
                 disabled = cls._disabled = os.path.exists(path)
         return disabled
 
-    def _spawn(self, command, **kwargs):
+    def _fd_pipes(self, interactive=False):
         # Note: stderr is explicitly forced to stdout since that's how it was originally done.
         # This can be changed w/ a discussion.
-        kwargs.setdefault("fd_pipes", {1: 1, 2: 1})
+        if self.output is not None:
+            fd = self.output.fileno()
+            return {1: fd, 2: fd}
+        if interactive:
+            return {0: 0, 1: 1, 2: 1}
+        return {1: 1, 2: 1}
+
+    def _spawn(self, command, **kwargs):
+        kwargs.setdefault("fd_pipes", self._fd_pipes())
         logger.debug("sync invoking command %r, kwargs %r", command, kwargs)
         # since we're intermixing two processes writing to stdout/stderr- us, and what we're invoking-
         # force a flush to keep output from being interlaced.  This is not hugely optimal, but
@@ -204,9 +249,19 @@ class ExternalSyncer(Syncer):
         )
 
     def _spawn_interactive(self, command, **kwargs):
-        # Note: stderr is explicitly forced to stdout since that's how it was originally done.
-        # This can be changed w/ a discussion.
-        return self._spawn(command, fd_pipes={0: 0, 1: 1, 2: 1}, **kwargs)
+        return self._spawn(command, fd_pipes=self._fd_pipes(interactive=True), **kwargs)
+
+    def _spawn_output(self, command, **kwargs):
+        """Run a command, returning its exit status and captured stdout."""
+        logger.debug("sync invoking command %r, kwargs %r", command, kwargs)
+        return process.spawn.spawn_get_output(
+            command,
+            uid=self.uid,
+            gid=self.gid,
+            env=self.env,
+            split_lines=False,
+            **kwargs,
+        )
 
     @staticmethod
     def _rewrite_uri_from_stat(path, uri):
@@ -0,0 +1,180 @@
+"""
+Block level delta syncing support
+
+Files are split into content defined blocks, with block boundaries placed
+after occurrences of an anchor byte sequence subject to minimum and maximum
+block sizes.  Since boundaries depend on the content instead of the offset,
+data inserted or removed in a new version of a file only changes the blocks
+around the modification; the remaining blocks are found in the old version
+regardless of where they moved to.
+
+Publishers serve a block manifest listing the length and checksum of each
+block of a file next to it, see :meth:`BlockManifest.generate`.  Syncers then
+reuse the blocks already present in their local copy and only fetch the
+missing ones.
+"""
+
+__all__ = ("BlockManifest", "DeltaError", "MalformedManifest", "manifest_suffix")
+
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+
+from .base import SyncError
+
+# suffix of block manifests relative to the files they describe
+manifest_suffix = ".blocks"
+
+
+class DeltaError(SyncError):
+    """Delta syncing isn't possible, a full download is required."""
+
+
+class MalformedManifest(DeltaError):
+    def __init__(self, msg):
+        super().__init__(f"malformed block manifest: {msg}")
+        self.msg = msg
+
+
+@contextmanager
+def _mapped(path):
+    """Map a file's contents read-only."""
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+class BlockManifest:
+    """Block checksum manifest of a file.
+
+    :param length: total length of the file
+    :param digest: sha256 hex digest of the file
+    :param blocks: sequence of (length, digest) tuples of the file's blocks
+    :param anchor: byte sequence blocks are split after
+    :param min_size: minimum block size
+    :param max_size: maximum block size
+    """
+
+    format = "pkgcore-blocks-1"
+
+    # a two byte anchor averages 64KiB between anchors in compressed data
+    default_anchor = b"\x9a\xc5"
+    default_min_size = 16 * 1024
+    default_max_size = 256 * 1024
+
+    # length of the truncated block digests
+    digest_size = 16
+
+    def __init__(
+        self,
+        length,
+        digest,
+        blocks,
+        anchor=default_anchor,
+        min_size=default_min_size,
+        max_size=default_max_size,
+    ):
+        self.length = length
+        self.digest = digest
+        self.blocks = tuple(blocks)
+        self.anchor = anchor
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def split(self, data):
+        """Yield (offset, length) tuples of the blocks of a buffer."""
+        start = 0
+        size = len(data)
+        while start < size:
+            end = min(start + self.max_size, size)
+            pos = data.find(self.anchor, start + self.min_size, end)
+            if pos != -1:
+                end = pos + len(self.anchor)
+            yield start, end - start
+            start = end
+
+    def block_digest(self, data):
+        return hashlib.sha256(data).digest()[: self.digest_size]
+
+    @classmethod
+    def generate(cls, path, **kwargs):
+        """Generate the manifest of a file."""
+        manifest = cls(0, None, (), **kwargs)
+        blocks = []
+        with _mapped(path) as data, memoryview(data) as view:
+            for offset, length in manifest.split(data):
+                blocks.append(
+                    (length, manifest.block_digest(view[offset : offset + length]))
+                )
+            manifest.length = len(data)
+            manifest.digest = hashlib.sha256(view).hexdigest()
+        manifest.blocks = tuple(blocks)
+        return manifest
+
+    def index(self, path):
+        """Map the digests of a file's blocks to their (offset, length)."""
+        index = {}
+        with _mapped(path) as data, memoryview(data) as view:
+            for offset, length in self.split(data):
+                digest = self.block_digest(view[offset : offset + length])
+                index.setdefault(digest, (offset, length))
+        return index
+
+    def serialize(self):
+        lines = [
+            f"format: {self.format}",
+            f"length: {self.length}",
+            f"sha256: {self.digest}",
+            f"anchor: {self.anchor.hex()}",
+            f"min-size: {self.min_size}",
+            f"max-size: {self.max_size}",
+            "",
+        ]
+        lines.extend(f"{length} {digest.hex()}" for length, digest in self.blocks)
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def parse(cls, data):
+        """Parse a serialized manifest."""
+        if isinstance(data, bytes):
+            try:
+                data = data.decode()
+            except UnicodeDecodeError as e:
+                raise MalformedManifest(str(e)) from e
+        header, sep, body = data.partition("\n\n")
+        if not sep:
+            raise MalformedManifest("missing header")
+        try:
+            keys = dict(line.split(": ", 1) for line in header.splitlines())
+        except ValueError as e:
+            raise MalformedManifest(f"invalid header: {header!r}") from e
+        if keys.get("format") != cls.format:
+            raise MalformedManifest(f"unsupported format: {keys.get('format')!r}")
+        try:
+            blocks = []
+            for line in body.splitlines():
+                length, digest = line.split()
+                blocks.append((int(length), bytes.fromhex(digest)))
+            manifest = cls(
+                int(keys["length"]),
+                keys["sha256"],
+                blocks,
+                anchor=bytes.fromhex(keys["anchor"]),
+                min_size=int(keys["min-size"]),
+                max_size=int(keys["max-size"]),
+            )
+        except (KeyError, ValueError) as e:
+            raise MalformedManifest(f"invalid data: {e}") from e
+        if sum(length for length, _ in manifest.blocks) != manifest.length:
+            raise MalformedManifest("block lengths don't match file length")
+        if (
+            not manifest.anchor
+            or manifest.min_size < 1
+            or manifest.max_size < manifest.min_size
+        ):
+            raise MalformedManifest("invalid block parameters")
+        return manifest
@@ -48,3 +48,37 @@ class git_syncer(base.VcsSyncer):
 
     def _update_existing(self):
         return [self.binary_path, "pull"]
+
+    def _head(self):
+        """Return the commit checked out in the repo, None if unavailable."""
+        if not os.path.isdir(os.path.join(self.basedir, ".git")):
+            return None
+        ret, output = self._spawn_output(
+            [self.binary_path, "rev-parse", "--verify", "-q", "HEAD"],
+            cwd=self.basedir,
+        )
+        return output.strip() if ret == 0 else None
+
+    def _diff(self, old, new):
+        """Return the paths changed between two commits, None on failure."""
+        ret, output = self._spawn_output(
+            [self.binary_path, "diff", "--name-status", "--no-renames", "-z", old, new],
+            cwd=self.basedir,
+        )
+        if ret != 0:
+            return None
+        fields = output.split("\0")
+        # type changes, e.g. files replaced by symlinks, are modifications
+        return {
+            path: status if status in ("A", "D") else "M"
+            for status, path in zip(fields[::2], fields[1::2])
+        }
+
+    def _sync(self, verbosity):
+        old = self._head()
+        if not super()._sync(verbosity):
+            return False
+        # changes of initial clones are unknown
+        if old is not None and (new := self._head()) is not None:
+            self.changes = {} if new == old else self._diff(old, new)
+        return True
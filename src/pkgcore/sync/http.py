@@ -1,34 +1,320 @@
 __all__ = ("http_syncer",)
 
+import hashlib
+import http.client
 import os
 import ssl
 import sys
+import time
 import urllib.request
 from os.path import join as pjoin
 
-from snakeoil.fileutils import AtomicWriteFile, readfile_ascii
+from snakeoil.fileutils import readfile_ascii
+from snakeoil.osutils import unlink_if_exists
 
+from ..config.hint import ConfigHint
 from ..log import logger
-from . import base
+from . import base, delta
+
+
+def _validator(resp):
+    """Return the strong validator of a response usable for If-Range, if any."""
+    etag = resp.getheader("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag.strip()
+    modified = resp.getheader("Last-Modified")
+    if modified:
+        return modified.strip()
+    return None
+
+
+class _Download:
+    """Readable stream of an HTTP download.
+
+    Dropped connections are transparently resumed at the current offset via
+    ``Range`` requests, as long as the response has a validator ensuring the
+    remote file hasn't changed in the meantime. Simple progress output is
+    provided when the total length is known.
+
+    :param syncer: :obj:`http_syncer` instance doing the download
+    :param resp: initial response
+    :param offset: offset of the initial response's data in the file
+    :param progress: show progress output
+    """
+
+    def __init__(self, syncer, resp, offset=0, progress=True):
+        self.syncer = syncer
+        self.resp = resp
+        self.offset = offset
+        self.validator = _validator(resp)
+        length = resp.getheader("content-length")
+        self.end = offset + int(length) if length else None
+        self.progress = progress and bool(self.end)
+
+    def read(self, size=-1):
+        buf = self.syncer._retry(self._read, size)
+        if self.progress:
+            if buf:
+                progress = "=" * int(self.offset / self.end * 50)
+                percent = int(self.offset / self.end * 100)
+                sys.stdout.write(f"\r[{progress:<50}] {percent}%")
+            else:
+                sys.stdout.write("\n")
+                # only finish the progress line once
+                self.progress = False
+            sys.stdout.flush()
+        return buf
+
+    def _read(self, size):
+        if self.resp is None:
+            self.resp = self.syncer._resume(self.offset, self.validator)
+        try:
+            buf = self.resp.read(size)
+            if not buf and self.end is not None and self.offset < self.end:
+                # responses with a known length silently return short reads
+                raise http.client.IncompleteRead(b"", self.end - self.offset)
+        except (OSError, http.client.HTTPException) as e:
+            self.resp.close()
+            self.resp = None
+            if self.validator is None:
+                raise base.SyncError(
+                    f"failed fetching {self.syncer.uri!r}: {e}, unable to resume "
+                    "without ETag or Last-Modified headers"
+                ) from e
+            raise
+        self.offset += len(buf)
+        return buf
 
 
 class http_syncer(base.Syncer):
-    """Syncer that fetches files over HTTP(S)."""
+    """Syncer that fetches files over HTTP(S).
+
+    Partially downloaded files are kept on failure and resumed by later syncs
+    if the remote file is unchanged.
+
+    In delta mode, updates of files with a published block manifest (see
+    :mod:`pkgcore.sync.delta`) are assembled from the blocks of the existing
+    file with only the changed blocks being fetched.
+    """
 
     forcable = True
 
-    def __init__(self, basedir, uri, dest=None, **kwargs):
+    # seconds to wait on blocking network operations
+    default_timeout = 60
+    # number of consecutive retries for failed requests, with exponential backoff
+    default_retries = 5
+    retry_delay = 1
+
+    # keep partial downloads for resuming in later syncs
+    keep_partial = True
+
+    # maximum size of block ranges fetched per request in delta mode
+    delta_request_size = 16 * 1024 * 1024
+
+    pkgcore_config_type = ConfigHint(
+        types={
+            "basedir": "str",
+            "uri": "str",
+            "usersync": "bool",
+            "opts": "str",
+            "timeout": "str",
+            "retries": "str",
+            "delta": "bool",
+        },
+        typename="syncer",
+    )
+
+    def __init__(
+        self,
+        basedir,
+        uri,
+        dest=None,
+        timeout=default_timeout,
+        retries=default_retries,
+        delta=True,
+        **kwargs,
+    ):
         self.basename = os.path.basename(uri)
         super().__init__(basedir, uri, **kwargs)
+        self.timeout = float(timeout)
+        self.retries = int(retries)
+        self.delta = delta and self.keep_partial
 
-    def _sync(self, verbosity, force=False, **kwargs):
-        dest = self._pre_download()
+    def _retry(self, func, *args):
+        """Call a function, retrying transient network failures with backoff."""
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except urllib.error.HTTPError as e:
+                # only server errors are assumed to be transient
+                if e.code < 500 or attempt == self.retries:
+                    raise
+                error = e
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retries:
+                    raise
+                error = e
+            delay = self.retry_delay * 2**attempt
+            logger.warning(f"retrying {self.uri!r} in {delay}s: {error}")
+            time.sleep(delay)
 
-        if self.uri.lower().startswith("https://"):
+    def _open(self, headers, offset=0, validator=None, uri=None):
+        """Send a request for the URI, starting at a given offset."""
+        uri = self.uri if uri is None else uri
+        headers = dict(headers)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if validator is not None:
+                headers["If-Range"] = validator
+        req = urllib.request.Request(uri, headers=headers, method="GET")
+        if uri.lower().startswith("https://"):
             # default to using system ssl certs
             context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
         else:
             context = None
+        return urllib.request.urlopen(req, context=context, timeout=self.timeout)
+
+    def _resume(self, offset, validator):
+        """Reopen an interrupted download at a given offset."""
+        resp = self._open({}, offset, validator)
+        content_range = resp.getheader("Content-Range", "")
+        if not offset:
+            resumed = resp.status == 200 and _validator(resp) == validator
+        else:
+            resumed = resp.status == 206 and content_range.startswith(
+                f"bytes {offset}-"
+            )
+        if not resumed:
+            resp.close()
+            raise base.SyncError(
+                f"failed resuming {self.uri!r}: remote file changed or "
+                "server doesn't support range requests"
+            )
+        logger.debug(f"resuming {self.uri!r} at byte {offset}")
+        return resp
+
+    def _read_manifest(self, uri):
+        with self._open({}, uri=uri) as resp:
+            return delta.BlockManifest.parse(resp.read())
+
+    def _read_range(self, start, end, validator):
+        """Fetch the data of a byte range of the URI."""
+        headers = {"Range": f"bytes={start}-{end - 1}", "If-Range": validator}
+        with self._open(headers) as resp:
+            content_range = resp.getheader("Content-Range", "")
+            if resp.status != 206 or not content_range.startswith(
+                f"bytes {start}-{end - 1}/"
+            ):
+                raise delta.DeltaError(
+                    "remote file changed or server doesn't support range requests"
+                )
+            data = resp.read()
+        if len(data) != end - start:
+            raise http.client.IncompleteRead(data, end - start - len(data))
+        return data
+
+    def _fetch_delta(self, resp, dest):
+        """Assemble a download from the unchanged blocks of an existing file.
+
+        Returns:
+            bool: True if the download was assembled, False if the existing
+            file isn't usable or no matching block manifest is available
+        """
+        if resp.validator is None or resp.end is None:
+            return False
+        uri = self.uri + delta.manifest_suffix
+        try:
+            manifest = self._retry(self._read_manifest, uri)
+        except (OSError, http.client.HTTPException, delta.DeltaError) as e:
+            logger.debug(f"delta sync unavailable, failed fetching {uri!r}: {e}")
+            return False
+        if manifest.length != resp.end:
+            logger.debug(f"delta sync unavailable, stale manifest {uri!r}")
+            return False
+
+        try:
+            index = manifest.index(dest)
+            local = open(dest, "rb")  # noqa: SIM115 (closed below)
+        except OSError as e:
+            logger.debug(f"delta sync unavailable, failed reading {dest!r}: {e}")
+            return False
+
+        partial = self._partial_path(dest)
+        try:
+            self._download = open(partial, "wb")  # noqa: SIM115 (closed in _post_download)
+            os.chmod(partial, 0o644)
+            with open(self._partial_path(dest, "validator"), "w") as f:
+                f.write(resp.validator)
+        except OSError as e:
+            local.close()
+            raise base.PathError(self.basedir, e.strerror) from e
+
+        # ranges of consecutive blocks fetched in a single request
+        pending = []
+        fetched = 0
+        digest = hashlib.sha256()
+
+        def write(data):
+            self._download.write(data)
+            digest.update(data)
+
+        def flush():
+            nonlocal fetched
+            if not pending:
+                return
+            start = pending[0][0]
+            end = pending[-1][0] + pending[-1][1]
+            data = self._retry(self._read_range, start, end, resp.validator)
+            with memoryview(data) as view:
+                for offset, length, block_digest in pending:
+                    block = view[offset - start : offset - start + length]
+                    if manifest.block_digest(block) != block_digest:
+                        raise delta.DeltaError(
+                            f"block checksum mismatch at offset {offset}"
+                        )
+            write(data)
+            fetched += len(data)
+            pending.clear()
+
+        try:
+            offset = 0
+            for length, block_digest in manifest.blocks:
+                if (block := index.get(block_digest)) is not None:
+                    flush()
+                    local.seek(block[0])
+                    write(local.read(length))
+                else:
+                    if pending and offset + length - pending[0][0] > (
+                        self.delta_request_size
+                    ):
+                        flush()
+                    pending.append((offset, length, block_digest))
+                offset += length
+            flush()
+            if digest.hexdigest() != manifest.digest:
+                raise delta.DeltaError("file checksum mismatch")
+        except delta.DeltaError as e:
+            logger.warning(f"delta sync of {self.uri!r} failed: {e}")
+            self._download.close()
+            return False
+        except (OSError, http.client.HTTPException) as e:
+            self._download.close()
+            raise base.SyncError(f"failed fetching {self.uri!r}: {e}") from e
+        except BaseException:
+            self._download.close()
+            raise
+        finally:
+            local.close()
+
+        logger.info(
+            f"delta sync of {self.uri!r}: fetched {fetched} of {manifest.length} bytes"
+        )
+        return True
+
+    def _sync(self, verbosity, force=False, **kwargs):
+        dest = self._pre_download()
+        # nothing changes unless the remote file was updated
+        self.changes = {}
 
         headers = {}
         etag_path = pjoin(self.basedir, ".etag")
@@ -45,16 +331,36 @@ class http_syncer(base.Syncer):
             if previous_modified:
                 headers["If-Modified-Since"] = previous_modified
 
-        req = urllib.request.Request(self.uri, headers=headers, method="GET")
+        # resume partial downloads from previous syncs
+        offset, validator = 0, None
+        if self.keep_partial:
+            validator = readfile_ascii(
+                self._partial_path(dest, "validator"), none_on_missing=True
+            )
+            try:
+                if validator:
+                    offset = os.path.getsize(self._partial_path(dest))
+            except FileNotFoundError:
+                pass
 
-        # TODO: add customizable timeout
         try:
-            resp = urllib.request.urlopen(req, context=context)
-        except urllib.error.URLError as e:
-            if e.getcode() == 304:  # Not Modified
+            try:
+                resp = self._retry(self._open, headers, offset, validator)
+            except urllib.error.HTTPError as e:
+                if e.code != 416 or not offset:
+                    raise
+                # partial download is invalid, start over
+                offset = 0
+                resp = self._retry(self._open, headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:  # Not Modified
                 logger.debug("content is unchanged")
                 return True
             raise base.SyncError(f"failed fetching {self.uri!r}: {e.reason}") from e
+        except urllib.error.URLError as e:
+            raise base.SyncError(f"failed fetching {self.uri!r}: {e.reason}") from e
+        except (OSError, http.client.HTTPException) as e:
+            raise base.SyncError(f"failed fetching {self.uri!r}: {e}") from e
 
         # Manually check cached values ourselves since some servers appear to
         # ignore If-None-Match or If-Modified-Since headers.
@@ -71,6 +377,12 @@ class http_syncer(base.Syncer):
                 logger.debug(f"header mtime is unmodified: {modified}")
                 return True
 
+        if resp.status != 206:
+            # the remote file changed or ranges aren't supported
+            offset = 0
+        elif offset:
+            logger.debug(f"resuming {self.uri!r} at byte {offset}")
+
         try:
             os.makedirs(self.basedir, exist_ok=True)
         except OSError as e:
@@ -85,28 +397,21 @@ class http_syncer(base.Syncer):
         else:
             blocksize = 1000000
 
-        try:
-            self._download = AtomicWriteFile(dest, binary=True, perms=0o644)
-        except OSError as e:
-            raise base.PathError(self.basedir, e.strerror) from e
-
-        # retrieve the file while providing simple progress output
-        size = 0
-        while True:
-            buf = resp.read(blocksize)
-            if not buf:
-                if length:
-                    sys.stdout.write("\n")
-                break
-            self._download.write(buf)
-            size += len(buf)
-            if length:
-                sys.stdout.write("\r")
-                progress = "=" * int(size / length * 50)
-                percent = int(size / length * 100)
-                sys.stdout.write(f"[{progress:<50}] {percent}%")
-                sys.stdout.flush()
+        # the changes made by replacing the file are unknown by default
+        self.changes = None
 
+        # progress isn't shown for captured output
+        download = _Download(self, resp, offset, progress=self.output is None)
+        if (
+            self.delta
+            and not offset
+            and os.path.isfile(dest)
+            and self._fetch_delta(download, dest)
+        ):
+            # the full response isn't needed
+            resp.close()
+        else:
+            self._fetch(download, dest, blocksize)
         self._post_download(dest)
 
         # TODO: store this in pkgcore cache dir instead?
@@ -127,6 +432,43 @@ class http_syncer(base.Syncer):
         """
         return pjoin(self.basedir, self.basename)
 
+    @staticmethod
+    def _partial_path(dest, suffix=None):
+        """Path partial downloads and their validator are kept at."""
+        path = f"{dest}.partial"
+        return f"{path}.{suffix}" if suffix else path
+
+    def _fetch(self, resp, dest, blocksize):
+        """Download the response content.
+
+        Args:
+            resp: readable response stream
+            dest (str): path returned by :meth:`_pre_download`
+            blocksize (int): suggested size of reads from the response
+        """
+        partial = self._partial_path(dest)
+        validator = self._partial_path(dest, "validator")
+        try:
+            self._download = open(partial, "ab" if resp.offset else "wb")  # noqa: SIM115 (closed in _post_download)
+            os.chmod(partial, 0o644)
+            if resp.validator is None:
+                unlink_if_exists(validator)
+            else:
+                with open(validator, "w") as f:
+                    f.write(resp.validator)
+        except OSError as e:
+            raise base.PathError(self.basedir, e.strerror) from e
+
+        try:
+            while buf := resp.read(blocksize):
+                self._download.write(buf)
+        except (OSError, http.client.HTTPException) as e:
+            self._download.close()
+            raise base.SyncError(f"failed fetching {self.uri!r}: {e}") from e
+        except BaseException:
+            self._download.close()
+            raise
+
     def _post_download(self, path):
         """Post-download file processing.
 
@@ -135,3 +477,8 @@ class http_syncer(base.Syncer):
         """
         # atomically create file
         self._download.close()
+        try:
+            os.rename(self._partial_path(path), path)
+            unlink_if_exists(self._partial_path(path, "validator"))
+        except OSError as e:
+            raise base.PathError(self.basedir, e.strerror) from e
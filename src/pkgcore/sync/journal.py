@@ -0,0 +1,223 @@
+"""
+Change journals of synced repos
+
+Syncers record the repo paths each sync added, modified or deleted in a
+journal stored next to the repo, allowing consumers such as caches to only
+invalidate what changed instead of rescanning the repo.
+
+Journal entries are identified by increasing positions.  Consumers store the
+:attr:`ChangeJournal.position` they're up to date with and later query the
+changes made since then via :meth:`ChangeJournal.changes`, which returns None
+whenever the changes can't be determined precisely.  In that case, e.g. when
+a syncer doesn't support tracking changes or the position is older than the
+retained entries, a full rescan is required.
+"""
+
+__all__ = ("ChangeJournal", "tree_changes")
+
+import filecmp
+import json
+import os
+import stat
+import time
+
+from snakeoil.fileutils import AtomicWriteFile
+
+from ..log import logger
+
+# change statuses
+ADDED = "A"
+MODIFIED = "M"
+DELETED = "D"
+
+
+def _merge(old, new):
+    """Return the combined status of consecutive changes to a path."""
+    if old == ADDED and new == MODIFIED:
+        return ADDED
+    if old == DELETED and new == ADDED:
+        return MODIFIED
+    return new
+
+
+def _scan(path, exclude=frozenset()):
+    """Map the relative paths of non-directory entries of a tree to their stat."""
+    entries = {}
+    stack = [""]
+    while stack:
+        subdir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(path, subdir))
+        except FileNotFoundError:
+            continue
+        with it:
+            for entry in it:
+                relpath = os.path.join(subdir, entry.name)
+                if not subdir and entry.name in exclude:
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if stat.S_ISDIR(st.st_mode):
+                    stack.append(relpath)
+                else:
+                    entries[relpath] = st
+    return entries
+
+
+def tree_changes(old, new, exclude=frozenset()):
+    """Determine the changes between two trees.
+
+    Files with matching sizes and modification times are assumed unchanged,
+    as rsync does by default; otherwise their content is compared.
+
+    :param old: path to the old tree
+    :param new: path to the new tree
+    :param exclude: top level names ignored in both trees
+    :return: mapping of changed relative paths to their status
+    """
+    old_entries = _scan(old, exclude)
+    new_entries = _scan(new, exclude)
+    changes = {}
+    for relpath, new_st in new_entries.items():
+        old_st = old_entries.pop(relpath, None)
+        if old_st is None:
+            changes[relpath] = ADDED
+            continue
+        if stat.S_IFMT(old_st.st_mode) != stat.S_IFMT(new_st.st_mode):
+            changes[relpath] = MODIFIED
+        elif stat.S_ISLNK(new_st.st_mode):
+            if os.readlink(os.path.join(old, relpath)) != os.readlink(
+                os.path.join(new, relpath)
+            ):
+                changes[relpath] = MODIFIED
+        elif old_st.st_size != new_st.st_size or (
+            old_st.st_mtime_ns != new_st.st_mtime_ns
+            and not filecmp.cmp(
+                os.path.join(old, relpath), os.path.join(new, relpath), shallow=False
+            )
+        ):
+            changes[relpath] = MODIFIED
+    changes.update((relpath, DELETED) for relpath in old_entries)
+    return changes
+
+
+class ChangeJournal:
+    """Journal of the changes made by syncs of a repo.
+
+    The journal is stored as a header line followed by one line per sync,
+    all JSON encoded.  The header records the position the journal starts
+    at, i.e. the position of the newest dropped entry or the journal's
+    creation.
+
+    :param path: location of the journal
+    """
+
+    version = 1
+
+    # number of entries kept
+    max_entries = 50
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def for_repo(cls, location):
+        """Return the journal of a repo, stored next to it."""
+        location = location.rstrip(os.path.sep)
+        return cls(
+            os.path.join(
+                os.path.dirname(location),
+                f".{os.path.basename(location)}.sync-journal",
+            )
+        )
+
+    def _read(self):
+        """Return the journal start position and its entries."""
+        try:
+            with open(self.path) as f:
+                header = json.loads(f.readline())
+                if header.get("version") != self.version:
+                    raise ValueError(f"unsupported version: {header.get('version')}")
+                return header["start"], [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return None, []
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning(f"ignoring invalid sync journal {self.path!r}: {e}")
+            return None, []
+
+    @property
+    def position(self):
+        """Position of the newest entry, consumers are up to date with."""
+        start, entries = self._read()
+        if entries:
+            return entries[-1]["position"]
+        return start if start is not None else 0
+
+    def entries(self):
+        """Return the list of journal entries, oldest first.
+
+        Each entry is a mapping with ``position``, ``time``, ``syncer`` and
+        ``changes`` keys, where changes is a mapping of the relative paths
+        changed by the sync to their status- ``A``, ``M`` or ``D`` for added,
+        modified and deleted paths respectively- or None if they're unknown.
+        """
+        return self._read()[1]
+
+    def changes(self, since):
+        """Return the changes made by syncs after a position.
+
+        :param since: journal position the caller is up to date with
+        :return: mapping of changed relative paths to their status, or None
+            if the changes can't be determined
+        """
+        start, entries = self._read()
+        if start is None or since < start:
+            return None
+        changes = {}
+        for entry in entries:
+            if entry["position"] <= since:
+                continue
+            if entry["changes"] is None:
+                return None
+            for path, status in entry["changes"].items():
+                changes[path] = _merge(changes.get(path), status)
+        return changes
+
+    def record(self, changes, syncer=None):
+        """Add an entry for a sync.
+
+        :param changes: mapping of changed relative paths to their status, or
+            None if the changes are unknown
+        :param syncer: name of the syncer
+        :return: position of the new entry
+        """
+        start, entries = self._read()
+        now = time.time_ns()
+        if start is None:
+            # positions are timestamps, so recreated journals are never
+            # mistaken for older ones
+            start = now
+        last = entries[-1]["position"] if entries else start
+        entry = {
+            "position": max(now, last + 1),
+            "time": int(time.time()),
+            "syncer": syncer,
+            "changes": changes,
+        }
+        entries.append(entry)
+        if len(entries) > self.max_entries:
+            dropped = entries[: -self.max_entries]
+            start = dropped[-1]["position"]
+            entries = entries[-self.max_entries :]
+            self._write(start, entries)
+        elif len(entries) == 1:
+            self._write(start, entries)
+        else:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry["position"]
+
+    def _write(self, start, entries):
+        with AtomicWriteFile(self.path) as f:
+            f.write(json.dumps({"version": self.version, "start": start}) + "\n")
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
@@ -3,19 +3,35 @@ __all__ = (
     "rsync_timestamp_syncer",
 )
 
+import json
 import os
+import re
 import socket
 import tempfile
 import time
 import typing
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
 from itertools import islice
 from os.path import join as pjoin
 
+from snakeoil.fileutils import AtomicWriteFile
+from snakeoil.osutils import ensure_dirs
+
+from .. import const
 from ..config.hint import ConfigHint
+from ..log import logger
 from . import base
 
 
 class rsync_syncer(base.ExternalSyncer):
+    """Syncer using rsync.
+
+    The addresses the sync URI and any alternative mirrors resolve to are
+    tried fastest first, as determined by timing TCP connections to all of
+    them in parallel.  Probe results are cached between runs.
+    """
+
     default_excludes: typing.ClassVar[list] = ["/distfiles", "/local", "/packages"]
     default_includes: typing.ClassVar[list] = []
     default_conn_timeout = 15
@@ -38,6 +54,14 @@ class rsync_syncer(base.ExternalSyncer):
     default_retries = 5
     binary = "rsync"
 
+    default_port = 873
+    # deadline in seconds for probing mirror latencies, 0 disables probing
+    default_probe_timeout = 2
+    # seconds probe results are reused for
+    default_probe_ttl = 60 * 60
+    probe_cache_path = pjoin(const.USER_CACHE_PATH, "rsync-probes.json")
+    max_probe_jobs = 16
+
     @classmethod
     def _parse_uri(cls, raw_uri):
         if not raw_uri.startswith("rsync://") and not raw_uri.startswith("rsync+"):
@@ -64,6 +88,9 @@ class rsync_syncer(base.ExternalSyncer):
             "opts": "list",
             "extra_opts": "list",
             "proxy": "str",
+            "mirrors": "list",
+            "probe_timeout": "str",
+            "probe_ttl": "str",
         },
         typename="syncer",
     )
@@ -81,11 +108,22 @@ class rsync_syncer(base.ExternalSyncer):
         proxy=None,
         opts=(),
         extra_opts=(),
+        mirrors=(),
+        probe_timeout=default_probe_timeout,
+        probe_ttl=default_probe_ttl,
     ):
         uri = uri.rstrip(os.path.sep) + os.path.sep
         self.rsh, uri = self._parse_uri(uri)
         super().__init__(basedir, uri, default_verbosity=1, usersync=usersync)
         self.hostname = self.parse_hostname(self.uri)
+        self.mirrors = []
+        for mirror in mirrors:
+            mirror = mirror.rstrip(os.path.sep) + os.path.sep
+            if not mirror.startswith("rsync://"):
+                raise base.UriError(mirror, "mirrors must start with rsync://")
+            self.mirrors.append(mirror)
+        self.probe_timeout = float(probe_timeout)
+        self.probe_ttl = float(probe_ttl)
         if self.rsh:
             self.rsh = self.require_binary(self.rsh)
         self.opts = list(opts) if opts else list(self.default_opts)
@@ -106,18 +144,30 @@ class rsync_syncer(base.ExternalSyncer):
     def parse_hostname(uri):
         return uri[len("rsync://") :].split("@", 1)[-1].split("/", 1)[0]
 
-    def _get_ips(self):
+    @classmethod
+    def split_port(cls, hostname):
+        """Split a hostname into the host and port parts."""
+        host, sep, port = hostname.rpartition(":")
+        if sep and port.isdigit() and (host.endswith("]") or ":" not in host):
+            return host, int(port)
+        return hostname, cls.default_port
+
+    def _get_ips(self, hostname=None):
+        if hostname is None:
+            hostname = self.hostname
+        hostname, _ = self.split_port(hostname)
         if self.use_proxy:
             # If we're using a proxy, name resolution is best left to the proxy.
-            yield self.hostname
+            yield hostname
             return
+        hostname = hostname.strip("[]")
 
         af_fam = socket.AF_INET
         if self.is_ipv6:
             af_fam = socket.AF_INET6
         try:
             for ipaddr in socket.getaddrinfo(
-                self.hostname, None, af_fam, socket.SOCK_STREAM
+                hostname, None, af_fam, socket.SOCK_STREAM
             ):
                 if ipaddr[0] == socket.AF_INET6:
                     yield f"[{ipaddr[4][0]}]"
@@ -125,9 +175,132 @@ class rsync_syncer(base.ExternalSyncer):
                     yield ipaddr[4][0]
         except OSError as e:
             raise base.SyncError(
-                f"DNS resolution failed for {self.hostname!r}: {e.strerror}"
+                f"DNS resolution failed for {hostname!r}: {e.strerror}"
             )
 
+    def _targets(self):
+        """Return (uri, address) tuples of the sync URI and mirrors to try."""
+        targets = []
+        error = None
+        for uri in (self.uri, *self.mirrors):
+            hostname = self.parse_hostname(uri)
+            host, _ = self.split_port(hostname)
+            try:
+                targets.extend(
+                    (uri.replace(host, ip, 1), ip) for ip in self._get_ips(hostname)
+                )
+            except base.SyncError as e:
+                logger.warning(str(e))
+                error = e if error is None else error
+        if not targets and error is not None:
+            raise error
+        if (
+            len(targets) > 1
+            and self.probe_timeout > 0
+            and not self.use_proxy
+            and not self.rsh
+        ):
+            targets = self._order_targets(targets)
+        return targets
+
+    def _order_targets(self, targets):
+        """Sort targets by their connection latency, unreachable ones last."""
+        addresses = {}
+        for uri, ip in targets:
+            _, port = self.split_port(self.parse_hostname(uri))
+            addresses[uri] = (ip, port)
+        latencies = self._probe(set(addresses.values()))
+
+        def key(target):
+            latency = latencies.get(addresses[target[0]])
+            return (latency is None, latency or 0)
+
+        targets = sorted(targets, key=key)
+        for uri, _ in targets:
+            latency = latencies.get(addresses[uri])
+            if latency is None:
+                logger.debug(f"{uri}: unreachable")
+            else:
+                logger.debug(f"{uri}: {latency * 1000:.1f}ms")
+        return targets
+
+    @staticmethod
+    def _connect_time(ip, port, timeout):
+        """Return the time in seconds a TCP connection to an address takes."""
+        start = time.monotonic()
+        with socket.create_connection((ip.strip("[]"), port), timeout=timeout):
+            return time.monotonic() - start
+
+    def _load_probes(self):
+        try:
+            with open(self.probe_cache_path) as f:
+                probes = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.debug(f"failed loading rsync probe cache: {e}")
+            return {}
+        if not isinstance(probes, dict):
+            return {}
+        # drop expired results
+        now = time.time()
+        return {
+            k: v
+            for k, v in probes.items()
+            if isinstance(v, list) and len(v) == 2 and now - v[1] < self.probe_ttl
+        }
+
+    def _save_probes(self, probes):
+        try:
+            ensure_dirs(os.path.dirname(self.probe_cache_path))
+            with AtomicWriteFile(self.probe_cache_path) as f:
+                json.dump(probes, f)
+        except OSError as e:
+            logger.debug(f"failed saving rsync probe cache: {e}")
+
+    def _probe(self, addresses):
+        """Time TCP connections to (ip, port) addresses in parallel.
+
+        Connections not established within the probe deadline are
+        considered unreachable.  Fresh cached results are reused.
+
+        :return: mapping of addresses to connection times in seconds, or None
+            for unreachable addresses
+        """
+        probes = self._load_probes()
+        results = {}
+        pending = []
+        for ip, port in addresses:
+            if (probe := probes.get(f"{ip}:{port}")) is not None:
+                results[(ip, port)] = probe[0]
+            else:
+                pending.append((ip, port))
+        if not pending:
+            return results
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(pending), self.max_probe_jobs)
+        )
+        futures = {
+            executor.submit(self._connect_time, ip, port, self.probe_timeout): (
+                ip,
+                port,
+            )
+            for ip, port in pending
+        }
+        done, _ = wait(futures, timeout=self.probe_timeout)
+        # stragglers are left to time out on their own
+        executor.shutdown(wait=False, cancel_futures=True)
+        now = time.time()
+        for future, (ip, port) in futures.items():
+            latency = None
+            if future in done and future.exception() is None:
+                latency = future.result()
+            results[(ip, port)] = latency
+            probes[f"{ip}:{port}"] = [latency, now]
+        self._save_probes(probes)
+        return results
+
     def _sync(self, verbosity):
         opts = list(self.opts)
         if self.rsh:
@@ -140,31 +313,69 @@ class rsync_syncer(base.ExternalSyncer):
         elif verbosity > 0:
             opts.extend("-v" for x in range(verbosity))
 
-        # zip limits to the shortest iterable
-        ret = None
-        for ip in islice(self._get_ips(), self.retries):
-            cmd = [
-                self.binary_path,
-                self.uri.replace(self.hostname, ip, 1),
-                self.basedir,
-            ] + opts
-
-            ret = self._spawn(cmd)
-            if ret == 0:
-                return True
-            elif ret == 1:
-                raise base.SyncError("rsync command syntax error: {' '.join(cmd)}")
-            elif ret == 11:
-                raise base.SyncError("rsync ran out of disk space")
+        with ExitStack() as stack:
+            log = None
+            if self.track_changes:
+                # changes are logged in itemized form, see `man rsync`
+                log = stack.enter_context(
+                    tempfile.NamedTemporaryFile(prefix="pkgcore-rsync-", suffix=".log")
+                )
+                if os.getuid() == 0 and self.uid != 0:
+                    os.chown(log.name, self.uid, self.gid)
+                opts.extend((f"--log-file={log.name}", "--log-file-format=%i|%n"))
+
+            ret = None
+            for uri, _ in islice(self._targets(), self.retries):
+                cmd = [self.binary_path, uri, self.basedir] + opts
+
+                ret = self._spawn(cmd)
+                if ret == 0:
+                    if log is not None:
+                        with open(
+                            log.name, encoding="utf8", errors="surrogateescape"
+                        ) as f:
+                            self.changes = self._parse_changes(f)
+                    return True
+                elif ret == 1:
+                    raise base.SyncError("rsync command syntax error: {' '.join(cmd)}")
+                elif ret == 11:
+                    raise base.SyncError("rsync ran out of disk space")
         # need to do something here instead of just restarting...
         # else:
         #     print(ret)
         raise base.SyncError("all attempts failed")
 
+    # log file lines of itemized changes, prefixed by timestamps and PIDs
+    _itemized_re = re.compile(r"\[\d+\] (\*deleting|[<>ch.][fdLDS].{9}) *\|(.*)$")
+
+    @classmethod
+    def _parse_changes(cls, lines):
+        """Return the changed paths from itemized rsync log lines."""
+        changes = {}
+        for line in lines:
+            if (match := cls._itemized_re.search(line.rstrip("\n"))) is None:
+                continue
+            item, path = match.groups()
+            if path.endswith("/"):
+                # directories
+                continue
+            if item == "*deleting":
+                changes[path] = "D"
+            elif item[0] == "." or item[1] == "d":
+                # unchanged content or directories
+                continue
+            elif item[2:] == "+" * 9:
+                changes[path] = "A"
+            else:
+                changes[path] = "M"
+        return changes
+
 
 class _RsyncFileSyncer(rsync_syncer):
     """Support syncing a single file over rsync."""
 
+    track_changes = False
+
     def __init__(self, path, uri):
         super().__init__(basedir=path, uri=uri)
         # override parent classes that always assume directory syncing
@@ -223,6 +434,7 @@ class rsync_timestamp_syncer(rsync_syncer):
                         else:
                             doit = -delta > self.negative_sync_delay
             if not doit:
+                self.changes = {}
                 return True
             ret = super()._sync(verbosity)
             # force a reset of the timestamp
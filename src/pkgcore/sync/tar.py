@@ -1,18 +1,43 @@
 __all__ = ("tar_syncer",)
 
 import atexit
+import bz2
+import gzip
+import hashlib
+import http.client
+import lzma
 import os
 import shutil
-import subprocess
-import tempfile
+import tarfile
+import typing
+import urllib.error
 from functools import partial
 
+from ..log import logger
 from . import base
 from .http import http_syncer
+from .journal import tree_changes
 
 
-class tar_syncer(http_syncer, base.ExternalSyncer):
-    binary = "tar"
+class _HashingReader:
+    """Readable stream hashing the data read through it."""
+
+    def __init__(self, handle, hasher):
+        self.handle = handle
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        buf = self.handle.read(size)
+        self.hasher.update(buf)
+        return buf
+
+
+class tar_syncer(http_syncer):
+    """Syncer that fetches and unpacks tarball snapshots over HTTP(S).
+
+    Snapshots are decompressed and unpacked while being downloaded, the
+    tarball itself is never written to disk.
+    """
 
     supported_uris = (
         ("tar+http://", 5),
@@ -22,6 +47,21 @@ class tar_syncer(http_syncer, base.ExternalSyncer):
     # TODO: support more of the less used file extensions
     supported_protocols = ("http://", "https://")
     supported_exts = (".tar.gz", ".tar.bz2", ".tar.xz")
+    decompressors: typing.ClassVar[dict] = {"gz": gzip, "bz2": bz2, "xz": lzma}
+
+    # number of leading path components stripped from archive members
+    # TODO: programmatically determine how many components to strip?
+    strip_components = 1
+
+    # hash algorithm of the digest generated for downloaded tarballs
+    digest_type = "sha512"
+    digest = None
+    # suffix of the published checksum file tarball digests are verified
+    # against, verification is skipped if the file doesn't exist
+    checksum_suffix = f".{digest_type}sum"
+
+    # unpacked snapshots are discarded on failure
+    keep_partial = False
 
     @classmethod
     def parse_uri(cls, raw_uri):
@@ -38,11 +78,6 @@ class tar_syncer(http_syncer, base.ExternalSyncer):
         raise base.UriError(raw_uri, "unsupported URI")
 
     def _pre_download(self):
-        # create temp file for downloading
-        self.tarball = tempfile.NamedTemporaryFile()  # noqa: SIM115 (kept open across methods, closed via atexit below)
-        # make sure temp file is deleted on exit
-        atexit.register(partial(self.tarball.close))
-
         # determine names of tempdirs for staging
         basedir = self.basedir.rstrip(os.path.sep)
         repos_dir = os.path.dirname(basedir)
@@ -52,42 +87,89 @@ class tar_syncer(http_syncer, base.ExternalSyncer):
         # remove tempdirs on exit
         atexit.register(partial(shutil.rmtree, self.tempdir, ignore_errors=True))
         atexit.register(partial(shutil.rmtree, self.tempdir_old, ignore_errors=True))
-        return self.tarball.name
+        return self.tempdir
 
-    def _post_download(self, path):
-        super()._post_download(path)
+    def _members(self, archive):
+        """Yield archive members with their leading path components stripped."""
+        for member in archive:
+            name = member.name.split("/", self.strip_components)
+            if len(name) <= self.strip_components or not name[-1]:
+                continue
+            member.name = name[-1]
+            if member.islnk():
+                linkname = member.linkname.split("/", self.strip_components)
+                if len(linkname) <= self.strip_components:
+                    continue
+                member.linkname = linkname[-1]
+            yield member
 
+    def _fetch(self, resp, dest, blocksize):
         # create tempdirs for staging
         try:
-            os.makedirs(self.tempdir)
+            os.makedirs(dest)
             os.makedirs(self.tempdir_old)
         except OSError as e:
             raise base.SyncError(f"failed creating repo update dirs: {e}")
 
-        exts = {"gz": "gzip", "bz2": "bzip2", "xz": "xz"}
-        compression = exts[self.uri.rsplit(".", 1)[1]]
-        # use tar instead of tarfile so we can easily strip leading path components
-        # TODO: programmatically determine how many components to strip?
-        cmd = [
-            "tar",
-            "--extract",
-            f"--{compression}",
-            "-f",
-            self.tarball.name,
-            "--strip-components=1",
-            "--no-same-owner",
-            "-C",
-            self.tempdir,
-        ]
+        hasher = hashlib.new(self.digest_type)
+        stream = _HashingReader(resp, hasher)
+        # decompress separately from tarfile so truncated downloads are
+        # detected via the missing end of stream marker
+        decompressor = self.decompressors[self.uri.rsplit(".", 1)[1]]
+        try:
+            with (
+                decompressor.open(stream, "rb") as handle,
+                tarfile.open(fileobj=handle, mode="r|", bufsize=blocksize) as archive,
+            ):
+                # the data filter drops ownership, matching `tar --no-same-owner`
+                archive.extractall(dest, members=self._members(archive), filter="data")
+                # consume trailing data so the entire tarball is verified and hashed
+                while handle.read(blocksize):
+                    pass
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise base.SyncError(f"failed to unpack tarball: {e}") from e
+
+        self.digest = hasher.hexdigest()
+        logger.debug(f"{self.digest_type} digest of {self.uri!r}: {self.digest}")
+        self._verify(self.digest)
+
+    def _read_checksum(self, uri):
+        with self._open({}, uri=uri) as resp:
+            return resp.read()
 
+    def _verify(self, digest):
+        """Verify a tarball digest against the published checksum file."""
+        uri = self.uri + self.checksum_suffix
         try:
-            subprocess.run(cmd, stderr=subprocess.PIPE, check=True, encoding="utf8")
-        except subprocess.CalledProcessError as e:
-            error = e.stderr.splitlines()[0]
-            raise base.SyncError(f"failed to unpack tarball: {error}")
+            data = self._retry(self._read_checksum, uri)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                logger.debug(f"no published checksum, skipping verification: {uri!r}")
+                return
+            raise base.SyncError(f"failed fetching {uri!r}: {e.reason}") from e
+        except (OSError, http.client.HTTPException) as e:
+            raise base.SyncError(f"failed fetching {uri!r}: {e}") from e
 
+        # coreutils format, the digest followed by the file name
+        fields = data.split(None, 1)
+        expected = fields[0].decode("ascii", "replace").lower() if fields else ""
+        if expected != digest:
+            raise base.SyncError(
+                f"{self.digest_type} checksum mismatch for {self.uri!r}: "
+                f"expected {expected!r}, got {digest!r}"
+            )
+
+    def _post_download(self, path):
         # TODO: verify gpg data if it exists
 
+        if os.path.exists(self.basedir):
+            try:
+                self.changes = tree_changes(
+                    self.basedir, path, exclude=frozenset((".etag", ".modified"))
+                )
+            except OSError as e:
+                logger.warning(f"failed determining repo changes: {e}")
+
         try:
             if os.path.exists(self.basedir):
                 # move old repo out of the way if it exists
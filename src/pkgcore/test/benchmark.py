@@ -0,0 +1,280 @@
+"""Local benchmark suite.
+
+Run via ``python -m pkgcore.test.benchmark``; results are written as JSON so
+runs across commits can be compared, e.g. while bisecting a regression::
+
+    python -m pkgcore.test.benchmark --json before.json resolver
+"""
+
+__all__ = ("benchmark", "benchmarks", "measure", "run_benchmarks")
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import tracemalloc
+from io import BytesIO
+from time import perf_counter
+
+from .. import __version__
+from ..ebuild.resolver import upgrade_resolver
+from ..fs._tar import tarfile
+from ..fs.tar import convert_archive
+from ..resolver.sat import sat_merge_plan
+from .synthetic import generate_contents, generate_repos
+
+# benchmark name -> (functor, {size: params})
+benchmarks = {}
+
+
+def benchmark(name, **sizes):
+    """Register a benchmark function.
+
+    The function is called with the parameters for the requested size and
+    returns a callable performing the timed work, and returning a mapping of
+    extra JSON serializable results.
+
+    :param name: benchmark name
+    :param sizes: mapping of size name to the parameters for the benchmark
+    """
+
+    def decorator(functor):
+        benchmarks[name] = (functor, sizes)
+        return functor
+
+    return decorator
+
+
+def measure(functor, repeat=3):
+    """Time a callable, and track its peak memory usage in a separate run.
+
+    :return: mapping of timing and memory results, along with any results
+        returned by the callable
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        extra = functor()
+        times.append(perf_counter() - start)
+
+    # tracemalloc slows everything down so memory is measured separately
+    gc.collect()
+    tracemalloc.start()
+    try:
+        functor()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    results = {
+        "runs": repeat,
+        "min": min(times),
+        "max": max(times),
+        "mean": sum(times) / repeat,
+        "peak_memory": peak,
+    }
+    if extra:
+        results.update(extra)
+    return results
+
+
+def run_benchmarks(names=None, sizes=("small",), repeat=3, out=None):
+    """Run benchmarks, returning their results.
+
+    :param names: benchmark names to run, defaults to all of them
+    :param sizes: sizes to run each benchmark at, sizes a benchmark doesn't
+        define are skipped
+    :param repeat: number of timed runs per benchmark
+    :param out: file object progress is reported to
+    """
+    if names is None:
+        names = sorted(benchmarks)
+    results = {}
+    for name in names:
+        functor, params = benchmarks[name]
+        for size in sizes:
+            if size not in params:
+                continue
+            if out is not None:
+                out.write(f"{name} ({size})...\n")
+                out.flush()
+            data = measure(functor(**params[size]), repeat=repeat)
+            data["params"] = params[size]
+            results.setdefault(name, {})[size] = data
+    return {
+        "pkgcore": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+
+
+def _resolver_benchmark(resolver="default", **params):
+    repos = generate_repos(**params)
+    # generated post dependency cycles require cycle breaking
+    kwargs = {"drop_cycles": True}
+    if resolver == "sat":
+        kwargs["resolver_cls"] = sat_merge_plan
+
+    def run():
+        resolver = upgrade_resolver([repos.vdb], [repos.repo], **kwargs)
+        start = perf_counter()
+        failed = bool(resolver.add_atoms(repos.targets, finalize=True))
+        resolve_time = perf_counter() - start
+        start = perf_counter()
+        ops = resolver.state.ops(only_real=True)
+        return {
+            "resolve_time": resolve_time,
+            "ops_time": perf_counter() - start,
+            "failed": failed,
+            "ops": len(ops),
+        }
+
+    return run
+
+
+_resolver_sizes = {
+    "small": {"pkgs": 200, "targets": 20},
+    "medium": {"pkgs": 2000, "targets": 200},
+    "large": {"pkgs": 5000, "targets": 500, "fan_out": 4},
+}
+
+benchmark("resolver", **_resolver_sizes)(_resolver_benchmark)
+benchmark(
+    "resolver-slotted",
+    **{k: dict(v, slots=3, versions=3) for k, v in _resolver_sizes.items()},
+)(_resolver_benchmark)
+benchmark(
+    "resolver-sat",
+    **{k: dict(v, resolver="sat") for k, v in _resolver_sizes.items()},
+)(_resolver_benchmark)
+
+
+def _contents_benchmark(**params):
+    contents = generate_contents(**params)
+    links = sorted(contents.image.iterlinks(), reverse=True)
+
+    def run():
+        # collapse symlinked directories in the image as done for binpkgs by
+        # pkgcore.fs.tar.convert_archive
+        cset = contents.image.clone()
+        start = perf_counter()
+        additions = []
+        for link in links:
+            affected = cset.child_nodes(link.location)
+            if not affected:
+                continue
+            cset.difference_update(affected)
+            additions.extend(
+                affected.change_offset(link.location, link.resolved_target)
+            )
+        cset.update(additions)
+        collapse_time = perf_counter() - start
+
+        # map the image onto livefs symlinks as done during merging
+        start = perf_counter()
+        cset.map_directory_structure(contents.livefs)
+        return {
+            "collapse_time": collapse_time,
+            "map_time": perf_counter() - start,
+            "entries": len(contents.image),
+            "symlinks": len(links),
+        }
+
+    return run
+
+
+benchmark(
+    "contents",
+    small={"entries": 20000},
+    medium={"entries": 200000},
+    large={"entries": 1000000},
+)(_contents_benchmark)
+
+
+def _tar_benchmark(**params):
+    contents = generate_contents(**params)
+    # build the archive upfront, only converting it is timed
+    data = BytesIO()
+    with tarfile.TarFile(fileobj=data, mode="w") as archive:
+        for x in sorted(contents.image):
+            info = tarfile.TarInfo(f".{x.location}")
+            if x.is_dir:
+                info.type = tarfile.DIRTYPE
+            elif x.is_sym:
+                info.type = tarfile.SYMTYPE
+                info.linkname = x.target
+            archive.addfile(info, BytesIO() if x.is_reg else None)
+    data = data.getvalue()
+
+    def run():
+        archive = tarfile.TarFile(fileobj=BytesIO(data), mode="r")
+        cset = convert_archive(archive)
+        return {"members": len(contents.image), "entries": len(cset)}
+
+    return run
+
+
+benchmark(
+    "tar",
+    small={"entries": 20000},
+    medium={"entries": 100000},
+    large={"entries": 500000},
+)(_tar_benchmark)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pkgcore.test.benchmark", description="run pkgcore benchmarks"
+    )
+    parser.add_argument(
+        "names",
+        nargs="*",
+        metavar="BENCHMARK",
+        help="benchmarks to run, defaults to all of them",
+    )
+    parser.add_argument(
+        "-s",
+        "--size",
+        dest="sizes",
+        action="append",
+        choices=("small", "medium", "large"),
+        help="benchmark sizes to run, defaults to small",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="number of timed runs"
+    )
+    parser.add_argument(
+        "--json",
+        type=argparse.FileType("w"),
+        default=sys.stdout,
+        help="file to write JSON results to, defaults to stdout",
+    )
+    parser.add_argument(
+        "-l", "--list", action="store_true", help="list available benchmarks"
+    )
+    options = parser.parse_args(argv)
+
+    if options.list:
+        for name, (_, sizes) in sorted(benchmarks.items()):
+            print(f"{name}: {', '.join(sizes)}")
+        return 0
+    unknown = set(options.names).difference(benchmarks)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(
+        names=options.names or None,
+        sizes=options.sizes or ("small",),
+        repeat=options.repeat,
+        out=sys.stderr,
+    )
+    json.dump(results, options.json, indent=2, sort_keys=True)
+    options.json.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
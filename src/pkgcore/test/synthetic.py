@@ -0,0 +1,199 @@
+"""Synthetic repository and contents generation for tests and benchmarks."""
+
+__all__ = (
+    "SyntheticTree",
+    "generate_contents",
+    "generate_repos",
+    "synthetic_contents",
+    "synthetic_repos",
+)
+
+import random
+from typing import NamedTuple
+
+from ..ebuild.atom import atom
+from ..fs import fs
+from ..fs.contents import contentsSet
+from ..repository.util import SimpleTree
+from .misc import FakePkg
+
+
+class SyntheticTree(SimpleTree):
+    """In-memory repo of pregenerated package instances.
+
+    Unlike :obj:`SimpleTree`, queries return the same package instances each
+    time, as with the instance caching of real repos.
+    """
+
+    def __init__(self, pkgs, livefs=False, repo_id=None):
+        """
+        Args:
+            pkgs (iterable): (cpvstr, slot, metadata dict) tuples
+            livefs (bool): regular repo if False, vdb if True
+            repo_id (str): repo ID
+        """
+        cpv_dict = {}
+        self.pkgs = {}
+        for cpvstr, slot, data in pkgs:
+            pkg = FakePkg(cpvstr, eapi="7", slot=slot, repo=self, data=dict(data))
+            self.pkgs[(pkg.category, pkg.package, pkg.fullver)] = pkg
+            cpv_dict.setdefault(pkg.category, {}).setdefault(pkg.package, []).append(
+                pkg.fullver
+            )
+        super().__init__(
+            cpv_dict, pkg_klass=self._get_pkg, livefs=livefs, repo_id=repo_id
+        )
+
+    def _get_pkg(self, *cpv):
+        return self.pkgs[cpv]
+
+    def __len__(self):
+        return len(self.pkgs)
+
+
+class synthetic_repos(NamedTuple):
+    """Generated source repo, vdb and target atoms."""
+
+    repo: SyntheticTree
+    vdb: SyntheticTree
+    targets: list
+
+
+def generate_repos(
+    pkgs=100,
+    fan_out=3,
+    slots=1,
+    versions=2,
+    or_groups=0.1,
+    blockers=0.05,
+    cycles=0.05,
+    installed=0.5,
+    targets=10,
+    categories=10,
+    seed=0,
+):
+    """Generate a source repo and vdb with a randomized dependency graph.
+
+    Packages are ordered and only depend on later packages apart from
+    requested cycles, keeping the graph solvable.
+
+    Args:
+        pkgs (int): number of package names
+        fan_out (int): maximum number of dependencies per package
+        slots (int): number of slots per package name
+        versions (int): number of versions per slot
+        or_groups (float): probability a dependency is an ``||`` group
+        blockers (float): probability a package blocks the oldest version of
+            one of its dependencies
+        cycles (float): probability a package forms a cycle with one of its
+            dependencies, via a post dependency back on it; resolving these
+            requires enabling cycle dropping for the default resolver
+        installed (float): fraction of package names with their oldest
+            version installed
+        targets (int): number of target atoms, picked from the first packages
+        categories (int): number of categories to spread packages across
+        seed (int): random seed, identical arguments generate identical repos
+    """
+    rand = random.Random(seed)
+    names = [f"cat-{i % categories}/pkg{i}" for i in range(pkgs)]
+
+    def dep_atom(idx, slot):
+        if slots > 1:
+            return f"{names[idx]}:{slot}"
+        return names[idx]
+
+    src_pkgs = []
+    vdb_pkgs = []
+    post_deps = {}
+    for idx, name in enumerate(names):
+        later = range(idx + 1, pkgs)
+        dep_idxs = rand.sample(later, min(len(later), rand.randint(0, fan_out)))
+        dep_slots = [rand.randrange(slots) for _ in dep_idxs]
+        deps = []
+        for dep, slot in zip(dep_idxs, dep_slots):
+            if rand.random() < or_groups and len(later) > 1:
+                alt = dep_atom(rand.choice(later), rand.randrange(slots))
+                deps.append(f"|| ( {dep_atom(dep, slot)} {alt} )")
+            else:
+                deps.append(dep_atom(dep, slot))
+        data = {"RDEPEND": " ".join(deps)}
+        if idx in post_deps:
+            data["PDEPEND"] = " ".join(post_deps.pop(idx))
+        if len(dep_idxs) > 1 and rand.random() < cycles:
+            # a runtime dependency pulls this package back in after it's merged
+            post_deps.setdefault(dep_idxs[-1], []).append(name)
+        if dep_idxs:
+            data["DEPEND"] = deps[0]
+            if versions > 1 and deps[0][0] != "|" and rand.random() < blockers:
+                # force upgrading the oldest version of a dependency
+                data["RDEPEND"] += f" !={names[dep_idxs[0]]}-{dep_slots[0] + 1}.0"
+        is_installed = rand.random() < installed
+        for slot in range(slots):
+            for ver in range(versions):
+                cpvstr = f"{name}-{slot + 1}.{ver}"
+                src_pkgs.append((cpvstr, str(slot), data))
+                if is_installed and not ver:
+                    vdb_pkgs.append((cpvstr, str(slot), data))
+
+    return synthetic_repos(
+        SyntheticTree(src_pkgs, repo_id="synthetic"),
+        SyntheticTree(vdb_pkgs, livefs=True, repo_id="vdb"),
+        [atom(name) for name in names[:targets]],
+    )
+
+
+class synthetic_contents(NamedTuple):
+    """Generated package image and livefs contents."""
+
+    image: contentsSet
+    livefs: contentsSet
+
+
+def generate_contents(entries=1000, files_per_dir=20, symlinks=0.01, seed=0):
+    """Generate package image contents and matching livefs symlinks.
+
+    Directories form a random tree below ``/usr``.  A fraction of the
+    directories in the image are replaced by symlinks to sibling directories
+    while still containing entries, as found in binpkg archives, and a
+    separate fraction is a symlink on the livefs, so merging requires
+    rewriting the image onto the symlink targets.
+
+    Args:
+        entries (int): approximate number of image entries
+        files_per_dir (int): number of files per directory
+        symlinks (float): fraction of directories symlinked in the image, and
+            separately on the livefs
+        seed (int): random seed, identical arguments generate identical
+            contents
+    """
+    rand = random.Random(seed)
+    ndirs = max(1, entries // (files_per_dir + 1))
+    dirs = ["/usr"]
+    for i in range(1, ndirs):
+        dirs.append(f"{rand.choice(dirs)}/d{i}")
+
+    image = contentsSet()
+    livefs = contentsSet()
+    # symlinked directories and their descendants, nested symlinks aren't
+    # generated
+    linked = set()
+    for path in dirs:
+        roll = rand.random()
+        if path == "/usr":
+            roll = 1
+        elif path.rsplit("/", 1)[0] in linked:
+            roll = 1
+            linked.add(path)
+        target = f"{path.rsplit('/', 1)[1]}.real"
+        if roll < symlinks:
+            image.add(fs.fsLink(path, target, strict=False))
+            linked.add(path)
+        else:
+            image.add(fs.fsDir(path, strict=False))
+            if roll < 2 * symlinks:
+                livefs.add(fs.fsDir(f"{path}.real", strict=False))
+                livefs.add(fs.fsLink(path, target, strict=False))
+                linked.add(path)
+        for j in range(files_per_dir):
+            image.add(fs.fsFile(f"{path}/f{j}", chksums={}, strict=False))
+    return synthetic_contents(image, livefs)
@@ -0,0 +1,201 @@
+"""
+vdb metadata cache
+
+Installed packages store each metadata key in a separate file, so loading
+the commonly used keys for every installed package means opening thousands
+of small files.  :obj:`metadata_cache` consolidates those keys for all
+installed packages into a single file, with entries validated against the
+modification time of their package directory.  Entries of packages removed
+outside of pkgcore, e.g. by other package managers, are pruned when the cache
+is loaded.
+"""
+
+__all__ = ("metadata_cache",)
+
+import atexit
+import json
+import os
+import threading
+from os.path import join as pjoin
+
+from snakeoil.fileutils import AtomicWriteFile, readfile
+from snakeoil.osutils import ensure_dirs, listdir_dirs
+
+from ..log import logger
+
+
+class metadata_cache:
+    """Consolidated cache of vdb package metadata.
+
+    Entries are loaded lazily and written back when the process exits, or
+    explicitly via :py:meth:`commit`.  Note that directory mtimes only change
+    when files are added, removed or renamed, so metadata files rewritten in
+    place aren't detected; package managers replace them atomically.
+
+    :param location: directory the cache file is stored in
+    :param vdb_location: vdb directory, used to prune entries of packages
+        that aren't installed anymore
+    """
+
+    # bump when the stored format changes
+    version = 1
+    filename = "metadata.json"
+
+    # small keys commonly accessed while resolving or querying
+    keys = frozenset(
+        (
+            "BDEPEND",
+            "CBUILD",
+            "CHOST",
+            "CTARGET",
+            "DEFINED_PHASES",
+            "DEPEND",
+            "DESCRIPTION",
+            "EAPI",
+            "HOMEPAGE",
+            "IDEPEND",
+            "INHERITED",
+            "IUSE",
+            "IUSE_EFFECTIVE",
+            "KEYWORDS",
+            "LICENSE",
+            "PDEPEND",
+            "PROPERTIES",
+            "RDEPEND",
+            "REQUIRED_USE",
+            "RESTRICT",
+            "SLOT",
+            "USE",
+            "repository",
+        )
+    )
+
+    def __init__(self, location, vdb_location=None):
+        self.location = location
+        self.vdb_location = vdb_location
+        self.path = pjoin(location, self.filename)
+        self._entries = None
+        # packages validated against their directory during this session
+        self._validated = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._registered = False
+
+    @property
+    def entries(self):
+        """Mapping of package directory name to (mtime, metadata) entries."""
+        if self._entries is None:
+            self._entries = self._read()
+            if self.vdb_location is not None:
+                self._prune()
+        return self._entries
+
+    def _prune(self):
+        """Drop entries of packages that aren't installed anymore."""
+        installed = {}
+        stale = []
+        for key in self._entries:
+            category, _, pkg = key.partition("/")
+            if category not in installed:
+                try:
+                    pkgs = frozenset(listdir_dirs(pjoin(self.vdb_location, category)))
+                except FileNotFoundError:
+                    pkgs = frozenset()
+                except OSError as e:
+                    # leave entries alone if the category can't be checked
+                    logger.debug("failed listing vdb category %r: %s", category, e)
+                    pkgs = None
+                installed[category] = pkgs
+            pkgs = installed[category]
+            if pkgs is not None and pkg not in pkgs:
+                stale.append(key)
+        if stale:
+            for key in stale:
+                del self._entries[key]
+            self._mark_dirty()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("failed loading vdb cache %r: %s", self.path, e)
+            return {}
+        if not isinstance(data, dict) or data.get("version") != self.version:
+            return {}
+        return {k: tuple(v) for k, v in data["pkgs"].items()}
+
+    def get(self, key, path, metadata_key):
+        """Return a metadata value for a package.
+
+        :param key: cache key of the package, e.g. ``cat/pkg-1``
+        :param path: vdb directory of the package
+        :param metadata_key: metadata file name
+        :raise KeyError: if the package lacks the metadata key
+        """
+        entry = self.entries.get(key)
+        if key not in self._validated:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                # removed behind our back
+                self.remove(key)
+                raise KeyError((path, metadata_key))
+            if entry is None or entry[0] != mtime:
+                entry = self._load(key, path, mtime)
+            self._validated.add(key)
+        return entry[1][metadata_key]
+
+    def _load(self, key, path, mtime):
+        names = self.keys.intersection(os.listdir(path))
+        data = {}
+        for name in names:
+            value = readfile(pjoin(path, name), True)
+            if value is not None:
+                data[name] = value.rstrip("\n")
+        entry = (mtime, data)
+        with self._lock:
+            self.entries[key] = entry
+            self._mark_dirty()
+        return entry
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if not self._registered:
+            atexit.register(self.commit)
+            self._registered = True
+
+    def update(self, key, path):
+        """Refresh the entry for a package, e.g. after it was merged."""
+        self._load(key, path, os.stat(path).st_mtime_ns)
+        self._validated.add(key)
+
+    def remove(self, key):
+        """Drop the entry for a package, e.g. after it was unmerged."""
+        with self._lock:
+            if self.entries.pop(key, None) is not None:
+                self._mark_dirty()
+        self._validated.discard(key)
+
+    def commit(self):
+        """Write the cache to disk if it was modified.
+
+        Failures, e.g. due to lacking permissions, are logged and ignored
+        since the cache is purely an optimization.
+        """
+        if not self._dirty:
+            return
+        with self._lock:
+            data = {
+                "version": self.version,
+                "pkgs": {k: list(v) for k, v in sorted(self._entries.items())},
+            }
+            self._dirty = False
+        try:
+            ensure_dirs(self.location, mode=0o755)
+            with AtomicWriteFile(self.path) as f:
+                json.dump(data, f, separators=(",", ":"))
+        except OSError as e:
+            logger.debug("failed writing vdb cache %r: %s", self.path, e)
@@ -2,6 +2,9 @@ __all__ = ("ContentsFile", "LookupFsDev")
 
 import os
 import stat
+from collections.abc import MutableMapping
+from os.path import join as pjoin
+from os.path import normpath
 
 from snakeoil import data_source
 from snakeoil.chksum import get_handler
@@ -33,8 +36,201 @@ class LookupFsDev(fs.fsDev):
         super().__init__(path, **kwds)
 
 
+def _split(path):
+    """Split a normalized path into its directory and basename."""
+    idx = path.rfind("/")
+    if idx < 0:
+        return "", path
+    return path[:idx] or "/", path[idx + 1 :]
+
+
+def _join(dirname, basename):
+    if not basename:
+        return dirname
+    elif not dirname:
+        return basename
+    if dirname == "/":
+        return f"/{basename}"
+    return f"{dirname}/{basename}"
+
+
+class _CompactContents(MutableMapping):
+    """Mapping of locations to fs objects, storing CONTENTS entries compactly.
+
+    Entries are grouped by their directory, with each directory path stored
+    once.  Entries parsed from a CONTENTS file are kept as the remainder of
+    their line prefixed by a type character, and are only converted into fs
+    objects when accessed; other fs objects are stored as is.  The file is
+    parsed on first access.
+    """
+
+    __slots__ = ("_dirs", "_len", "_loader")
+
+    def __init__(self, loader=None):
+        self._dirs = {}
+        self._len = 0
+        self._loader = loader
+
+    def _load(self):
+        loader, self._loader = self._loader, None
+        dirs = self._dirs
+        added = 0
+        for line in loader():
+            if not line:
+                continue
+            kind, _, rest = line.partition(" ")
+            if kind == "obj":
+                path, chksum, mtime = rest.rsplit(" ", 2)
+                record = f"o{chksum} {mtime}"
+            elif kind == "sym":
+                # XXX: ValueError here (e.g. missing "->") should throw a corruption error
+                path, _, target = rest.partition(" -> ")
+                if not _:
+                    raise ValueError(f"unknown entry type {line!r}")
+                record = f"s{target}"
+            elif kind == "dir":
+                path, record = rest, "d"
+            elif kind == "dev":
+                path, record = rest, "v"
+            elif kind == "fif":
+                path, record = rest, "f"
+            else:
+                raise ValueError(f"unknown entry type {line!r}")
+            dirname, basename = _split(normpath(path))
+            entries = dirs.get(dirname)
+            if entries is None:
+                entries = dirs[dirname] = {}
+            if basename not in entries:
+                added += 1
+            entries[basename] = record
+        self._len += added
+
+    @staticmethod
+    def _materialize(path, record):
+        if not isinstance(record, str):
+            return record
+        kind = record[0]
+        if kind == "o":
+            chksum, mtime = record[1:].split(" ")
+            return fs.fsFile(
+                path, chksums={"md5": int(chksum, 16)}, mtime=int(mtime), strict=False
+            )
+        elif kind == "d":
+            return fs.fsDir(path, strict=False)
+        elif kind == "s":
+            target, mtime = record[1:].rsplit(" ", 1)
+            return fs.fsLink(path, target, mtime=int(mtime), strict=False)
+        elif kind == "v":
+            return LookupFsDev(path, strict=False)
+        return fs.fsFifo(path, strict=False)
+
+    def records(self):
+        """Yield (location, record) pairs without materializing fs objects."""
+        if self._loader is not None:
+            self._load()
+        for dirname, entries in self._dirs.items():
+            for basename, record in entries.items():
+                yield _join(dirname, basename), record
+
+    def __getitem__(self, path):
+        if self._loader is not None:
+            self._load()
+        dirname, basename = _split(path)
+        return self._materialize(path, self._dirs[dirname][basename])
+
+    def __setitem__(self, path, obj):
+        if self._loader is not None:
+            self._load()
+        dirname, basename = _split(path)
+        entries = self._dirs.setdefault(dirname, {})
+        if basename not in entries:
+            self._len += 1
+        entries[basename] = obj
+
+    def __delitem__(self, path):
+        if self._loader is not None:
+            self._load()
+        dirname, basename = _split(path)
+        entries = self._dirs[dirname]
+        del entries[basename]
+        if not entries:
+            del self._dirs[dirname]
+        self._len -= 1
+
+    def __contains__(self, path):
+        if self._loader is not None:
+            self._load()
+        dirname, basename = _split(path)
+        entries = self._dirs.get(dirname)
+        return entries is not None and basename in entries
+
+    def __iter__(self):
+        return (path for path, _ in self.records())
+
+    def values(self):
+        materialize = self._materialize
+        return (materialize(path, record) for path, record in self.records())
+
+    def __len__(self):
+        if self._loader is not None:
+            self._load()
+        return self._len
+
+    def clear(self):
+        self._loader = None
+        self._dirs.clear()
+        self._len = 0
+
+    def rewrite_offset(self, old_offset, new_offset):
+        """Return a copy with locations moved from one offset to another.
+
+        Matches :obj:`pkgcore.fs.contents.change_offset_rewriter`, but rewrites
+        each directory once instead of every entry.
+        """
+        old_offset = old_offset.rstrip("/")
+        offset_len = len(old_offset)
+        new = self.__class__()
+        for dirname, entries in self._dirs.items():
+            if (
+                not old_offset
+                or dirname == old_offset
+                or dirname.startswith(old_offset + "/")
+            ):
+                new_dirname = normpath(
+                    pjoin(new_offset, dirname[offset_len:].lstrip("/"))
+                )
+                paths = (
+                    (_join(new_dirname, basename), record)
+                    for basename, record in entries.items()
+                )
+            else:
+                paths = (
+                    (
+                        normpath(
+                            pjoin(
+                                new_offset,
+                                _join(dirname, basename)[offset_len:].lstrip("/"),
+                            )
+                        ),
+                        record,
+                    )
+                    for basename, record in entries.items()
+                )
+            for path, record in paths:
+                if not isinstance(record, str):
+                    record = record.change_attributes(location=path)
+                new[path] = record
+        return new
+
+
 class ContentsFile(contentsSet):
-    """class wrapping a contents file"""
+    """class wrapping a contents file
+
+    Entries are parsed lazily and stored compactly, with fs objects created
+    on demand; see :obj:`_CompactContents`.
+    """
+
+    __dict_kls__ = _CompactContents
 
     def __init__(self, source, mutable=False, create=False):
         if not isinstance(source, (data_source.base, str)):
@@ -43,7 +239,7 @@ class ContentsFile(contentsSet):
         self._source = source
 
         if not create:
-            self.update(self._iter_contents())
+            self._dict = _CompactContents(self._get_fd)
 
         self.mutable = mutable
 
@@ -51,7 +247,7 @@ class ContentsFile(contentsSet):
         # create is used to block it from reading.
         cset = self.__class__(self._source, mutable=True, create=True)
         if not empty:
-            cset.update(self)
+            cset._dict.update(self._dict.records())
         return cset
 
     def add(self, obj):
@@ -80,41 +276,40 @@ class ContentsFile(contentsSet):
     def flush(self):
         return self._write()
 
-    def _iter_contents(self):
-        self.clear()
-        for line in self._get_fd():
-            if not line:
-                continue
-            s = line.split(" ")
-            if s[0] in ("dir", "dev", "fif"):
-                path = " ".join(s[1:])
-                if s[0] == "dir":
-                    obj = fs.fsDir(path, strict=False)
-                elif s[0] == "dev":
-                    obj = LookupFsDev(path, strict=False)
-                else:
-                    obj = fs.fsFifo(path, strict=False)
-            elif s[0] == "obj":
-                path = " ".join(s[1:-2])
-                obj = fs.fsFile(
-                    path,
-                    chksums={"md5": int(s[-2], 16)},
-                    mtime=int(s[-1]),
-                    strict=False,
-                )
-            elif s[0] == "sym":
-                # XXX: ValueError here (e.g. missing "->") should throw a corruption error
-                p = s.index("->")
-                obj = fs.fsLink(
-                    " ".join(s[1:p]),
-                    " ".join(s[p + 1 : -1]),
-                    mtime=int(s[-1]),
-                    strict=False,
-                )
+    def _iter_kind(self, kind, invert=False):
+        materialize = self._dict._materialize
+        for path, record in self._dict.records():
+            if isinstance(record, str):
+                matched = record[0] == kind
             else:
-                raise ValueError(f"unknown entry type {line!r}")
+                matched = getattr(record, _kinds[kind])
+            if matched != invert:
+                yield materialize(path, record)
+
+    def iterfiles(self, invert=False):
+        return self._iter_kind("o", invert)
+
+    def iterdirs(self, invert=False):
+        return self._iter_kind("d", invert)
+
+    def itersymlinks(self, invert=False):
+        return self._iter_kind("s", invert)
+
+    iterlinks = itersymlinks
+
+    def iterdevs(self, invert=False):
+        return self._iter_kind("v", invert)
 
-            yield obj
+    def iterfifos(self, invert=False):
+        return self._iter_kind("f", invert)
+
+    def change_offset(self, old_offset, new_offset):
+        cset = self.clone(empty=True)
+        cset._dict = self._dict.rewrite_offset(old_offset, new_offset)
+        return cset
+
+    def insert_offset(self, offset):
+        return self.change_offset("/", offset)
 
     def _write(self):
         md5_handler = get_handler("md5")
@@ -122,7 +317,22 @@ class ContentsFile(contentsSet):
         try:
             outfile = self._get_fd(True)
 
-            for obj in sorted(self):
+            for path, record in sorted(self._dict.records()):
+                if isinstance(record, str):
+                    kind = record[0]
+                    if kind == "o":
+                        chksum, mtime = record[1:].split(" ")
+                        chksum = md5_handler.long2str(int(chksum, 16))
+                        s = f"obj {path} {chksum} {int(mtime)}"
+                    elif kind == "s":
+                        target, mtime = record[1:].rsplit(" ", 1)
+                        s = f"sym {path} -> {target} {int(mtime)}"
+                    else:
+                        s = f"{_line_types[kind]} {path}"
+                    outfile.write(s + "\n")
+                    continue
+
+                obj = record
                 if obj.is_reg:
                     s = " ".join(
                         (
@@ -155,3 +365,9 @@ class ContentsFile(contentsSet):
         finally:
             # if atomic, it forces the update to be wiped.
             del outfile
+
+
+# compact record type -> fs object type attribute
+_kinds = {"o": "is_reg", "d": "is_dir", "s": "is_sym", "v": "is_dev", "f": "is_fifo"}
+# compact record type -> CONTENTS line type
+_line_types = {"d": "dir", "v": "dev", "f": "fif"}
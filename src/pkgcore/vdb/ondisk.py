@@ -20,7 +20,9 @@ from ..log import logger
 from ..package import base as pkg_base
 from ..repository import errors, prototype, wrapper
 from . import repo_ops
+from .cache import metadata_cache
 from .contents import ContentsFile
+from .owners import owners_index
 
 
 class tree(prototype.tree):
@@ -53,6 +55,11 @@ class tree(prototype.tree):
         elif cache_location is None:
             cache_location = pjoin("/var/cache/edb/dep", location.lstrip("/"))
         self.cache_location = cache_location
+        self._metadata_cache = None
+        self._owners_index = None
+        if cache_location is not None:
+            self._metadata_cache = metadata_cache(cache_location, location)
+            self._owners_index = owners_index(cache_location, location)
         self._versions_tmp_cache = {}
         try:
             st = os.stat(self.location)
@@ -184,6 +191,8 @@ class tree(prototype.tree):
                 data = readfile(pjoin(path, "REPOSITORY"), True)
                 if data is None:
                     raise KeyError(key)
+        elif self._metadata_cache is not None and key in self._metadata_cache.keys:
+            data = self._metadata_cache.get(self._cache_key(path), path, key)
         else:
             data = readfile(pjoin(path, key), True)
             if data is None:
@@ -191,6 +200,20 @@ class tree(prototype.tree):
             data = data.rstrip("\n")
         return data
 
+    def _cache_key(self, path):
+        return os.path.relpath(path, self.location)
+
+    @property
+    def owners(self):
+        """File ownership index of the repo, None if it's unavailable.
+
+        See :obj:`pkgcore.vdb.owners.owners_index`.
+        """
+        index = self._owners_index
+        if index is None or not index.sync():
+            return None
+        return index
+
     def notify_remove_package(self, pkg):
         remove_it = len(self.packages[pkg.category]) == 1
         prototype.tree.notify_remove_package(self, pkg)
@@ -0,0 +1,202 @@
+"""
+vdb file ownership index
+
+Finding the packages owning a path otherwise requires loading and parsing the
+CONTENTS file of every installed package.  :obj:`owners_index` maintains a
+persistent path to owning package mapping in a sqlite database instead; it's
+updated incrementally by vdb merges and unmerges and reconciled against the
+CONTENTS file mtimes of installed packages before use, so changes made by
+other package managers are picked up as well.
+"""
+
+__all__ = ("owners_index",)
+
+import os
+import re
+import sqlite3
+from itertools import islice
+from os.path import join as pjoin
+
+from snakeoil.osutils import ensure_dirs, listdir_dirs
+
+from ..log import logger
+from .contents import ContentsFile
+
+_schema = """
+CREATE TABLE IF NOT EXISTS pkgs (
+    id INTEGER PRIMARY KEY,
+    cpv TEXT UNIQUE NOT NULL,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paths (
+    path TEXT NOT NULL,
+    pkg INTEGER NOT NULL REFERENCES pkgs(id),
+    PRIMARY KEY (path, pkg)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS paths_pkg ON paths(pkg);
+"""
+
+
+def _chunks(iterable, size=500):
+    iterable = iter(iterable)
+    while chunk := list(islice(iterable, size)):
+        yield chunk
+
+
+class owners_index:
+    """Persistent mapping of paths to the installed packages owning them.
+
+    :param location: directory the index database is stored in
+    :param vdb_location: location of the vdb being indexed
+    """
+
+    # bump when the database schema changes
+    version = 1
+    filename = "owners.db"
+
+    def __init__(self, location, vdb_location):
+        self.location = location
+        self.path = pjoin(location, self.filename)
+        self.vdb_location = vdb_location
+        self._db = None
+        self.synced = False
+
+    @property
+    def db(self):
+        if self._db is None:
+            ensure_dirs(self.location, mode=0o755)
+            db = sqlite3.connect(self.path)
+            try:
+                if db.execute("PRAGMA user_version").fetchone()[0] != self.version:
+                    db.executescript(
+                        "DROP TABLE IF EXISTS paths; DROP TABLE IF EXISTS pkgs;"
+                    )
+                    db.execute(f"PRAGMA user_version = {self.version}")
+                db.executescript(_schema)
+            except sqlite3.Error:
+                db.close()
+                raise
+            self._db = db
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _installed(self):
+        """Yield (cpv, CONTENTS path) for all installed packages."""
+        try:
+            categories = listdir_dirs(self.vdb_location)
+        except FileNotFoundError:
+            return
+        for category in categories:
+            if category.startswith("."):
+                continue
+            for pkg in listdir_dirs(pjoin(self.vdb_location, category)):
+                if pkg.startswith((".tmp.", "-MERGING-")) or pkg.endswith(".lockfile"):
+                    continue
+                cpv = f"{category}/{pkg}"
+                yield cpv, pjoin(self.vdb_location, cpv, "CONTENTS")
+
+    def sync(self, force=False):
+        """Reconcile the index with the installed packages.
+
+        Packages with CONTENTS files modified since they were indexed are
+        reindexed, and packages that aren't installed anymore are dropped.
+
+        :param force: reindex all packages
+        :return: True if the index is usable, False otherwise, e.g. due to
+            lacking permissions
+        """
+        if self.synced and not force:
+            return True
+        try:
+            db = self.db
+            with db:
+                if force:
+                    db.execute("DELETE FROM paths")
+                    db.execute("DELETE FROM pkgs")
+                indexed = dict(db.execute("SELECT cpv, mtime FROM pkgs"))
+                for cpv, contents in self._installed():
+                    try:
+                        mtime = os.stat(contents).st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+                    if indexed.pop(cpv, None) != mtime:
+                        self._add(
+                            cpv, (x.location for x in ContentsFile(contents)), mtime
+                        )
+                for cpv in indexed:
+                    self._remove(cpv)
+        except (OSError, sqlite3.Error) as e:
+            logger.debug("vdb owners index %r unusable: %s", self.path, e)
+            return False
+        self.synced = True
+        return True
+
+    def rebuild(self):
+        """Reindex all installed packages."""
+        return self.sync(force=True)
+
+    def _add(self, cpv, paths, mtime):
+        self._remove(cpv)
+        pkg_id = self.db.execute(
+            "INSERT INTO pkgs (cpv, mtime) VALUES (?, ?)", (cpv, mtime)
+        ).lastrowid
+        self.db.executemany(
+            "INSERT OR IGNORE INTO paths (path, pkg) VALUES (?, ?)",
+            ((path, pkg_id) for path in paths),
+        )
+
+    def _remove(self, cpv):
+        row = self.db.execute("SELECT id FROM pkgs WHERE cpv = ?", (cpv,)).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM paths WHERE pkg = ?", row)
+            self.db.execute("DELETE FROM pkgs WHERE id = ?", row)
+
+    def add(self, cpv, paths):
+        """Index the paths owned by a newly merged package."""
+        contents = pjoin(self.vdb_location, cpv, "CONTENTS")
+        try:
+            with self.db:
+                self._add(cpv, paths, os.stat(contents).st_mtime_ns)
+        except (OSError, sqlite3.Error) as e:
+            logger.debug("failed updating vdb owners index %r: %s", self.path, e)
+
+    def remove(self, cpv):
+        """Drop an unmerged package from the index."""
+        try:
+            with self.db:
+                self._remove(cpv)
+        except (OSError, sqlite3.Error) as e:
+            logger.debug("failed updating vdb owners index %r: %s", self.path, e)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM pkgs").fetchone()[0]
+
+    def owners(self, paths):
+        """Return a mapping of owned paths to the cpvs of the packages owning them."""
+        owned = {}
+        for chunk in _chunks(paths):
+            rows = self.db.execute(
+                "SELECT paths.path, pkgs.cpv FROM paths "
+                "JOIN pkgs ON paths.pkg = pkgs.id "
+                f"WHERE paths.path IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for path, cpv in rows:
+                owned.setdefault(path, set()).add(cpv)
+        return owned
+
+    def owners_re(self, regex):
+        """Return the cpvs of packages owning paths matching a regex."""
+        search = re.compile(regex).search
+        self.db.create_function(
+            "owns_re", 1, lambda path: search(path) is not None, deterministic=True
+        )
+        rows = self.db.execute(
+            "SELECT DISTINCT pkgs.cpv FROM pkgs "
+            "JOIN paths ON paths.pkg = pkgs.id WHERE owns_re(paths.path)"
+        )
+        return {cpv for (cpv,) in rows}
@@ -116,6 +116,16 @@ class install(repo_ops.install):
     def finalize_data(self):
         os.rename(self.tmp_write_path, self.install_path)
         update_mtime(self.repo.location)
+        cache = getattr(self.repo, "_metadata_cache", None)
+        if cache is not None:
+            cache.update(self.repo._cache_key(self.install_path), self.install_path)
+            cache.commit()
+        index = getattr(self.repo, "_owners_index", None)
+        if index is not None:
+            index.add(
+                self.repo._cache_key(self.install_path),
+                (x.location for x in self.new_pkg.contents),
+            )
         return True
 
 
@@ -133,6 +143,13 @@ class uninstall(repo_ops.uninstall):
         update_mtime(self.repo.location)
         shutil.rmtree(self.remove_path)
         update_mtime(self.repo.location)
+        cache = getattr(self.repo, "_metadata_cache", None)
+        if cache is not None:
+            cache.remove(self.repo._cache_key(self.remove_path))
+            cache.commit()
+        index = getattr(self.repo, "_owners_index", None)
+        if index is not None:
+            index.remove(self.repo._cache_key(self.remove_path))
         return True
 
 
@@ -0,0 +1,118 @@
+import os
+import tarfile
+
+import pytest
+
+from pkgcore.binpkg import gpkg
+from pkgcore.binpkg.repository import tree
+from pkgcore.ebuild.atom import atom
+from pkgcore.fs import livefs
+from pkgcore.repository.errors import InitializationError
+
+
+@pytest.fixture
+def image(tmp_path):
+    img = tmp_path / "img"
+    (img / "usr/bin").mkdir(parents=True)
+    (img / "etc").mkdir()
+    (img / "usr/bin/a").write_text("binary")
+    os.link(img / "usr/bin/a", img / "usr/bin/b")
+    (img / "usr/bin/c").symlink_to("a")
+    (img / "etc/conf").write_text("conf")
+    return livefs.scan(str(img), offset=str(img))
+
+
+metadata = {"EAPI": "8", "SLOT": "0", "environment.bz2": b"\x00env"}
+
+
+def verify(path, cset):
+    pkg = gpkg.Gpkg(str(path))
+    assert pkg.metadata == metadata
+    contents = pkg.contents()
+    assert sorted(contents) == sorted(cset)
+    files = {x.location: x for x in contents.iterfiles()}
+    assert files["/usr/bin/a"].data.bytes_fileobj().read() == b"binary"
+    assert files["/etc/conf"].data.bytes_fileobj().read() == b"conf"
+    assert files["/usr/bin/a"].inode == files["/usr/bin/b"].inode
+    assert contents["/usr/bin/c"].target == "a"
+
+
+@pytest.mark.parametrize("compressor", sorted(gpkg.compressors))
+def test_roundtrip(tmp_path, image, compressor):
+    if not gpkg.compressors[compressor].available:
+        pytest.skip(f"{compressor} support unavailable")
+    path = tmp_path / "foo-1.gpkg.tar"
+    gpkg.write_gpkg(str(path), "foo-1", metadata, image, compressor=compressor)
+    with tarfile.open(path) as f:
+        ext = gpkg.compressors[compressor].extension
+        assert f.getnames() == [
+            "foo-1/gpkg-1",
+            f"foo-1/metadata.tar{ext}",
+            f"foo-1/image.tar{ext}",
+        ]
+    verify(path, image)
+
+
+@pytest.mark.parametrize(
+    ("compressor", "module"),
+    (("xz", "lzma"), ("bzip2", "bz2"), ("gzip", "gzip")),
+)
+def test_module_fallback(tmp_path, monkeypatch, image, compressor, module):
+    orig = gpkg.compressors[compressor]
+    fallback = gpkg._Compressor(
+        compressor, orig.extension, (("nonexistent", (), ()),), module, orig.level_kwarg
+    )
+    assert fallback.binary is None
+    monkeypatch.setitem(gpkg.compressors, compressor, fallback)
+    path = tmp_path / "foo-1.gpkg.tar"
+    gpkg.write_gpkg(str(path), "foo-1", metadata, image, compressor=compressor, level=1)
+    verify(path, image)
+
+
+def test_malformed(tmp_path, image):
+    path = tmp_path / "foo-1.gpkg.tar"
+    path.write_text("garbage")
+    with pytest.raises(gpkg.MalformedGpkg):
+        _ = gpkg.Gpkg(str(path)).metadata
+
+    with tarfile.open(path, "w") as f:
+        f.add(__file__, "foo-1/metadata.tar")
+    with pytest.raises(gpkg.MalformedGpkg, match="format marker"):
+        _ = gpkg.Gpkg(str(path)).metadata
+
+
+class TestRepository:
+    def test_formats(self, tmp_path, image):
+        (repo_dir := tmp_path / "repo").mkdir()
+        (repo_dir / "cat").mkdir()
+        gpkg.write_gpkg(
+            str(repo_dir / "cat/foo-1.gpkg.tar"), "foo-1", metadata, image, "gzip"
+        )
+        gpkg.write_gpkg(
+            str(repo_dir / "cat/bar-1.gpkg.tar"), "bar-1", metadata, image, "gzip"
+        )
+        # binpkgs using the default format are preferred
+        (repo_dir / "cat/bar-1.tbz2").touch()
+
+        repo = tree(str(repo_dir), binpkg_format="xpak")
+        assert sorted(x.cpvstr for x in repo) == ["cat/bar-1", "cat/foo-1"]
+        pkg = repo.match(atom("=cat/foo-1"))[0]
+        assert repo._get_path(pkg) == str(repo_dir / "cat/foo-1.gpkg.tar")
+        assert pkg.eapi._magic == "8"
+        assert sorted(x.location for x in pkg.contents.iterfiles()) == [
+            "/etc/conf",
+            "/usr/bin/a",
+            "/usr/bin/b",
+        ]
+        bar = repo.match(atom("=cat/bar-1"))[0]
+        assert repo._get_path(bar) == str(repo_dir / "cat/bar-1.tbz2")
+
+        repo = tree(str(repo_dir), binpkg_format="gpkg")
+        bar = repo.match(atom("=cat/bar-1"))[0]
+        assert repo._get_path(bar) == str(repo_dir / "cat/bar-1.gpkg.tar")
+
+    def test_invalid_config(self, tmp_path):
+        with pytest.raises(InitializationError, match="binpkg format"):
+            tree(str(tmp_path), binpkg_format="foo")
+        with pytest.raises(InitializationError, match="binpkg compression"):
+            tree(str(tmp_path), binpkg_compression="foo")
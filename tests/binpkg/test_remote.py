@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pkgcore.binpkg import remote
+
+
+def entry(**kwds):
+    d = {
+        "SLOT": "0",
+        "EAPI": "8",
+        "USE": "",
+        "CHOST": "x86_64-pc-linux-gnu",
+        "_chf_": SimpleNamespace(mtime=1),
+    }
+    d.update(kwds)
+    return d
+
+
+@pytest.fixture(params=(remote.PackagesCacheV0, remote.PackagesCacheV1))
+def cache_kls(request):
+    return request.param
+
+
+class TestPackagesCache:
+    def populate(self, cache_kls, path, cpvs):
+        cache = cache_kls(str(path))
+        for cpv in cpvs:
+            cache[cpv] = entry(DESCRIPTION=f"{cpv} desc")
+        cache.commit()
+        return cache_kls(str(path))
+
+    def test_lazy_index(self, cache_kls, tmp_path):
+        path = tmp_path / "Packages"
+        cpvs = [f"cat/pkg{x}-1" for x in range(20)]
+        cache = self.populate(cache_kls, path, cpvs)
+        assert isinstance(cache.data, remote.PackagesIndex)
+        assert sorted(cache.data) == sorted(cpvs)
+        # nothing is parsed until accessed
+        assert not cache.data.entries
+        assert cache["cat/pkg3-1"]["DESCRIPTION"] == "cat/pkg3-1 desc"
+        assert cache["cat/pkg3-1"]["CHOST"] == "x86_64-pc-linux-gnu"
+        assert list(cache.data.entries) == ["cat/pkg3-1"]
+        assert "cat/pkg99-1" not in cache
+        with pytest.raises(KeyError):
+            cache["cat/pkg99-1"]
+
+    def test_no_mmap(self, cache_kls, tmp_path, monkeypatch):
+        path = tmp_path / "Packages"
+        self.populate(cache_kls, path, ["cat/pkg-1"])
+        monkeypatch.setattr(cache_kls, "use_mmap", False)
+        cache = cache_kls(str(path))
+        assert isinstance(cache.data.buf, bytes)
+        assert cache["cat/pkg-1"]["DESCRIPTION"] == "cat/pkg-1 desc"
+
+    def test_category_pf(self, tmp_path):
+        path = tmp_path / "Packages"
+        path.write_text(
+            "PACKAGES: 1\nVERSION: 0\n\nCATEGORY: cat\nPF: pkg-1\nSLOT: 1\n\n"
+        )
+        cache = remote.PackagesCacheV0(str(path))
+        assert list(cache.data) == ["cat/pkg-1"]
+        assert cache["cat/pkg-1"]["SLOT"] == "1"
+        assert "CATEGORY" not in cache["cat/pkg-1"]
+
+    def test_append(self, cache_kls, tmp_path):
+        path = tmp_path / "Packages"
+        cache = self.populate(cache_kls, path, ["cat/a-1", "cat/b-1"])
+        data = path.read_bytes()
+        cache["cat/c-1"] = entry(DESCRIPTION="appended")
+        cache.commit()
+        # existing entries are left in place
+        new_data = path.read_bytes()
+        start = data.index(b"\n\n")
+        assert new_data[start : len(data)] == data[start:]
+        assert new_data[len(data) :].startswith(b"CPV:")
+
+        cache = cache_kls(str(path))
+        assert sorted(cache.data) == ["cat/a-1", "cat/b-1", "cat/c-1"]
+        assert cache.preamble["PACKAGES"] == "3"
+        assert cache["cat/c-1"]["DESCRIPTION"] == "appended"
+        assert cache["cat/c-1"]["CHOST"] == "x86_64-pc-linux-gnu"
+
+    def test_compact(self, cache_kls, tmp_path):
+        path = tmp_path / "Packages"
+        cache = self.populate(cache_kls, path, ["cat/a-1", "cat/b-1", "cat/c-1"])
+        cache["cat/b-1"] = entry(DESCRIPTION="replaced", SLOT="2")
+        del cache["cat/c-1"]
+        cache.commit()
+
+        cache = cache_kls(str(path))
+        assert sorted(cache.data) == ["cat/a-1", "cat/b-1"]
+        assert cache.preamble["PACKAGES"] == "2"
+        assert cache["cat/a-1"]["DESCRIPTION"] == "cat/a-1 desc"
+        assert cache["cat/b-1"]["DESCRIPTION"] == "replaced"
+        assert cache["cat/b-1"]["SLOT"] == "2"
+
+    def test_modified_file(self, cache_kls, tmp_path):
+        path = tmp_path / "Packages"
+        cache = self.populate(cache_kls, path, ["cat/a-1", "cat/b-1"])
+        assert cache["cat/a-1"]
+        # changes by other writers force a full rewrite of the loaded data
+        other = cache_kls(str(path))
+        other["cat/z-1"] = entry()
+        other.commit()
+        cache["cat/c-1"] = entry()
+        cache.commit()
+
+        cache = cache_kls(str(path))
+        assert sorted(cache.data) == ["cat/a-1", "cat/b-1", "cat/c-1"]
+        assert cache["cat/b-1"]["DESCRIPTION"] == "cat/b-1 desc"
+
+    def test_repeated_commits(self, cache_kls, tmp_path):
+        path = tmp_path / "Packages"
+        cache = self.populate(cache_kls, path, ["cat/a-1"])
+        for x in range(12):
+            cache[f"cat/b{x}-1"] = entry()
+            cache.commit()
+        cache["cat/b3-1"] = entry(DESCRIPTION="replaced")
+        cache.commit()
+        cache["cat/d-1"] = entry()
+        cache.commit()
+        # appended entries are replaced in place
+        cache["cat/d-1"] = entry(DESCRIPTION="replaced")
+        cache.commit()
+
+        cpvs = [
+            line.split(":", 1)[1].strip()
+            for line in path.read_text().splitlines()
+            if line.startswith("CPV:")
+        ]
+        assert len(cpvs) == len(set(cpvs)) == 14
+        cache = cache_kls(str(path))
+        assert len(cache.data) == 14
+        assert cache.preamble["PACKAGES"] == "14"
+        assert cache["cat/b3-1"]["DESCRIPTION"] == "replaced"
+        assert cache["cat/d-1"]["DESCRIPTION"] == "replaced"
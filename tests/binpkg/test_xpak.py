@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from pkgcore.binpkg import remote
+from pkgcore.binpkg.repository import tree
+from pkgcore.binpkg.xpak import MalformedXpak, Xpak
+
+metadata = {
+    "EAPI": "8",
+    "SLOT": "0",
+    "repo": "gentoo",
+    "environment.bz2": b"\x00env",
+}
+
+
+def write_binpkg(path, data=metadata):
+    path.write_bytes(b"compressed image")
+    Xpak.write_xpak(str(path), data)
+
+
+class TestReadXpak:
+    def test_read(self, tmp_path):
+        path = tmp_path / "foo-1.tbz2"
+        write_binpkg(path)
+        data = Xpak.read_xpak(str(path))
+        assert data == dict(Xpak(str(path)).items())
+        assert data == {
+            "EAPI": "8",
+            "SLOT": "0",
+            "REPO": "gentoo",
+            "environment.bz2": b"\x00env",
+        }
+
+    def test_empty(self, tmp_path):
+        path = tmp_path / "foo-1.tbz2"
+        write_binpkg(path, {})
+        assert Xpak.read_xpak(str(path)) == {}
+
+    @pytest.mark.parametrize(
+        "data",
+        (b"", b"short", b"x" * 64, b"XPAKSTOP\xff\xff\xff\xffSTOP"),
+        ids=("empty", "short", "no trailer", "oversized"),
+    )
+    def test_malformed(self, tmp_path, data):
+        path = tmp_path / "foo-1.tbz2"
+        path.write_bytes(data)
+        with pytest.raises(MalformedXpak):
+            Xpak.read_xpak(str(path))
+
+    def test_truncated_data(self, tmp_path):
+        path = tmp_path / "foo-1.tbz2"
+        write_binpkg(path)
+        data = bytearray(path.read_bytes())
+        # corrupt the length of the last value
+        index = data.index(b"environment.bz2") + len("environment.bz2") + 4
+        data[index : index + 4] = b"\x00\x00\xff\xff"
+        path.write_bytes(data)
+        with pytest.raises(MalformedXpak):
+            Xpak.read_xpak(str(path))
+
+    def test_value_past_data(self, tmp_path):
+        path = tmp_path / "foo-1.tbz2"
+        write_binpkg(path)
+        data = bytearray(path.read_bytes())
+        # extend the last value into the trailing XPAKSTOP marker
+        index = data.index(b"environment.bz2") + len("environment.bz2") + 4
+        value_len = int.from_bytes(data[index : index + 4], "big")
+        data[index : index + 4] = (value_len + 4).to_bytes(4, "big")
+        path.write_bytes(data)
+        with pytest.raises(MalformedXpak, match="exceeds the data segment"):
+            Xpak.read_xpak(str(path))
+
+
+class TestRegenCache:
+    @pytest.fixture
+    def repo_dir(self, tmp_path):
+        (repo_dir := tmp_path / "repo").mkdir()
+        (repo_dir / "cat").mkdir()
+        for pkg in ("foo-1", "foo-2", "bar-1"):
+            write_binpkg(repo_dir / f"cat/{pkg}.tbz2")
+        return repo_dir
+
+    def test_regen(self, repo_dir, monkeypatch):
+        repo = tree(str(repo_dir))
+        assert repo.regen_cache(jobs=2) == 0
+        assert sorted(repo.cache.data) == ["cat/bar-1", "cat/foo-1", "cat/foo-2"]
+        assert repo.cache["cat/foo-1"]["REPO"] == "gentoo"
+
+        cache = remote.PackagesCacheV0(str(repo_dir / "Packages"))
+        assert sorted(cache.data) == ["cat/bar-1", "cat/foo-1", "cat/foo-2"]
+        assert cache["cat/foo-2"]["SLOT"] == "0"
+        assert cache["cat/foo-2"]["EAPI"] == "8"
+
+        # up to date entries aren't regenerated
+        def read_xpak(path):
+            assert path == str(repo_dir / "cat/foo-2.tbz2")
+            return reader(path)
+
+        reader = Xpak.read_xpak
+        monkeypatch.setattr(Xpak, "read_xpak", read_xpak)
+        write_binpkg(repo_dir / "cat/foo-2.tbz2", {**metadata, "SLOT": "2"})
+        os.utime(repo_dir / "cat/foo-2.tbz2", (0, 0))
+        (repo_dir / "cat/bar-1.tbz2").unlink()
+        repo = tree(str(repo_dir))
+        assert repo.regen_cache() == 0
+        assert sorted(repo.cache.data) == ["cat/foo-1", "cat/foo-2"]
+        assert repo.cache["cat/foo-2"]["SLOT"] == "2"
+
+    def test_malformed(self, repo_dir):
+        (repo_dir / "cat/bad-1.tbz2").write_bytes(b"junk")
+        repo = tree(str(repo_dir))
+        assert repo.regen_cache() == 1
+        assert "cat/bad-1" not in repo.cache
+        assert "cat/foo-1" in repo.cache
+
+    def test_operations(self, repo_dir):
+        repo = tree(str(repo_dir))
+        assert repo.operations.supports("regen_cache")
+        assert repo.operations.regen_cache(threads=2) == 0
+        assert os.path.exists(repo_dir / "Packages")
+        assert len(remote.PackagesCacheV0(str(repo_dir / "Packages")).data) == 3
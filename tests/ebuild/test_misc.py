@@ -151,3 +151,51 @@ class TestChunkedDataInterning:
 )
 def test_get_relative_dosym_target(expected, source, target):
     assert expected == misc.get_relative_dosym_target(source, target)
+
+
+class TestRunSanityChecks:
+    class FakeOps:
+        def __init__(self, pkg):
+            self.pkg = pkg
+
+        def supports(self, name):
+            return name == "sanity_check"
+
+        def sanity_check(self):
+            if int(self.pkg.split("-")[-1]) % 2:
+                return [f"{self.pkg} failed"]
+            return []
+
+    class FakeDomain:
+        def get_pkg_operations(self, pkg):
+            return TestRunSanityChecks.FakeOps(pkg)
+
+    @pytest.mark.parametrize("threads", (None, 1, 4))
+    def test_failures(self, threads):
+        pkgs = [f"cat/pkg-{x}" for x in range(50)]
+        failures = misc.run_sanity_checks(
+            iter(pkgs), self.FakeDomain(), threads=threads
+        )
+        assert list(failures) == pkgs[1::2]
+        for pkg, errors in failures.items():
+            assert errors == [f"{pkg} failed"]
+
+    def test_no_failures(self):
+        assert not misc.run_sanity_checks([], self.FakeDomain())
+        assert not misc.run_sanity_checks(["cat/pkg-0"], self.FakeDomain(), threads=4)
+
+    @pytest.mark.parametrize("threads", (1, 4))
+    def test_check_exceptions(self, threads):
+        class BrokenOps(self.FakeOps):
+            def sanity_check(self):
+                if self.pkg == "cat/pkg-7":
+                    raise ValueError("broken check")
+                return super().sanity_check()
+
+        class BrokenDomain:
+            def get_pkg_operations(self, pkg):
+                return BrokenOps(pkg)
+
+        pkgs = [f"cat/pkg-{x}" for x in range(20)]
+        with pytest.raises(ValueError, match="broken check"):
+            misc.run_sanity_checks(pkgs, BrokenDomain(), threads=threads)
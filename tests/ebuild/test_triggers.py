@@ -1,6 +1,6 @@
 from pkgcore.ebuild import triggers
 from pkgcore.fs.contents import contentsSet
-from pkgcore.fs.fs import fsSymlink
+from pkgcore.fs.fs import fsFile, fsSymlink
 
 
 class fake_format_op:
@@ -42,3 +42,29 @@ class TestFixImageSymlinks:
         assert targets[f"{self.image}/usr/lib/foo.so"] == "/usr/lib/foo.so.1"
         # symlinks not pointing into $D are left untouched
         assert targets[f"{self.image}/usr/lib/bar.so"] == "/usr/lib/bar.so.1"
+
+
+class TestConfigProtectUninstall:
+    def mk_file(self, location, md5):
+        return fsFile(location, chksums={"md5": md5}, strict=False)
+
+    def test_partition(self, tmp_path):
+        recorded = [
+            self.mk_file("/etc/modified", 1),
+            self.mk_file("/etc/unmodified", 1),
+            self.mk_file("/usr/lib/keep", 1),
+            self.mk_file("/usr/lib/lib", 1),
+        ]
+        existing = contentsSet(recorded[1:])
+        # the config file was modified after it was merged
+        existing.add(self.mk_file("/etc/modified", 2))
+        uninstall = contentsSet(recorded)
+        old = contentsSet(recorded)
+
+        engine = fake_engine()
+        engine.offset = str(tmp_path)
+        trig = triggers.ConfigProtectUninstall(["*/keep"])
+        trig.trigger(engine, existing, uninstall, old)
+
+        assert sorted(uninstall.iterfiles()) == recorded[1:4:2]
+        assert sorted(old.iterfiles()) == [*recorded[:2], recorded[3]]
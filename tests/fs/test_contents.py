@@ -296,6 +296,49 @@ class TestContentsSet:
             )
         }
 
+    def test_iter_child_nodes(self):
+        cs = contents.contentsSet(
+            [
+                mk_dir("/usr"),
+                mk_dir("/usr/bin"),
+                mk_file("/usr/bin/foo"),
+                mk_file("/usr/bin2"),
+                mk_file("/usr/lib/a/b"),
+                mk_link("/lib", "usr/lib"),
+            ]
+        )
+
+        def child_nodes(start):
+            return {x.location for x in cs.child_nodes(start)}
+
+        assert child_nodes("/usr/bin") == {"/usr/bin/foo"}
+        assert child_nodes("/usr/bin/") == {"/usr/bin/foo"}
+        assert child_nodes("/usr") == {
+            "/usr/bin",
+            "/usr/bin/foo",
+            "/usr/bin2",
+            "/usr/lib/a/b",
+        }
+        assert child_nodes("/usr/lib") == {"/usr/lib/a/b"}
+        assert child_nodes(mk_dir("/usr/lib")) == {"/usr/lib/a/b"}
+        assert child_nodes(mk_link("/foo", "/usr/bin")) == {"/usr/bin/foo"}
+        assert child_nodes("/nonexistent") == set()
+        assert child_nodes("/usr/bin/foo") == set()
+
+        # the index is kept up to date with modifications
+        cs.add(mk_file("/usr/bin/bar"))
+        cs.update([mk_file("/usr/bin/sub/baz")])
+        cs.remove("/usr/bin/foo")
+        cs.discard(mk_file("/usr/lib/a/b"))
+        assert child_nodes("/usr/bin") == {"/usr/bin/bar", "/usr/bin/sub/baz"}
+        assert child_nodes("/usr/lib") == set()
+        cs.remove("/usr/bin")
+        assert child_nodes("/usr/bin") == {"/usr/bin/bar", "/usr/bin/sub/baz"}
+        cs.clear()
+        assert child_nodes("/usr") == set()
+        cs.add(mk_file("/usr/foo"))
+        assert child_nodes("/usr") == {"/usr/foo"}
+
     def test_map_directory_structure(self):
         old = contents.contentsSet([mk_dir("/dir"), mk_link("/sym", "dir")])
         new = contents.contentsSet([mk_file("/sym/a"), mk_dir("/sym")])
@@ -1,3 +1,4 @@
+import errno
 import os
 from pathlib import Path
 
@@ -217,6 +218,81 @@ class TestMergeContents(ContentsMixin):
         assert ops.merge_contents(cset)
         assert fs.issym(livefs.gen_obj(str(path)))
 
+    @pytest.mark.parametrize("jobs", (1, 4))
+    def test_file_contents(self, tmp_path, jobs):
+        (src := tmp_path / "src").mkdir()
+        for i in range(8):
+            (src / f"dir{i}").mkdir()
+            for j in range(4):
+                (src / f"dir{i}" / f"file{j}").write_text(f"{i}-{j}\n" * 100)
+        cset = livefs.scan(str(src), offset=str(src))
+        (dest := tmp_path / "dest").mkdir()
+        assert ops.merge_contents(cset, offset=str(dest), jobs=jobs)
+        assert livefs.scan(str(src), offset=str(src)) == livefs.scan(
+            str(dest), offset=str(dest)
+        )
+        for i in range(8):
+            for j in range(4):
+                assert (dest / f"dir{i}" / f"file{j}").read_text() == f"{i}-{j}\n" * 100
+
+    def test_file_overwrite(self, tmp_path):
+        (src := tmp_path / "src").write_text("new")
+        (path := tmp_path / "file").write_text("old data")
+        f = fs.fsFile(
+            str(path),
+            data=local_source(str(src)),
+            mode=0o640,
+            mtime=12345,
+            uid=os.getuid(),
+            gid=os.getgid(),
+            dev=None,
+            inode=None,
+        )
+        assert ops.merge_contents(contents.contentsSet([f]))
+        assert path.read_text() == "new"
+        verify(f, {"mode": 0o640, "mtime": 12345})
+        assert sorted(os.listdir(tmp_path)) == ["file", "src"]
+
+    def test_file_over_dir(self, tmp_path):
+        (src := tmp_path / "src").write_text("data")
+        (path := tmp_path / "dir").mkdir()
+        f = fs.fsFile(str(path), data=local_source(str(src)), mtime=0, strict=False)
+        with pytest.raises(ops.CannotOverwrite):
+            ops.merge_contents(contents.contentsSet([f]))
+        assert path.is_dir()
+
+    def test_hardlinks(self, tmp_path):
+        (src := tmp_path / "src").mkdir()
+        (src / "file").write_text("data")
+        (src / "sub").mkdir()
+        os.link(src / "file", src / "sub" / "link")
+        cset = livefs.scan(str(src), offset=str(src))
+        (dest := tmp_path / "dest").mkdir()
+        assert ops.merge_contents(cset, offset=str(dest), jobs=2)
+        assert os.path.samefile(dest / "file", dest / "sub" / "link")
+        assert not os.path.samefile(src / "file", dest / "file")
+
+
+def test_copy_data(tmp_path, monkeypatch):
+    (src := tmp_path / "src").write_bytes(os.urandom(1 << 16) * 20)
+
+    def copy(name):
+        with open(src, "rb") as f1, open(tmp_path / name, "wb") as f2:
+            ops.copy_data(f1.fileno(), f2.fileno())
+        assert (tmp_path / name).read_bytes() == src.read_bytes()
+
+    copy("default")
+
+    # force fallbacks by making the preferred methods unsupported
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, "unsupported")
+
+    monkeypatch.setattr(ops.fcntl, "ioctl", unsupported)
+    monkeypatch.setattr(ops, "_copy_file_range", unsupported)
+    copy("sendfile")
+    monkeypatch.setattr(ops, "_sendfile", unsupported)
+    copy("read_write")
+
 
 class TestUnmergeContents(ContentsMixin):
     @pytest.fixture
@@ -254,3 +330,16 @@ class TestUnmergeContents(ContentsMixin):
         (fp := Path(img) / dirs[0] / "linger").touch()
         assert ops.unmerge_contents(cset, offset=img)
         assert fp.exists()
+
+    @pytest.mark.parametrize("jobs", (1, 4))
+    def test_jobs(self, tmp_path, jobs):
+        entries = {f"dir{i}": ["dir"] for i in range(8)}
+        entries.update({f"dir{i}/file{j}": ["reg"] for i in range(8) for j in range(4)})
+        img = self.generate_tree(tmp_path / "img", entries)
+        cset = livefs.scan(img, offset=img)
+        (Path(img) / "dir0" / "linger").touch()
+        s = set(contents.offset_rewriter(img, cset))
+        assert ops.unmerge_contents(cset, offset=img, callback=s.remove, jobs=jobs)
+        assert s == {fs.fsDir(f"{img}/dir0", strict=False)}
+        assert os.listdir(img) == ["dir0"]
+        assert os.listdir(Path(img) / "dir0") == ["linger"]
@@ -0,0 +1,146 @@
+from io import BytesIO
+
+from pkgcore.fs import tar
+from pkgcore.fs._tar import tarfile
+
+
+def make_archive(members):
+    """Create a tarfile from (name, type, linkname or data) tuples."""
+    data = BytesIO()
+    with tarfile.TarFile(fileobj=data, mode="w") as archive:
+        for name, kind, arg in members:
+            info = tarfile.TarInfo(name)
+            info.mode = 0o755
+            fileobj = None
+            if kind == "file":
+                info.size = len(arg)
+                fileobj = BytesIO(arg)
+            elif kind == "dir":
+                info.type = tarfile.DIRTYPE
+            elif kind == "sym":
+                info.type = tarfile.SYMTYPE
+                info.linkname = arg
+            elif kind == "link":
+                info.type = tarfile.LNKTYPE
+                info.linkname = arg
+            archive.addfile(info, fileobj)
+    data.seek(0)
+    return tarfile.TarFile(fileobj=data, mode="r")
+
+
+def locations(cset):
+    return [x.location for x in cset]
+
+
+class TestConvertArchive:
+    def test_ordering(self):
+        cset = tar.convert_archive(
+            make_archive(
+                [
+                    ("./usr/bin/b", "file", b"b"),
+                    ("./usr/bin/c", "sym", "b"),
+                    ("./usr", "dir", None),
+                    ("./usr/bin/a", "file", b"a"),
+                    ("./etc", "dir", None),
+                ]
+            )
+        )
+        # directories first, other entries, then files in archive order
+        assert locations(cset) == [
+            "/etc",
+            "/usr",
+            "/usr/bin",
+            "/usr/bin/c",
+            "/usr/bin/b",
+            "/usr/bin/a",
+        ]
+        files = {x.location: x for x in cset.iterfiles()}
+        assert files["/usr/bin/a"].data.bytes_fileobj().read() == b"a"
+        assert files["/usr/bin/b"].data.bytes_fileobj().read() == b"b"
+
+    def test_symlinked_dirs(self):
+        cset = tar.convert_archive(
+            make_archive(
+                [
+                    ("./lib/foo", "file", b"foo"),
+                    ("./lib", "sym", "lib64"),
+                    ("./lib64/bar", "file", b"bar"),
+                    ("./usr/lib", "sym", "/lib64"),
+                    ("./usr/lib/baz", "file", b"baz"),
+                ]
+            )
+        )
+        assert sorted(locations(cset)) == [
+            "/lib",
+            "/lib64",
+            "/lib64/bar",
+            "/lib64/baz",
+            "/lib64/foo",
+            "/usr",
+            "/usr/lib",
+        ]
+        assert cset["/lib64/foo"].data.bytes_fileobj().read() == b"foo"
+
+    def test_nested_symlinked_dirs(self):
+        cset = tar.convert_archive(
+            make_archive(
+                [
+                    ("./a", "sym", "b"),
+                    ("./a/c", "sym", "d"),
+                    ("./a/c/e", "sym", "f"),
+                    ("./a/c/e/file", "file", b""),
+                    ("./a/c/file", "file", b""),
+                ]
+            )
+        )
+        assert sorted(locations(cset.iterfiles())) == ["/b/d/f/file", "/b/d/file"]
+        assert sorted(locations(cset.iterlinks())) == ["/a", "/b/c", "/b/d/e"]
+
+    def test_symlink_cycle(self):
+        cset = tar.convert_archive(
+            make_archive(
+                [
+                    ("./a", "sym", "b"),
+                    ("./b", "sym", "a"),
+                    ("./a/file", "file", b""),
+                ]
+            )
+        )
+        assert len(list(cset.iterfiles())) == 1
+
+    def test_overridden_symlink(self):
+        cset = tar.convert_archive(
+            make_archive(
+                [
+                    ("./lib", "sym", "lib64"),
+                    ("./lib", "dir", None),
+                    ("./lib/foo", "file", b""),
+                ]
+            )
+        )
+        assert locations(cset) == ["/lib", "/lib/foo"]
+
+    def test_hardlinks(self):
+        cset = tar.convert_archive(
+            make_archive(
+                [
+                    ("./a", "file", b"data"),
+                    ("./b", "link", "./a"),
+                ]
+            )
+        )
+        assert cset["/a"].inode == cset["/b"].inode
+        assert cset["/b"].data.bytes_fileobj().read() == b"data"
+
+    def test_prefix(self):
+        cset = tar.convert_archive(
+            make_archive(
+                [
+                    ("image", "dir", None),
+                    ("image/bin/a", "file", b""),
+                    ("image/bin/b", "link", "image/bin/a"),
+                ]
+            ),
+            prefix="image",
+        )
+        assert locations(cset) == ["/bin", "/bin/a", "/bin/b"]
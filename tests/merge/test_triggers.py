@@ -12,7 +12,7 @@ from snakeoil.contexts import os_environ
 from snakeoil.currying import post_curry
 from snakeoil.osutils import ensure_dirs
 
-from pkgcore.fs import fs
+from pkgcore.fs import fs, livefs
 from pkgcore.fs.contents import contentsSet
 from pkgcore.fs.livefs import gen_obj
 from pkgcore.merge import const, triggers
@@ -620,3 +620,41 @@ class TestPruneFiles:
         assert "/sporks-suck" not in " ".join(info)
         assert "/foons-rule" in " ".join(info)
         assert "/mango" in " ".join(info)
+
+
+class TestGenerateChksums:
+    kls = triggers.GenerateChksums
+
+    def test_metadata(self):
+        assert self.kls.required_csets == ("install",)
+        assert self.kls._hooks == ("pre_merge",)
+        assert self.kls._engine_types == triggers.INSTALLING_MODES
+        assert self.kls in triggers.default_plugins_triggers()
+
+    @pytest.mark.parametrize("parallelism", (1, 4))
+    def test_trigger(self, tmp_path, parallelism):
+        for i in range(10):
+            (tmp_path / str(i)).write_text(str(i))
+        cset = livefs.scan(str(tmp_path), offset=str(tmp_path))
+        expected = {
+            str(i): gen_obj(str(tmp_path / str(i))).chksums["md5"] for i in range(1, 10)
+        }
+        # a file removed before the trigger runs is skipped
+        (tmp_path / "0").unlink()
+
+        debug = []
+        engine = fake_engine(
+            mode=const.INSTALL_MODE,
+            observer=make_fake_reporter(debug=debug.append),
+            parallelism=parallelism,
+        )
+        with os_environ("PKGCORE_TRIGGER_PARALLELISM"):
+            self.kls()(engine, {"install": cset})
+        assert len(debug) == 1 and "/0" in debug[0]
+
+        # chksums were cached on the fs objects
+        for i in range(1, 10):
+            (tmp_path / str(i)).unlink()
+        assert {
+            x.basename: x.chksums["md5"] for x in cset.iterfiles() if x.basename != "0"
+        } == expected
@@ -0,0 +1,77 @@
+from pkgcore.ebuild.atom import atom
+from pkgcore.repository import misc
+from pkgcore.repository.util import SimpleTree
+
+
+class TestCachingRepo:
+    def setup_method(self):
+        self.raw_repo = SimpleTree(
+            {
+                "dev-util": {"diffball": ["1.0", "0.7"], "bsdiff": ["0.4.1", "0.4.2"]},
+                "dev-lib": {"fake": ["1.0", "1.0-r1", "2"]},
+            }
+        )
+        self.atoms = [
+            atom("dev-util/diffball"),
+            atom("dev-util/bsdiff"),
+            atom("dev-lib/fake"),
+        ]
+
+    def test_unbounded(self):
+        repo = misc.caching_repo(self.raw_repo, sorted)
+        assert not repo.bounded
+        first = [repo.match(a) for a in self.atoms]
+        assert [repo.match(a) for a in self.atoms] == first
+        assert all(x is y for x, y in zip(first, (repo.match(a) for a in self.atoms)))
+        assert (repo.hits, repo.misses, repo.evictions) == (6, 3, 0)
+        assert [x.cpvstr for x in repo.itermatch(self.atoms[0])] == [
+            "dev-util/diffball-0.7",
+            "dev-util/diffball-1.0",
+        ]
+        repo.clear()
+        repo.match(self.atoms[0])
+        assert repo.misses == 4
+
+    def test_max_entries(self):
+        repo = misc.caching_repo(self.raw_repo, sorted, max_entries=2)
+        assert repo.bounded
+        for a in self.atoms:
+            repo.match(a)
+        assert repo.evictions == 1
+        # least recently used entry was evicted
+        repo.match(self.atoms[1])
+        assert (repo.hits, repo.misses) == (1, 3)
+        repo.match(self.atoms[0])
+        assert (repo.hits, repo.misses, repo.evictions) == (1, 4, 2)
+        # dev-lib/fake was the least recently used
+        repo.match(self.atoms[1])
+        assert repo.hits == 2
+
+    def test_max_weight(self):
+        repo = misc.caching_repo(self.raw_repo, sorted, max_weight=3)
+        for a in self.atoms:
+            list(repo.match(a))
+        repo.match(self.atoms[2])
+        assert repo.weight == 3
+        # diffball and bsdiff were evicted to make room for fake's 3 pkgs
+        assert repo.evictions == 2
+        assert repo.hits == 1
+
+    def test_pinning(self):
+        repo = misc.caching_repo(self.raw_repo, sorted, max_entries=1)
+        repo.pin(self.atoms[0])
+        repo.pin(self.atoms[0])
+        for a in self.atoms:
+            repo.match(a)
+        repo.match(self.atoms[0])
+        assert repo.hits == 1
+        repo.unpin(self.atoms[0])
+        repo.match(self.atoms[1])
+        assert repo.hits == 1
+        repo.match(self.atoms[0])
+        assert repo.hits == 2
+        repo.unpin(self.atoms[0])
+        repo.match(self.atoms[2])
+        assert repo.evictions == 4
+        repo.match(self.atoms[0])
+        assert repo.hits == 2
@@ -0,0 +1,106 @@
+import random
+from itertools import combinations, product
+
+import pytest
+
+from pkgcore.resolver.cdcl import cdcl_solver
+
+
+def make_solver(num_vars, clauses):
+    solver = cdcl_solver()
+    for _ in range(num_vars):
+        solver.new_var()
+    for clause in clauses:
+        solver.add_clause(clause)
+    return solver
+
+
+def brute_force(num_vars, clauses, assumptions=()):
+    for bits in product((False, True), repeat=num_vars):
+        model = {v for v in range(1, num_vars + 1) if bits[v - 1]}
+
+        def value(lit, model=model):
+            return (abs(lit) in model) == (lit > 0)
+
+        if all(map(value, assumptions)) and all(any(map(value, c)) for c in clauses):
+            return True
+    return False
+
+
+class TestCdclSolver:
+    def test_sat(self):
+        solver = make_solver(3, [[1, 2], [-1, 3], [-3]])
+        assert solver.solve()
+        assert solver.value(2) and not solver.value(1) and not solver.value(3)
+        assert solver.model() == {2}
+
+    def test_unsat(self):
+        solver = make_solver(2, [[1, 2], [-1, 2], [1, -2], [-1, -2]])
+        assert not solver.solve()
+        # the formula stays unsatisfiable
+        assert not solver.add_clause([1, 2, -2])
+        assert not solver.solve()
+
+    def test_tautology_and_empty(self):
+        solver = make_solver(1, [[1, -1]])
+        assert not solver.clauses
+        assert not solver.add_clause([])
+
+    def test_assumptions(self):
+        solver = make_solver(3, [[-1, 2], [-2, 3]])
+        assert solver.solve([1])
+        assert solver.value(3)
+        assert not solver.solve([1, -3])
+        # assumptions only apply to a single call
+        assert solver.solve([-3])
+        assert not solver.value(1)
+
+    def test_incremental(self):
+        solver = make_solver(2, [[1, 2]])
+        assert solver.solve()
+        solver.add_clause([-1])
+        assert solver.solve()
+        assert solver.value(2)
+        solver.add_clause([-2])
+        assert not solver.solve()
+
+    def test_decide(self):
+        solver = make_solver(3, [[1, 2, 3]])
+        assert solver.solve(decide=lambda s: 3 if s.value(3) is None else None)
+        assert solver.model() == {3}
+
+    @pytest.mark.parametrize("holes", (3, 4, 5))
+    def test_pigeonhole(self, holes):
+        solver = cdcl_solver()
+        pigeons = holes + 1
+        v = {(p, h): solver.new_var() for p in range(pigeons) for h in range(holes)}
+        for p in range(pigeons):
+            solver.add_clause([v[p, h] for h in range(holes)])
+        for h in range(holes):
+            for a, b in combinations(range(pigeons), 2):
+                solver.add_clause([-v[a, h], -v[b, h]])
+        assert not solver.solve()
+        assert solver.conflicts
+
+    def test_random(self):
+        rand = random.Random(0)
+        for _ in range(300):
+            num_vars = rand.randint(1, 8)
+            clauses = [
+                [
+                    rand.choice((-1, 1)) * rand.randint(1, num_vars)
+                    for _ in range(rand.randint(1, 3))
+                ]
+                for _ in range(rand.randint(1, 35))
+            ]
+            assumptions = [
+                rand.choice((-1, 1)) * rand.randint(1, num_vars)
+                for _ in range(rand.randint(0, 2))
+            ]
+            solver = make_solver(num_vars, clauses)
+            result = solver.solve(assumptions)
+            assert result == brute_force(num_vars, clauses, assumptions)
+            if result:
+                assert all(solver.value(x) for x in assumptions)
+                assert all(any(solver.value(x) for x in c) for c in clauses)
+            assert solver.solve() == brute_force(num_vars, clauses)
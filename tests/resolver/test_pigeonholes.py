@@ -59,3 +59,58 @@ class TestSlot:
         assert not c.fill_slotting(p2)
         c.remove_slotting(p)
         c.remove_slotting(p2)
+        assert not c.slot_dict
+        assert not c.slots
+
+    def test_forced(self):
+        c = PigeonHoledSlots()
+        p, p2 = fake_package(), fake_package()
+        assert not c.fill_slotting(p)
+        assert c.fill_slotting(p2, force=True) == [p]
+        assert c.fill_slotting(fake_package()) == [p, p2]
+        c.remove_slotting(p)
+        assert c.get_conflicting_slot(fake_package()) is p2
+        c.remove_slotting(p2)
+        assert c.get_conflicting_slot(fake_package()) is None
+        with pytest.raises(KeyError):
+            c.remove_slotting(p2)
+
+    def test_get_conflicting_slot(self):
+        c = PigeonHoledSlots()
+        p, p2 = fake_package(key="a"), fake_package(key="a", slot=1)
+        assert c.get_conflicting_slot(p) is None
+        assert not c.fill_slotting(p)
+        assert not c.fill_slotting(p2)
+        assert c.get_conflicting_slot(fake_package(key="a")) is p
+        assert c.get_conflicting_slot(fake_package(key="a", slot=1)) is p2
+        assert c.get_conflicting_slot(fake_package(key="b")) is None
+
+    def test_find_atom_matches(self):
+        c = PigeonHoledSlots()
+        pkgs = [fake_package(key="a", slot=x) for x in range(5)]
+        for p in pkgs:
+            assert not c.fill_slotting(p)
+        c.remove_slotting(pkgs[2])
+        # insertion order is preserved
+        assert c.find_atom_matches(fake_blocker("a", tuple(pkgs))) == [
+            pkgs[0],
+            pkgs[1],
+            pkgs[3],
+            pkgs[4],
+        ]
+        assert not c.find_atom_matches(fake_blocker("b", tuple(pkgs)))
+
+    def test_contains(self):
+        c = PigeonHoledSlots()
+        p = fake_package(key="a")
+        o = fake_blocker("a", p)
+        assert p not in c
+        assert o not in c
+        c.fill_slotting(p)
+        c.add_limiter(o)
+        assert p in c
+        assert o in c
+        c.remove_limiter(o)
+        c.remove_slotting(p)
+        assert p not in c
+        assert o not in c
@@ -1,7 +1,9 @@
 import pytest
 
+from pkgcore.ebuild.atom import atom
+from pkgcore.ebuild.resolver import upgrade_resolver
 from pkgcore.resolver import plan
-from pkgcore.test.misc import FakePkg
+from pkgcore.test.misc import FakePkg, FakeRepo
 
 
 @pytest.mark.parametrize(
@@ -29,3 +31,100 @@ def test_pkg_sorting(sorter, vers, expected, iter_sort_target):
     if iter_sort_target:
         pkgs = [x[0] for x in pkgs]
     assert [int(x.fullver) for x in pkgs] == expected
+
+
+def make_repo(repo_id, pkgs, livefs=False):
+    repo = FakeRepo(repo_id=repo_id, livefs=livefs)
+    repo.pkgs = [
+        FakePkg(cpv, repo=repo, eapi="7", data=dict(data)) for cpv, data in pkgs
+    ]
+    return repo
+
+
+class TestMergePlan:
+    def test_add_atoms(self):
+        repo = make_repo(
+            "src",
+            (
+                (
+                    "dev-libs/a-1",
+                    {"RDEPEND": "dev-libs/b", "DEPEND": "|| ( dev-libs/c dev-libs/b )"},
+                ),
+                ("dev-libs/b-1", {}),
+                ("dev-libs/b-2", {}),
+                ("dev-libs/c-1", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        resolver = upgrade_resolver([vdb], [repo])
+        assert resolver.add_atoms([atom("dev-libs/a")], finalize=True) == ()
+        assert [op.pkg.cpvstr for op in resolver.state.ops()] == [
+            "dev-libs/c-1",
+            "dev-libs/b-2",
+            "dev-libs/a-1",
+        ]
+        assert resolver.stats is None
+
+    def test_insoluble(self):
+        repo = make_repo("src", (("dev-libs/a-1", {"RDEPEND": "dev-libs/missing"}),))
+        vdb = make_repo("vdb", (), livefs=True)
+        resolver = upgrade_resolver([vdb], [repo])
+        assert resolver.add_atoms([atom("dev-libs/a")], finalize=True)
+        assert atom("dev-libs/missing") in resolver.insoluble
+
+    def test_bounded_cache(self):
+        pkgs = [
+            (f"dev-libs/p{x}-1", {"RDEPEND": f"|| ( dev-libs/p{x + 1} dev-libs/q )"})
+            for x in range(20)
+        ]
+        pkgs += [("dev-libs/p20-1", {}), ("dev-libs/q-1", {})]
+        repo = make_repo("src", pkgs)
+        vdb = make_repo("vdb", (), livefs=True)
+        results = []
+        for kwargs in ({}, {"cache_max_entries": 2, "cache_max_weight": 2}):
+            resolver = upgrade_resolver([vdb], [repo], stats=True, **kwargs)
+            assert resolver.add_atoms([atom("dev-libs/p0")], finalize=True) == ()
+            results.append([op.pkg.cpvstr for op in resolver.state.ops()])
+            # nothing is left pinned once resolution finishes
+            assert not any(x.__pinned__ for x in resolver.all_raw_dbs)
+        assert results[0] == results[1]
+        assert any(x.evictions for x in resolver.all_raw_dbs)
+
+    def test_memoized_failures(self):
+        repo = make_repo(
+            "src",
+            (
+                (
+                    "dev-libs/a-2",
+                    {
+                        "DEPEND": "=dev-libs/f-2",
+                        "RDEPEND": "|| ( dev-libs/b dev-libs/c ) dev-libs/d",
+                    },
+                ),
+                ("dev-libs/a-1", {"RDEPEND": "dev-libs/d"}),
+                ("dev-libs/b-1", {"RDEPEND": "dev-libs/e"}),
+                ("dev-libs/c-1", {"RDEPEND": "dev-libs/e"}),
+                ("dev-libs/d-1", {}),
+                ("dev-libs/e-1", {"RDEPEND": "=dev-libs/f-1"}),
+                ("dev-libs/f-1", {}),
+                ("dev-libs/f-2", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        results = []
+        for memoize in (False, True):
+            resolver = upgrade_resolver(
+                [vdb], [repo], stats=True, memoize_failures=memoize
+            )
+            assert resolver.add_atoms([atom("dev-libs/a")], finalize=True) == ()
+            results.append([op.pkg.cpvstr for op in resolver.state.ops()])
+            counters = resolver.stats.counters
+            assert counters["frames_pushed"] == counters["frames_popped"]
+        assert results[0] == results[1] == ["dev-libs/d-1", "dev-libs/a-1"]
+        assert counters["failures_memoized"]
+        assert counters["failure_memo_hits"] == 1
+        assert resolver.failures
+        # state dependent failures don't replay once the state differs
+        resolver.reset()
+        assert resolver.add_atoms([atom("dev-libs/e")], finalize=True) == ()
+        assert counters["failure_memo_hits"] == 1
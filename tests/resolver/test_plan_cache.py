@@ -0,0 +1,110 @@
+import os
+
+from snakeoil.mappings import AttrAccessible, ImmutableDict
+
+from pkgcore.ebuild.atom import atom
+from pkgcore.ebuild.resolver import upgrade_resolver
+from pkgcore.resolver.plan_cache import plan_cache
+from pkgcore.test.synthetic import generate_repos
+
+
+class TestPlanCache:
+    def setup_method(self):
+        self.repos = generate_repos(pkgs=30, targets=3)
+        resolver = upgrade_resolver([self.repos.vdb], [self.repos.repo])
+        assert resolver.add_atoms(self.repos.targets, finalize=True) == ()
+        self.ops = resolver.state.ops(only_real=True)
+
+    def make_domain(self, tmp_path, **settings):
+        config_dir = tmp_path / "etc"
+        profile = tmp_path / "profile"
+        if not profile.exists():
+            config_dir.mkdir()
+            profile.mkdir()
+            (profile / "make.defaults").write_text('ARCH="amd64"\n')
+        return AttrAccessible(
+            settings=ImmutableDict(settings),
+            config_dir=str(config_dir),
+            profile=AttrAccessible(stack=[AttrAccessible(path=str(profile))]),
+        )
+
+    def test_store_and_load(self, tmp_path):
+        cache = plan_cache(str(tmp_path / "plans"))
+        assert cache.load("a" * 64, self.repos.repo, self.repos.vdb) is None
+        assert cache.store("a" * 64, self.ops)
+        ops = cache.load("a" * 64, self.repos.repo, self.repos.vdb)
+        assert [(op.desc, op.pkg) for op in ops] == [
+            (op.desc, op.pkg) for op in self.ops
+        ]
+        assert any(op.desc == "replace" for op in ops)
+        for op, orig in zip(ops, self.ops):
+            if op.desc == "replace":
+                assert op.old_pkg is orig.old_pkg
+
+        # packages no longer available invalidate the plan
+        empty = generate_repos(pkgs=0)
+        assert cache.load("a" * 64, empty.repo, empty.vdb) is None
+
+        # as do corrupted entries
+        (tmp_path / "plans" / ("a" * 64)).write_text("{")
+        assert cache.load("a" * 64, self.repos.repo, self.repos.vdb) is None
+
+    def test_prune(self, tmp_path):
+        cache = plan_cache(str(tmp_path), max_plans=2)
+        for i, fingerprint in enumerate("abc"):
+            cache.store(fingerprint, self.ops)
+            os.utime(tmp_path / fingerprint, ns=(i, i))
+        cache.prune()
+        assert sorted(os.listdir(tmp_path)) == ["b", "c"]
+        # loading a plan marks it as recently used
+        assert cache.load("b", self.repos.repo, self.repos.vdb)
+        cache.store("d", self.ops)
+        assert sorted(os.listdir(tmp_path)) == ["b", "d"]
+
+    def test_fingerprint(self, tmp_path):
+        cache = plan_cache(str(tmp_path / "plans"))
+        repo = tmp_path / "repo"
+        (repo / "cat" / "pkg").mkdir(parents=True)
+        src = AttrAccessible(repo_id="src", location=str(repo))
+        vdb_path = tmp_path / "vdb"
+        vdb_path.mkdir()
+        vdb = AttrAccessible(repo_id="vdb", location=str(vdb_path))
+        domain = self.make_domain(tmp_path, USE={"a", "b"})
+        targets = [atom("cat/pkg"), atom("cat/other")]
+
+        def fingerprint(targets=targets, options=None, domain=domain):
+            if options is None:
+                options = {"deep": False}
+            return cache.fingerprint(targets, options, [src], [vdb], domain)
+
+        orig = fingerprint()
+        assert orig == fingerprint()
+        assert orig == fingerprint(targets=list(reversed(targets)))
+        assert orig == fingerprint(domain=self.make_domain(tmp_path, USE={"b", "a"}))
+        assert orig != fingerprint(targets=targets[:1])
+        assert orig != fingerprint(options={"deep": True})
+        assert orig != fingerprint(domain=self.make_domain(tmp_path, USE={"a"}))
+
+        # ints hash to themselves so colliding values iterate in insertion
+        # order, mirroring the hash seed dependent ordering of str sets
+        keywords = self.make_domain(tmp_path, ACCEPT_KEYWORDS={0, 8})
+        reordered = self.make_domain(tmp_path, ACCEPT_KEYWORDS={8, 0})
+        assert list(keywords.settings["ACCEPT_KEYWORDS"]) != list(
+            reordered.settings["ACCEPT_KEYWORDS"]
+        )
+        assert fingerprint(domain=keywords) == fingerprint(domain=reordered)
+
+        changes = (
+            # installed package
+            lambda: (vdb_path / "cat").mkdir(),
+            # new ebuild
+            lambda: (repo / "cat" / "pkg" / "pkg-1.ebuild").touch(),
+            # user config
+            lambda: (tmp_path / "etc" / "package.use").write_text("cat/pkg a\n"),
+            # profile
+            lambda: (tmp_path / "profile" / "use.force").write_text("a\n"),
+        )
+        for change in changes:
+            previous = fingerprint()
+            change()
+            assert previous != fingerprint()
@@ -0,0 +1,198 @@
+import pytest
+
+from pkgcore.ebuild.atom import atom
+from pkgcore.ebuild.resolver import min_install_resolver, upgrade_resolver
+from pkgcore.resolver.sat import sat_merge_plan
+
+from .test_plan import make_repo
+
+
+def resolve(resolver_func, vdb, repo, targets, **kwargs):
+    results = []
+    for resolver_cls in (None, sat_merge_plan):
+        if resolver_cls is not None:
+            kwargs["resolver_cls"] = resolver_cls
+        resolver = resolver_func([vdb], [repo], **kwargs)
+        ret = resolver.add_atoms([atom(x) for x in targets], finalize=True)
+        assert ret == ()
+        results.append(
+            [(op.desc, op.pkg.cpvstr) for op in resolver.state.ops(only_real=True)]
+        )
+    assert results[0] == results[1]
+    return results[1]
+
+
+class TestSatMergePlan:
+    def test_add_atoms(self):
+        repo = make_repo(
+            "src",
+            (
+                (
+                    "dev-libs/a-1",
+                    {"RDEPEND": "dev-libs/b", "DEPEND": "|| ( dev-libs/c dev-libs/b )"},
+                ),
+                ("dev-libs/b-1", {}),
+                ("dev-libs/b-2", {}),
+                ("dev-libs/c-1", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        assert resolve(upgrade_resolver, vdb, repo, ["dev-libs/a"]) == [
+            ("add", "dev-libs/c-1"),
+            ("add", "dev-libs/b-2"),
+            ("add", "dev-libs/a-1"),
+        ]
+
+    def test_slot_conflict(self):
+        # a-2 can't be satisfied due to f being required in two versions
+        repo = make_repo(
+            "src",
+            (
+                (
+                    "dev-libs/a-2",
+                    {
+                        "DEPEND": "=dev-libs/f-2",
+                        "RDEPEND": "|| ( dev-libs/b dev-libs/c ) dev-libs/d",
+                    },
+                ),
+                ("dev-libs/a-1", {"RDEPEND": "dev-libs/d"}),
+                ("dev-libs/b-1", {"RDEPEND": "dev-libs/e"}),
+                ("dev-libs/c-1", {"RDEPEND": "dev-libs/e"}),
+                ("dev-libs/d-1", {}),
+                ("dev-libs/e-1", {"RDEPEND": "=dev-libs/f-1"}),
+                ("dev-libs/f-1", {}),
+                ("dev-libs/f-2", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        assert resolve(upgrade_resolver, vdb, repo, ["dev-libs/a"]) == [
+            ("add", "dev-libs/d-1"),
+            ("add", "dev-libs/a-1"),
+        ]
+
+    def test_blockers(self):
+        repo = make_repo(
+            "src",
+            (
+                ("dev-libs/a-1", {"RDEPEND": "|| ( dev-libs/b dev-libs/c )"}),
+                ("dev-libs/b-1", {"RDEPEND": "!dev-libs/d"}),
+                ("dev-libs/c-1", {}),
+                ("dev-libs/d-1", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (("dev-libs/d-1", {}),), livefs=True)
+        assert resolve(upgrade_resolver, vdb, repo, ["dev-libs/a"]) == [
+            ("add", "dev-libs/c-1"),
+            ("add", "dev-libs/a-1"),
+        ]
+
+    @pytest.mark.parametrize(
+        ("resolver_func", "expected"),
+        (
+            pytest.param(
+                upgrade_resolver,
+                [("replace", "dev-libs/b-2"), ("add", "dev-libs/a-1")],
+                id="upgrade",
+            ),
+            pytest.param(min_install_resolver, [("add", "dev-libs/a-1")], id="reuse"),
+        ),
+    )
+    def test_installed(self, resolver_func, expected):
+        repo = make_repo(
+            "src",
+            (
+                ("dev-libs/a-1", {"RDEPEND": "dev-libs/b"}),
+                ("dev-libs/b-1", {}),
+                ("dev-libs/b-2", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (("dev-libs/b-1", {}),), livefs=True)
+        assert resolve(resolver_func, vdb, repo, ["dev-libs/a"]) == expected
+
+    def test_satisfied_or_group(self):
+        # or-group alternatives already part of the solution are preferred
+        repo = make_repo(
+            "src",
+            (
+                (
+                    "dev-libs/a-1",
+                    {"RDEPEND": "dev-libs/c || ( dev-libs/b dev-libs/c )"},
+                ),
+                ("dev-libs/b-1", {}),
+                ("dev-libs/c-1", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        assert resolve(upgrade_resolver, vdb, repo, ["dev-libs/a"]) == [
+            ("add", "dev-libs/c-1"),
+            ("add", "dev-libs/a-1"),
+        ]
+
+    @pytest.mark.parametrize(
+        ("resolver_func", "blockers"),
+        (
+            pytest.param(upgrade_resolver, 0.3, id="upgrade"),
+            # blockers against reused installed pkgs resolve differently
+            pytest.param(min_install_resolver, 0, id="reuse"),
+        ),
+    )
+    def test_matches_default(self, synthetic_repos, resolver_func, blockers):
+        # without dependency cycles plans match the default resolver
+        for seed in range(10):
+            repos = synthetic_repos(
+                pkgs=60,
+                targets=15,
+                fan_out=4,
+                or_groups=0.3,
+                versions=3,
+                blockers=blockers,
+                cycles=0,
+                seed=seed,
+            )
+            results = []
+            for kwargs in ({}, {"resolver_cls": sat_merge_plan}):
+                resolver = resolver_func([repos.vdb], [repos.repo], **kwargs)
+                assert resolver.add_atoms(repos.targets, finalize=True) == ()
+                results.append(
+                    {
+                        (op.desc, op.pkg.cpvstr)
+                        for op in resolver.state.ops(only_real=True)
+                    }
+                )
+            assert results[0] == results[1], f"seed {seed}"
+
+    def test_insoluble(self):
+        repo = make_repo(
+            "src",
+            (
+                ("dev-libs/a-1", {"RDEPEND": "dev-libs/missing"}),
+                ("dev-libs/b-1", {"RDEPEND": "!dev-libs/c"}),
+                ("dev-libs/c-1", {}),
+            ),
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        resolver = upgrade_resolver([vdb], [repo], resolver_cls=sat_merge_plan)
+        restricts, frame = resolver.add_atoms([atom("dev-libs/a")], finalize=True)
+        assert restricts == [atom("dev-libs/a")]
+        assert frame.succeeded is False
+        assert atom("dev-libs/missing") in resolver.insoluble
+
+        resolver.reset()
+        targets = [atom("dev-libs/b"), atom("dev-libs/c")]
+        restricts, frame = resolver.add_atoms(targets, finalize=True)
+        assert restricts == [atom("dev-libs/c")]
+        resolver.reset()
+        assert resolver.add_atoms(targets[:1], finalize=True) == ()
+
+    def test_stats(self):
+        repo = make_repo(
+            "src", (("dev-libs/a-1", {"RDEPEND": "dev-libs/b"}), ("dev-libs/b-1", {}))
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        resolver = upgrade_resolver(
+            [vdb], [repo], resolver_cls=sat_merge_plan, stats=True
+        )
+        assert resolver.add_atoms([atom("dev-libs/a")], finalize=True) == ()
+        counters = resolver.stats.collect(resolver)["counters"]
+        assert counters["sat_pkgs"] == 2
+        assert counters["sat_decisions"] >= 1
@@ -0,0 +1,89 @@
+import json
+from io import StringIO
+
+from pkgcore.ebuild.atom import atom
+from pkgcore.ebuild.resolver import upgrade_resolver
+from pkgcore.resolver.stats import resolver_stats
+
+from .test_plan import make_repo
+
+
+class TestResolverStats:
+    def test_counted(self):
+        stats = resolver_stats()
+        f = stats.counted("choices_tried", lambda x: x * 2)
+        assert f(2) == 4
+        assert f(3) == 6
+        assert stats.counters["choices_tried"] == 2
+
+    def test_timed_recursion(self):
+        stats = resolver_stats()
+
+        def recurse(depth):
+            if depth:
+                return wrapped(depth - 1)
+            return "done"
+
+        wrapped = stats.timed("recurse", recurse)
+        assert wrapped(5) == "done"
+        assert stats.calls["recurse"] == 6
+        assert stats.timers["recurse"] > 0
+        # timing state is reset after the outermost call finishes
+        assert not stats._depth["recurse"]
+
+    def test_timed_exception(self):
+        stats = resolver_stats()
+
+        def fail():
+            raise ValueError
+
+        wrapped = stats.timed("fail", fail)
+        for _ in range(2):
+            try:
+                wrapped()
+            except ValueError:
+                pass
+        assert stats.calls["fail"] == 2
+        assert not stats._depth["fail"]
+
+    def test_resolver(self):
+        repo = make_repo(
+            "src",
+            (
+                ("dev-libs/a-2", {"RDEPEND": "dev-libs/b dev-libs/missing"}),
+                ("dev-libs/a-1", {"RDEPEND": "|| ( dev-libs/c dev-libs/b )"}),
+                ("dev-libs/b-1", {}),
+                ("dev-libs/c-1", {"RDEPEND": "dev-libs/missing"}),
+            ),
+        )
+        vdb = make_repo("vdb", (), livefs=True)
+        resolver = upgrade_resolver([vdb], [repo], stats=True)
+        assert resolver.add_atoms([atom("dev-libs/a")], finalize=True) == ()
+        assert [op.pkg.cpvstr for op in resolver.state.ops()] == [
+            "dev-libs/b-1",
+            "dev-libs/a-1",
+        ]
+
+        stats = resolver.stats.collect(resolver)
+        counters = stats["counters"]
+        assert counters["frames_pushed"] == counters["frames_popped"]
+        assert counters["frames_pushed"] >= 4
+        assert counters["choices_tried"] >= 3
+        assert counters["backtracks"] > 0
+        assert counters["ops_reverted"] >= counters["backtracks"]
+        assert stats["insoluble"] == 1
+        assert stats["plan_ops"] == len(resolver.state.plan)
+        assert set(stats["timers"]) == {
+            "add_atoms",
+            "viable",
+            "process_dependencies",
+            "insert_choice",
+        }
+        assert stats["timers"]["add_atoms"]["calls"] == 1
+        src = stats["caching_repos"]["src"]
+        assert src["queries"] == src["hits"] + src["misses"]
+        assert src["itermatch_calls"] == src["misses"]
+
+        handle = StringIO()
+        resolver.stats.dump(resolver, handle)
+        assert json.loads(handle.getvalue()) == json.loads(json.dumps(stats))
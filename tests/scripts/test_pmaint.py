@@ -7,13 +7,15 @@ from snakeoil.formatters import PlainTextFormatter
 from snakeoil.mappings import AttrAccessible
 
 from pkgcore.config import basics
-from pkgcore.config.hint import ConfigHint
+from pkgcore.config.hint import ConfigHint, configurable
 from pkgcore.operations.repo import install, operations, replace, uninstall
 from pkgcore.repository import syncable, util
 from pkgcore.scripts import pmaint
 from pkgcore.sync import base
+from pkgcore.sync.delta import BlockManifest
 from pkgcore.test.misc import FakePkg
 from pkgcore.test.scripts.helpers import ArgParseMixin
+from pkgcore.vdb import ondisk
 
 Options = AttrAccessible
 
@@ -94,6 +96,8 @@ def make_domain(repo=None, binpkg=None, vdb=None):
 
 
 class FakeSyncer(base.Syncer):
+    track_changes = False
+
     def __init__(self, *args, **kwargs):
         self.succeed = kwargs.pop("succeed", True)
         super().__init__(*args, **kwargs)
@@ -101,6 +105,8 @@ class FakeSyncer(base.Syncer):
 
     def _sync(self, verbosity, **kwds):
         self.synced = True
+        if self.output is not None:
+            self.output.write(f"{self.uri} output\n".encode())
         return self.succeed
 
 
@@ -109,7 +115,7 @@ class SyncableRepo(syncable.tree, util.SimpleTree):
 
     def __init__(self, succeed=True):
         util.SimpleTree.__init__(self, {})
-        syncer = FakeSyncer("/fake", "fake", succeed=succeed)
+        syncer = FakeSyncer("/fake", "succeed" if succeed else "fail", succeed=succeed)
         syncable.tree.__init__(self, syncer)
 
 
@@ -164,6 +170,76 @@ class TestSync(ArgParseMixin):
             badrepo=failure_section,
         )
 
+    def test_parallel(self):
+        self.assertOutAndErr(
+            [
+                "*** syncing goodrepo",
+                "succeed output",
+                "*** synced goodrepo",
+                "*** syncing badrepo",
+                "fail output",
+                "!!! failed syncing badrepo",
+                "*** syncing otherrepo",
+                "succeed output",
+                "*** synced otherrepo",
+                "",
+                "*** sync results:",
+                "*** synced: goodrepo, otherrepo",
+                "!!! failed: badrepo",
+            ],
+            [],
+            "--jobs",
+            "2",
+            "goodrepo",
+            "badrepo",
+            "otherrepo",
+            goodrepo=success_section,
+            badrepo=failure_section,
+            otherrepo=success_section,
+        )
+
+        # output isn't captured when syncing a single repo
+        self.assertOut(
+            [
+                "*** syncing myrepo",
+                "*** synced myrepo",
+            ],
+            "-j",
+            "4",
+            myrepo=success_section,
+        )
+
+    def test_parallel_error(self):
+        class BrokenSyncer(FakeSyncer):
+            def _sync(self, verbosity, **kwds):
+                raise base.SyncError("broken")
+
+        class BrokenRepo(SyncableRepo):
+            def __init__(self):
+                super().__init__()
+                object.__setattr__(self, "_syncer", BrokenSyncer("/fake", "fake"))
+
+        broken_section = basics.HardCodedConfigSection({"class": BrokenRepo})
+        self.assertOut(
+            [
+                "*** syncing goodrepo",
+                "succeed output",
+                "*** synced goodrepo",
+                "*** syncing brokenrepo",
+                "!!! failed syncing brokenrepo: broken",
+                "",
+                "*** sync results:",
+                "*** synced: goodrepo",
+                "!!! failed: brokenrepo",
+            ],
+            "-j",
+            "2",
+            "goodrepo",
+            "brokenrepo",
+            goodrepo=success_section,
+            brokenrepo=broken_section,
+        )
+
 
 def derive_op(name, op, *a, **kw):
     if isinstance(name, str):
@@ -309,3 +385,55 @@ class TestUpdateDescFiles:
         # AtomicWriteFile resolves the target before deriving the temporary name
         temp_file = target_dir.resolve() / f".update.{filename}"
         assert f"Permission denied: {str(temp_file)!r}" in msg
+
+
+class TestOwnersIndex(ArgParseMixin):
+    _argparser = pmaint.owners_index
+
+    def test_rebuild(self, tmp_path):
+        vdb = tmp_path / "vdb"
+        (vdb / "cat/pkg-1").mkdir(parents=True)
+        (vdb / "cat/pkg-1/CONTENTS").write_text("dir /usr\n")
+
+        @configurable(typename="repo")
+        def ondisk_vdb():
+            return ondisk.tree(
+                str(vdb), cache_location=str(tmp_path / "cache"), repo_id="vdb"
+            )
+
+        config = basics.HardCodedConfigSection(
+            {
+                "class": FakeDomain,
+                "repos": [],
+                "binpkg": [],
+                "vdb": [basics.HardCodedConfigSection({"class": ondisk_vdb})],
+                "default": True,
+            }
+        )
+        self.assertOut(["rebuilding owners index for 'vdb'..."], domain=config)
+        index = ondisk.tree(str(vdb), cache_location=str(tmp_path / "cache")).owners
+        assert index.owners(["/usr"]) == {"/usr": {"cat/pkg-1"}}
+
+
+class TestBlockManifest(ArgParseMixin):
+    _argparser = pmaint.block_manifest
+
+    def test_generate(self, tmp_path):
+        path = tmp_path / "repo.sqfs"
+        path.write_bytes(os.urandom(100000))
+        self.assertOut([], str(path))
+        manifest = BlockManifest.parse((tmp_path / "repo.sqfs.blocks").read_bytes())
+        assert manifest.length == 100000
+        assert manifest.blocks == BlockManifest.generate(str(path)).blocks
+        self.assertOut(
+            [f"{path}.blocks: {len(manifest.blocks)} blocks"], "-v", str(path)
+        )
+
+    def test_missing_file(self, tmp_path):
+        path = tmp_path / "repo.sqfs"
+        prog = pmaint.block_manifest.prog
+        self.assertOutAndErr(
+            [],
+            [f"{prog}: failed reading {str(path)!r}: No such file or directory"],
+            str(path),
+        )
@@ -2,9 +2,11 @@ from pkgcore.config import basics
 from pkgcore.config.hint import ConfigHint, configurable
 from pkgcore.ebuild import atom, cpv
 from pkgcore.repository import util
+from pkgcore.restrictions import packages
 from pkgcore.scripts import pquery
 from pkgcore.test.misc import FakePkg
 from pkgcore.test.scripts.helpers import ArgParseMixin
+from pkgcore.vdb import ondisk
 
 
 class FakeDomain:
@@ -105,6 +107,36 @@ class TestCommandline(ArgParseMixin):
     def test_no_contents(self):
         self.assertOut([], "--contents", "--all", test_domain=domain_config)
 
+    def test_owns(self, tmp_path):
+        # repos without an ownership index fall back to contents matching
+        options = self.parse("--owns", "/usr/bin/foo", domain=domain_config)
+        assert options.query.attr == "contents"
+
+        vdb = tmp_path / "vdb"
+        (vdb / "cat/pkg-1").mkdir(parents=True)
+        (vdb / "cat/pkg-1/CONTENTS").write_text(
+            "obj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1\n"
+        )
+
+        @configurable(typename="repo")
+        def ondisk_vdb():
+            return ondisk.tree(str(vdb), cache_location=str(tmp_path / "cache"))
+
+        config = basics.HardCodedConfigSection(
+            {
+                "class": FakeDomain,
+                "repos": [basics.HardCodedConfigSection({"class": fake_repo})],
+                "vdb": [basics.HardCodedConfigSection({"class": ondisk_vdb})],
+                "default": True,
+            }
+        )
+        options = self.parse("--owns", "/usr/bin/foo", domain=config)
+        assert options.query == atom.atom("=cat/pkg-1")
+        options = self.parse("--owns-re", "bin/f", domain=config)
+        assert options.query == atom.atom("=cat/pkg-1")
+        options = self.parse("--owns", "/usr/bin/bar", domain=config)
+        assert options.query is packages.AlwaysFalse
+
 
 def test_revdep_pkgs_match_ignores_use_deps():
     pkg = FakePkg("dev-python/snakeoil-0.11.0", iuse=["foo"], use=[])
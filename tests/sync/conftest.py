@@ -0,0 +1,98 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers, path=self.path))
+        if self.path in server.files:
+            # static files not subject to ETags or dropped connections
+            data = server.files[self.path]
+            self.send_response(200 if data is not None else 404)
+            self.send_header("Content-Length", str(len(data or b"")))
+            self.end_headers()
+            self.wfile.write(data or b"")
+            return
+
+        etag = server.etag
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        data = server.data
+        range_header = self.headers.get("Range")
+        if (
+            range_header
+            and server.ranges
+            and self.headers.get("If-Range") in (None, etag)
+        ):
+            start, end = range_header.removeprefix("bytes=").split("-")
+            start = int(start)
+            end = int(end) + 1 if end else len(data)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+            start, end = 0, len(data)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+
+        body = data[start:end]
+        if server.drops:
+            # drop the connection after sending part of the data
+            body = body[: server.drops.pop(0)]
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPServer(ThreadingHTTPServer):
+    """Local HTTP server serving data for any path.
+
+    :ivar data: bytes served
+    :ivar etag: ETag header value, if any
+    :ivar ranges: support range requests
+    :ivar drops: byte counts after which the connections of successive
+        requests are dropped
+    :ivar files: mapping of paths to static file data served instead, files
+        mapped to None are missing
+    :ivar requests: headers and paths of received requests
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.data = b""
+        self.etag = '"1"'
+        self.ranges = True
+        self.drops = []
+        self.files = {}
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_port}"
+
+
+@pytest.fixture
+def http_server():
+    server = HTTPServer()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
@@ -137,6 +137,17 @@ class TestVcsSyncer:
         syncer.sync(verbosity=-1)
         assert "-q" == spawn.call_args[0][0][-1]
 
+    def test_captured_output(self, spawn, find_binary, tmp_path):
+        syncer = git.git_syncer(str(tmp_path), "git://blah.git")
+        syncer.sync()
+        assert spawn.call_args[1]["fd_pipes"] == {0: 0, 1: 1, 2: 1}
+        with open(tmp_path / "output", "wb") as output:
+            syncer.sync(output=output)
+            fd = output.fileno()
+            # captured syncs run non-interactively
+            assert spawn.call_args[1]["fd_pipes"] == {1: fd, 2: fd}
+        assert syncer.output is None
+
 
 class TestGenericSyncer:
     def test_init(self):
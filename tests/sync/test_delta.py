@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from pkgcore.sync.delta import BlockManifest, MalformedManifest
+
+data = random.Random(0).randbytes(2 * 1024 * 1024)
+
+
+class TestBlockManifest:
+    def test_generate(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(data)
+        manifest = BlockManifest.generate(str(path))
+        assert manifest.length == len(data)
+        assert sum(length for length, _ in manifest.blocks) == len(data)
+        assert all(length <= manifest.max_size for length, _ in manifest.blocks)
+        assert all(length >= manifest.min_size for length, _ in manifest.blocks[:-1])
+        index = manifest.index(str(path))
+        assert {digest for _, digest in manifest.blocks} == set(index)
+
+    def test_empty(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(b"")
+        manifest = BlockManifest.generate(str(path))
+        assert manifest.length == 0
+        assert manifest.blocks == ()
+        assert BlockManifest.parse(manifest.serialize()).length == 0
+
+    def test_content_defined(self, tmp_path):
+        old = tmp_path / "old"
+        old.write_bytes(data)
+        new = tmp_path / "new"
+        new.write_bytes(data[:500000] + b"inserted" * 100 + data[500000:])
+        index = BlockManifest.generate(str(old)).index(str(old))
+        manifest = BlockManifest.generate(str(new))
+        # blocks after the insertion are still found despite their new offsets
+        missing = [x for x in manifest.blocks if x[1] not in index]
+        assert sum(length for length, _ in missing) < len(data) // 4
+
+    def test_roundtrip(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_bytes(data)
+        manifest = BlockManifest.generate(str(path), min_size=1024, max_size=4096)
+        parsed = BlockManifest.parse(manifest.serialize().encode())
+        assert parsed.length == manifest.length
+        assert parsed.digest == manifest.digest
+        assert parsed.blocks == manifest.blocks
+        assert (parsed.anchor, parsed.min_size, parsed.max_size) == (
+            manifest.anchor,
+            1024,
+            4096,
+        )
+
+    @pytest.mark.parametrize(
+        "manifest",
+        (
+            b"\xff",
+            "",
+            "format: pkgcore-blocks-1\n",
+            "format: foo\n\n",
+            "garbage\n\n",
+            "format: pkgcore-blocks-1\nlength: 1\n\n",
+            (
+                "format: pkgcore-blocks-1\nlength: 2\nsha256: 00\nanchor: 00\n"
+                "min-size: 1\nmax-size: 1\n\n1 00\n"
+            ),
+            (
+                "format: pkgcore-blocks-1\nlength: 1\nsha256: 00\nanchor: 00\n"
+                "min-size: 2\nmax-size: 1\n\n1 00\n"
+            ),
+            (
+                "format: pkgcore-blocks-1\nlength: 1\nsha256: 00\nanchor: 00\n"
+                "min-size: 1\nmax-size: 1\n\n1 zz\n"
+            ),
+        ),
+    )
+    def test_malformed(self, manifest):
+        with pytest.raises(MalformedManifest):
+            BlockManifest.parse(manifest)
@@ -1,10 +1,12 @@
 import os
+import subprocess
 from unittest import mock
 
 import pytest
 from snakeoil.process import CommandNotFound
 
 from pkgcore.sync import base, git
+from pkgcore.sync.journal import ChangeJournal
 
 
 class TestGitSyncer:
@@ -49,6 +51,49 @@ class TestGitSyncer:
         assert spawn.call_args[0] == (["git", "pull"],)
         assert spawn.call_args[1]["cwd"] == syncer.basedir
 
+    def test_changes(self, tmp_path):
+        origin = tmp_path / "origin"
+
+        def run(*args):
+            subprocess.run(
+                ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+                + list(args),
+                cwd=origin,
+                check=True,
+                capture_output=True,
+            )
+
+        origin.mkdir()
+        run("init", "-q")
+        (origin / "modified").write_text("old")
+        (origin / "deleted").write_text("")
+        run("add", ".")
+        run("commit", "-qm", "initial")
+
+        syncer = git.git_syncer(str(self.repo_path), f"git+file://{origin}")
+        journal = ChangeJournal.for_repo(syncer.basedir)
+        assert syncer.sync()
+        # changes made by clones are unknown
+        assert syncer.changes is None
+        start = journal.position
+
+        # unchanged repos aren't journaled
+        assert syncer.sync()
+        assert syncer.changes == {}
+        assert journal.position == start
+
+        (origin / "modified").write_text("new")
+        (origin / "added").write_text("")
+        run("rm", "-q", "deleted")
+        run("add", ".")
+        run("commit", "-qm", "update")
+        assert syncer.sync(verbosity=-1)
+        assert journal.changes(start) == {
+            "added": "A",
+            "deleted": "D",
+            "modified": "M",
+        }
+
 
 @pytest.mark_network
 class TestGitSyncerReal:
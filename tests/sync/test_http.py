@@ -0,0 +1,199 @@
+import os
+import random
+
+import pytest
+
+from pkgcore.sync import base
+from pkgcore.sync.delta import BlockManifest
+from pkgcore.sync.http import http_syncer
+from pkgcore.sync.journal import ChangeJournal
+
+data = bytes(range(256)) * 40
+
+
+class TestHttpSyncer:
+    @pytest.fixture
+    def syncer(self, tmp_path, http_server):
+        http_server.data = data
+        syncer = http_syncer(str(tmp_path / "repo"), f"{http_server.url}/repo.sqfs")
+        syncer.retry_delay = 0
+        return syncer
+
+    def test_config(self):
+        syncer = http_syncer("/tmp/foon", "https://repo.sqfs")
+        assert syncer.timeout == http_syncer.default_timeout
+        assert syncer.retries == http_syncer.default_retries
+        syncer = http_syncer("/tmp/foon", "https://repo.sqfs", timeout="5", retries="1")
+        assert syncer.timeout == 5
+        assert syncer.retries == 1
+
+    def test_sync(self, tmp_path, http_server, syncer):
+        path = tmp_path / "repo"
+        assert syncer.sync()
+        assert (path / "repo.sqfs").read_bytes() == data
+        assert sorted(os.listdir(path)) == [".etag", "repo.sqfs"]
+        stat = os.stat(path / "repo.sqfs")
+        # unchanged remote files aren't refetched
+        assert syncer.sync()
+        assert http_server.requests[-1]["If-None-Match"] == '"1"'
+        assert stat == os.stat(path / "repo.sqfs")
+        # downloads replace the repo contents, so changes are unknown
+        journal = ChangeJournal.for_repo(str(path))
+        assert [x["changes"] for x in journal.entries()] == [None]
+
+    def test_resume_dropped_connection(self, tmp_path, http_server, syncer):
+        http_server.drops = [100, 1000]
+        assert syncer.sync()
+        assert (tmp_path / "repo/repo.sqfs").read_bytes() == data
+        assert [x.get("Range") for x in http_server.requests] == [
+            None,
+            "bytes=100-",
+            "bytes=1100-",
+        ]
+        assert http_server.requests[1]["If-Range"] == '"1"'
+
+    def test_resume_partial_download(self, tmp_path, http_server, syncer):
+        path = tmp_path / "repo"
+        http_server.drops = [100]
+        syncer.retries = 0
+        with pytest.raises(base.SyncError):
+            syncer.sync()
+        # partial downloads are kept along with their validator
+        assert (path / "repo.sqfs.partial").read_bytes() == data[:100]
+        assert (path / "repo.sqfs.partial.validator").read_text() == '"1"'
+        assert not (path / "repo.sqfs").exists()
+
+        # and resumed by the next sync
+        assert syncer.sync()
+        assert http_server.requests[-1]["Range"] == "bytes=100-"
+        assert (path / "repo.sqfs").read_bytes() == data
+        assert sorted(os.listdir(path)) == [".etag", "repo.sqfs"]
+
+    def test_changed_partial_download(self, tmp_path, http_server, syncer):
+        path = tmp_path / "repo"
+        http_server.drops = [100]
+        syncer.retries = 0
+        with pytest.raises(base.SyncError):
+            syncer.sync()
+        # If-Range doesn't match the new file so it's fetched from the start
+        http_server.etag = '"2"'
+        http_server.data = b"new" * 100
+        assert syncer.sync()
+        assert http_server.requests[-1]["If-Range"] == '"1"'
+        assert (path / "repo.sqfs").read_bytes() == b"new" * 100
+
+    def test_unsatisfiable_partial_download(self, tmp_path, http_server, syncer):
+        path = tmp_path / "repo"
+        path.mkdir()
+        (path / "repo.sqfs.partial").write_bytes(data * 2)
+        (path / "repo.sqfs.partial.validator").write_text('"1"')
+        assert syncer.sync()
+        assert (path / "repo.sqfs").read_bytes() == data
+
+    def test_no_validator(self, tmp_path, http_server, syncer):
+        http_server.etag = None
+        http_server.drops = [100]
+        with pytest.raises(base.SyncError, match="unable to resume"):
+            syncer.sync()
+        assert len(http_server.requests) == 1
+        assert not (tmp_path / "repo/repo.sqfs.partial.validator").exists()
+
+    def test_no_range_support(self, http_server, syncer):
+        http_server.ranges = False
+        http_server.drops = [100]
+        with pytest.raises(base.SyncError, match="failed resuming"):
+            syncer.sync()
+
+    def test_retries_exhausted(self, http_server, syncer):
+        # retries are limited for consecutive failures without progress
+        http_server.drops = [100, 0, 0]
+        syncer.retries = 2
+        with pytest.raises(base.SyncError, match="failed fetching"):
+            syncer.sync()
+        assert len(http_server.requests) == 3
+
+    def test_unreachable(self, tmp_path):
+        syncer = http_syncer(str(tmp_path / "repo"), "http://127.0.0.1:1/repo.sqfs")
+        syncer.retries = 1
+        syncer.retry_delay = 0
+        with pytest.raises(base.SyncError, match="failed fetching"):
+            syncer.sync()
+
+
+class TestDeltaSync:
+    old = random.Random(0).randbytes(2 * 1024 * 1024)
+    new = old[:500000] + b"inserted" * 100 + old[500000:1500000] + old[1600000:]
+
+    @pytest.fixture
+    def syncer(self, tmp_path, http_server):
+        (path := tmp_path / "repo").mkdir()
+        (path / "repo.sqfs").write_bytes(self.old)
+        (publish := tmp_path / "publish").write_bytes(self.new)
+        manifest = BlockManifest.generate(str(publish))
+        http_server.data = self.new
+        http_server.files["/repo.sqfs.blocks"] = manifest.serialize().encode()
+        syncer = http_syncer(str(path), f"{http_server.url}/repo.sqfs")
+        syncer.retry_delay = 0
+        return syncer
+
+    def fetched(self, http_server):
+        total = 0
+        for request in http_server.requests:
+            if request["path"] != "/repo.sqfs" or "Range" not in request:
+                continue
+            start, end = request["Range"].removeprefix("bytes=").split("-")
+            total += int(end) - int(start) + 1
+        return total
+
+    def test_delta(self, tmp_path, http_server, syncer):
+        assert syncer.sync()
+        path = tmp_path / "repo"
+        assert (path / "repo.sqfs").read_bytes() == self.new
+        assert sorted(os.listdir(path)) == [".etag", "repo.sqfs"]
+        # only the changed blocks are fetched
+        assert 0 < self.fetched(http_server) < len(self.new) // 4
+        assert all(x["If-Range"] == '"1"' for x in http_server.requests if "Range" in x)
+
+    def test_request_size(self, tmp_path, http_server, syncer):
+        (tmp_path / "repo/repo.sqfs").write_bytes(b"")
+        syncer.delta_request_size = 512 * 1024
+        assert syncer.sync()
+        assert (tmp_path / "repo/repo.sqfs").read_bytes() == self.new
+        ranges = [x for x in http_server.requests if "Range" in x]
+        assert len(ranges) > len(self.new) // syncer.delta_request_size
+        assert self.fetched(http_server) == len(self.new)
+
+    def test_missing_manifest(self, tmp_path, http_server, syncer):
+        http_server.files["/repo.sqfs.blocks"] = None
+        assert syncer.sync()
+        assert (tmp_path / "repo/repo.sqfs").read_bytes() == self.new
+        assert self.fetched(http_server) == 0
+
+    def test_stale_manifest(self, tmp_path, http_server, syncer):
+        # manifest and file don't match, the file is fully fetched instead
+        (publish := tmp_path / "publish").write_bytes(self.old[:-1])
+        manifest = BlockManifest.generate(str(publish))
+        manifest.length = len(self.new)
+        http_server.files["/repo.sqfs.blocks"] = manifest.serialize().encode()
+        assert syncer.sync()
+        assert (tmp_path / "repo/repo.sqfs").read_bytes() == self.new
+
+    def test_changed_remote(self, tmp_path, http_server, syncer):
+        # remote file changes during the delta sync
+        original = syncer._read_range
+
+        def read_range(*args):
+            http_server.etag = '"2"'
+            return original(*args)
+
+        syncer._read_range = read_range
+        # the original response is used for a full download
+        assert syncer.sync()
+        assert (tmp_path / "repo/repo.sqfs").read_bytes() == self.new
+        assert (tmp_path / "repo/.etag").read_text() == '"1"'
+
+    def test_disabled(self, tmp_path, http_server, syncer):
+        syncer.delta = False
+        assert syncer.sync()
+        assert (tmp_path / "repo/repo.sqfs").read_bytes() == self.new
+        assert all(x["path"] == "/repo.sqfs" for x in http_server.requests)
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from pkgcore.sync.journal import ChangeJournal, tree_changes
+
+
+class TestChangeJournal:
+    @pytest.fixture
+    def journal(self, tmp_path):
+        return ChangeJournal.for_repo(str(tmp_path / "repo") + os.path.sep)
+
+    def test_for_repo(self, tmp_path, journal):
+        assert journal.path == str(tmp_path / ".repo.sync-journal")
+
+    def test_empty(self, journal):
+        assert journal.position == 0
+        assert journal.entries() == []
+        # unknown positions require a full rescan
+        assert journal.changes(0) is None
+
+    def test_record(self, journal):
+        pos1 = journal.record({"a": "A", "b": "M"}, syncer="git")
+        pos2 = journal.record({"b": "D", "c": "A"}, syncer="git")
+        assert 0 < pos1 < pos2 == journal.position
+        assert [x["syncer"] for x in journal.entries()] == ["git", "git"]
+        assert journal.changes(pos2) == {}
+        assert journal.changes(pos1) == {"b": "D", "c": "A"}
+
+    def test_merge(self, journal):
+        start = journal.record({})
+        journal.record({"a": "A", "b": "D", "c": "M"})
+        journal.record({"a": "M", "b": "A", "c": "D"})
+        journal.record({"d": "A"})
+        journal.record({"d": "D"})
+        # changes are squashed
+        assert journal.changes(start) == {"a": "A", "b": "M", "c": "D", "d": "D"}
+        assert journal.changes(0) is None
+
+    def test_unknown_changes(self, journal):
+        pos1 = journal.record({"a": "A"})
+        pos2 = journal.record(None)
+        journal.record({"b": "M"})
+        assert journal.changes(pos1) is None
+        assert journal.changes(pos2) == {"b": "M"}
+
+    def test_truncation(self, journal):
+        journal.max_entries = 3
+        positions = [journal.record({str(i): "M"}) for i in range(5)]
+        assert len(journal.entries()) == 3
+        assert journal.changes(positions[0]) is None
+        assert journal.changes(positions[1]) == {"2": "M", "3": "M", "4": "M"}
+
+    def test_recreated(self, journal):
+        pos = journal.record({"a": "M"})
+        os.unlink(journal.path)
+        journal.record({"b": "M"})
+        # positions from before the journal was recreated are invalid
+        assert journal.changes(pos) is None
+
+    def test_invalid(self, journal, caplog):
+        with open(journal.path, "w") as f:
+            f.write("garbage\n")
+        assert journal.changes(0) is None
+        assert "invalid sync journal" in caplog.text
+        # and is replaced by recorded entries
+        pos = journal.record({"a": "M"})
+        assert journal.position == pos
+
+
+def test_tree_changes(tmp_path):
+    old, new = tmp_path / "old", tmp_path / "new"
+    for path in (old, new):
+        (path / "dir").mkdir(parents=True)
+        (path / "same").write_text("same")
+        (path / "dir/touched").write_text("touched")
+        (path / ".etag").write_text(path.name)
+    (old / "removed").write_text("removed")
+    (old / "dir/removed").write_text("removed")
+    (new / "dir/added").write_text("added")
+    (old / "size").write_text("old")
+    (new / "size").write_text("new!")
+    (old / "content").write_text("old")
+    (new / "content").write_text("new")
+    (old / "link").symlink_to("same")
+    (new / "link").symlink_to("size")
+    os.utime(new / "dir/touched", (0, 0))
+    os.utime(new / "content", (0, 0))
+
+    assert tree_changes(str(old), str(new), exclude={".etag"}) == {
+        "removed": "D",
+        "dir/removed": "D",
+        "dir/added": "A",
+        "size": "M",
+        "content": "M",
+        "link": "M",
+    }
@@ -1,11 +1,14 @@
 import datetime
 import os
+import socket
+import time
 from unittest import mock
 
 import pytest
 from snakeoil.process import CommandNotFound
 
 from pkgcore.sync import base, rsync
+from pkgcore.sync.journal import ChangeJournal
 from pkgcore.sync.tar import tar_syncer
 
 
@@ -20,8 +23,25 @@ class TestRsyncSyncer:
     _syncer_class = rsync.rsync_syncer
 
     @pytest.fixture(autouse=True)
-    def _setup(self, tmp_path):
+    def _setup(self, tmp_path, monkeypatch):
         self.repo_path = str(tmp_path / "repo")
+        self.probe_cache = tmp_path / "cache/rsync-probes.json"
+        monkeypatch.setattr(
+            rsync.rsync_syncer, "probe_cache_path", str(self.probe_cache)
+        )
+        # connection times of IPs in milliseconds, None for unreachable IPs
+        self.latencies = {}
+        self.probed = []
+
+        def connect_time(ip, port, timeout):
+            self.probed.append((ip, port))
+            if (latency := self.latencies.get(ip, 1)) is None:
+                raise ConnectionRefusedError()
+            return latency / 1000
+
+        monkeypatch.setattr(
+            rsync.rsync_syncer, "_connect_time", staticmethod(connect_time)
+        )
         with mock.patch("snakeoil.process.find_binary", return_value="rsync"):
             self.syncer = self._syncer_class(
                 self.repo_path, "rsync://rsync.gentoo.org/gentoo-portage"
@@ -87,11 +107,165 @@ class TestRsyncSyncer:
         assert str(excinfo.value).startswith("DNS resolution failed")
         spawn.assert_not_called()
 
+    def synced_uris(self, spawn):
+        return [x.args[0][1] for x in spawn.call_args_list]
+
+    def test_probe_ordering(self, spawn, getaddrinfo):
+        spawn.return_value = 99
+        self.latencies = {"0.0.0.0": 50, "1.1.1.1": None, "2.2.2.2": 10}
+        with pytest.raises(base.SyncError):
+            self.syncer.sync()
+        # fastest first, unreachable last
+        assert self.synced_uris(spawn) == [
+            "rsync://2.2.2.2/gentoo-portage/",
+            "rsync://0.0.0.0/gentoo-portage/",
+            "rsync://1.1.1.1/gentoo-portage/",
+        ]
+        assert sorted(self.probed) == [
+            ("0.0.0.0", 873),
+            ("1.1.1.1", 873),
+            ("2.2.2.2", 873),
+        ]
+
+    def test_probe_cache(self, spawn, getaddrinfo):
+        spawn.return_value = 0
+        self.latencies = {"0.0.0.0": 50, "1.1.1.1": None, "2.2.2.2": 10}
+        assert self.syncer.sync()
+        assert self.probe_cache.exists()
+        # cached results are reused
+        self.probed.clear()
+        self.latencies = {}
+        spawn.reset_mock()
+        assert self.syncer.sync()
+        assert not self.probed
+        assert self.synced_uris(spawn) == ["rsync://2.2.2.2/gentoo-portage/"]
+        # until they expire
+        self.syncer.probe_ttl = 0
+        spawn.reset_mock()
+        assert self.syncer.sync()
+        assert len(self.probed) == 3
+        assert self.synced_uris(spawn) == ["rsync://0.0.0.0/gentoo-portage/"]
+
+    def test_corrupt_probe_cache(self, spawn, getaddrinfo):
+        spawn.return_value = 0
+        self.probe_cache.parent.mkdir()
+        self.probe_cache.write_text("{")
+        assert self.syncer.sync()
+        assert len(self.probed) == 3
+
+    def test_probe_deadline(self, spawn, getaddrinfo, monkeypatch):
+        spawn.return_value = 99
+        self.syncer.probe_timeout = 0.05
+
+        def connect_time(ip, port, timeout):
+            if ip == "0.0.0.0":
+                time.sleep(0.5)
+            return 0.001
+
+        monkeypatch.setattr(self.syncer, "_connect_time", connect_time)
+        start = time.monotonic()
+        with pytest.raises(base.SyncError):
+            self.syncer.sync()
+        assert time.monotonic() - start < 0.5
+        # hosts not connected to by the deadline are tried last
+        assert self.synced_uris(spawn)[-1] == "rsync://0.0.0.0/gentoo-portage/"
+
+    def test_probing_disabled(self, spawn, getaddrinfo):
+        spawn.return_value = 0
+        self.syncer.probe_timeout = 0
+        self.latencies = {"0.0.0.0": None}
+        assert self.syncer.sync()
+        assert not self.probed
+        assert self.synced_uris(spawn) == ["rsync://0.0.0.0/gentoo-portage/"]
+
+    def test_mirrors(self, spawn, getaddrinfo):
+        spawn.return_value = 99
+
+        def resolve(host, *args):
+            if host == "dead.mirror":
+                raise OSError()
+            ip = {"rsync.gentoo.org": "1.1.1.1", "fast.mirror": "2.2.2.2"}[host]
+            return [(None, None, None, None, (ip, 0))]
+
+        getaddrinfo.side_effect = resolve
+        self.latencies = {"1.1.1.1": 50, "2.2.2.2": 10}
+        with mock.patch("snakeoil.process.find_binary", return_value="rsync"):
+            syncer = self._syncer_class(
+                self.repo_path,
+                "rsync://rsync.gentoo.org/gentoo-portage",
+                mirrors=[
+                    "rsync://dead.mirror/gentoo",
+                    "rsync://fast.mirror:8873/gentoo",
+                ],
+            )
+        with pytest.raises(base.SyncError):
+            syncer.sync()
+        assert self.synced_uris(spawn) == [
+            "rsync://2.2.2.2:8873/gentoo/",
+            "rsync://1.1.1.1/gentoo-portage/",
+        ]
+        assert sorted(self.probed) == [("1.1.1.1", 873), ("2.2.2.2", 8873)]
+
+    @mock.patch("snakeoil.process.find_binary", return_value="rsync")
+    def test_invalid_mirror(self, find_binary, spawn, getaddrinfo):
+        with pytest.raises(base.UriError):
+            self._syncer_class(
+                self.repo_path,
+                "rsync://rsync.gentoo.org/gentoo-portage",
+                mirrors=["https://mirror/gentoo"],
+            )
+
+    def test_changes(self, spawn, getaddrinfo):
+        log = [
+            "building file list",
+            "*deleting  |dev-util/foo/foo-1.ebuild",
+            "*deleting  |dev-util/foo/",
+            "cd+++++++++|dev-util/bar/",
+            ">f+++++++++|dev-util/bar/bar-1.ebuild",
+            ">f.st......|metadata/timestamp.chk",
+            ".f...p.....|profiles/repo_name",
+            "cL+++++++++|header.txt",
+            "sent 100 bytes  received 1000 bytes",
+        ]
+
+        def run(cmd, **kwargs):
+            path = next(x for x in cmd if x.startswith("--log-file="))
+            with open(path.split("=", 1)[1], "w") as f:
+                f.writelines(f"2024/01/01 00:00:00 [1234] {line}\n" for line in log)
+            return 0
+
+        spawn.side_effect = run
+        assert self.syncer.sync()
+        changes = {
+            "dev-util/foo/foo-1.ebuild": "D",
+            "dev-util/bar/bar-1.ebuild": "A",
+            "metadata/timestamp.chk": "M",
+            "header.txt": "A",
+        }
+        assert self.syncer.changes == changes
+        journal = ChangeJournal.for_repo(self.repo_path)
+        assert journal.entries()[-1]["changes"] == changes
+
+    def test_split_port(self, spawn, getaddrinfo):
+        split_port = self._syncer_class.split_port
+        assert split_port("host") == ("host", 873)
+        assert split_port("host:8873") == ("host", 8873)
+        assert split_port("[::1]") == ("[::1]", 873)
+        assert split_port("[::1]:8873") == ("[::1]", 8873)
+
 
 class TestRsyncTimestampSyncer(TestRsyncSyncer):
     _syncer_class = rsync.rsync_timestamp_syncer
 
 
+def test_connect_time():
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        port = server.getsockname()[1]
+        assert rsync.rsync_syncer._connect_time("127.0.0.1", port, 1) >= 0
+    with pytest.raises(OSError):
+        rsync.rsync_syncer._connect_time("127.0.0.1", port, 1)
+
+
 @pytest.mark_network
 class TestRsyncSyncerReal:
     def test_sync(self, tmp_path):
@@ -1,8 +1,13 @@
+import hashlib
 import os
+import shutil
+import tarfile
+from io import BytesIO
 
 import pytest
 
 from pkgcore.sync import base
+from pkgcore.sync.journal import ChangeJournal
 from pkgcore.sync.tar import tar_syncer
 
 
@@ -42,3 +47,162 @@ class TestTarSyncerReal:
         # forcibly re-sync and verify that the repo gets replaced
         assert syncer.sync(force=True)
         assert stat != os.stat(layout_conf)
+
+
+def make_tarball(members, compression="gz"):
+    data = BytesIO()
+    with tarfile.open(fileobj=data, mode=f"w:{compression}") as archive:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            if content is None:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                archive.addfile(info)
+            elif isinstance(content, tuple):
+                info.type, info.linkname = content
+                archive.addfile(info)
+            else:
+                info.size = len(content)
+                info.uid = info.gid = 12345
+                archive.addfile(info, BytesIO(content))
+    return data.getvalue()
+
+
+def serve_tarball(http_server, data, name="repo.tar.gz"):
+    """Serve a tarball along with its published checksum."""
+    http_server.data = data
+    http_server.files[f"/{name}.sha512sum"] = (
+        f"{hashlib.sha512(data).hexdigest()}  {name}\n".encode()
+    )
+
+
+class TestTarSyncerStream:
+    members = (
+        ("repo-master", None),
+        ("repo-master/profiles", None),
+        ("repo-master/profiles/repo_name", b"test\n"),
+        ("repo-master/metadata/layout.conf", b"masters =\n"),
+        ("repo-master/layout.conf", (tarfile.SYMTYPE, "metadata/layout.conf")),
+        ("repo-master/repo_name", (tarfile.LNKTYPE, "repo-master/profiles/repo_name")),
+    )
+
+    @pytest.mark.parametrize("compression", ("gz", "bz2", "xz"))
+    def test_sync(self, tmp_path, http_server, compression):
+        data = make_tarball(self.members, compression)
+        serve_tarball(http_server, data, f"repo.tar.{compression}")
+        path = tmp_path / "repo"
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.{compression}")
+        assert syncer.sync()
+        assert sorted(os.listdir(path)) == [
+            ".etag",
+            "layout.conf",
+            "metadata",
+            "profiles",
+            "repo_name",
+        ]
+        assert (path / "profiles/repo_name").read_text() == "test\n"
+        assert (path / "layout.conf").read_text() == "masters =\n"
+        assert os.path.samefile(path / "repo_name", path / "profiles/repo_name")
+        # the entire tarball is hashed while streaming
+        assert syncer.digest == hashlib.sha512(data).hexdigest()
+        # no tarball is left behind
+        assert sorted(os.listdir(tmp_path)) == [
+            ".repo.old",
+            ".repo.sync-journal",
+            "repo",
+        ]
+
+    def test_resync(self, tmp_path, http_server):
+        path = tmp_path / "repo"
+        path.mkdir()
+        (path / "stale").write_text("")
+        serve_tarball(http_server, make_tarball(self.members))
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.gz")
+        assert syncer.sync()
+        assert not (path / "stale").exists()
+        assert (path / ".etag").read_text() == '"1"'
+
+    def test_changes(self, tmp_path, http_server):
+        path = tmp_path / "repo"
+        serve_tarball(http_server, make_tarball(self.members))
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.gz")
+        assert syncer.sync()
+        assert syncer.changes == {
+            "layout.conf": "A",
+            "metadata/layout.conf": "A",
+            "profiles/repo_name": "A",
+            "repo_name": "A",
+        }
+        journal = ChangeJournal.for_repo(str(path))
+        start = journal.position
+
+        # unchanged snapshots aren't journaled
+        assert syncer.sync()
+        assert journal.position == start
+
+        members = dict(self.members)
+        members["repo-master/profiles/repo_name"] = b"changed\n"
+        members["repo-master/added"] = b""
+        del members["repo-master/layout.conf"]
+        serve_tarball(http_server, make_tarball(members.items()))
+        http_server.etag = '"2"'
+        # the old repo is normally removed on exit
+        shutil.rmtree(tmp_path / ".repo.old")
+        assert syncer.sync()
+        assert journal.changes(start) == {
+            "added": "A",
+            "layout.conf": "D",
+            "profiles/repo_name": "M",
+            "repo_name": "M",
+        }
+
+    def test_resume(self, tmp_path, http_server):
+        # dropped connections are resumed mid-stream
+        serve_tarball(http_server, data := make_tarball(self.members))
+        http_server.drops = [100, 50]
+        path = tmp_path / "repo"
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.gz")
+        syncer.retry_delay = 0
+        assert syncer.sync()
+        assert (path / "profiles/repo_name").read_text() == "test\n"
+        assert syncer.digest == hashlib.sha512(data).hexdigest()
+        assert [
+            x.get("Range") for x in http_server.requests if x["path"] == "/repo.tar.gz"
+        ] == [None, "bytes=100-", "bytes=150-"]
+
+    def test_corrupt(self, tmp_path, http_server):
+        data = make_tarball(self.members)
+        http_server.data = data[: len(data) // 2]
+        path = tmp_path / "repo"
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.gz")
+        with pytest.raises(base.SyncError, match="failed to unpack tarball"):
+            syncer.sync()
+
+    def test_checksum_mismatch(self, tmp_path, http_server):
+        path = tmp_path / "repo"
+        path.mkdir()
+        (path / "existing").write_text("")
+        serve_tarball(http_server, make_tarball(self.members))
+        http_server.data = make_tarball(self.members[:3])
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.gz")
+        with pytest.raises(base.SyncError, match="sha512 checksum mismatch"):
+            syncer.sync()
+        # the unpacked snapshot isn't moved into place
+        assert os.listdir(path) == ["existing"]
+
+    def test_no_checksum(self, tmp_path, http_server):
+        http_server.data = data = make_tarball(self.members)
+        http_server.files["/repo.tar.gz.sha512sum"] = None
+        path = tmp_path / "repo"
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.gz")
+        assert syncer.sync()
+        assert (path / "profiles/repo_name").read_text() == "test\n"
+        assert syncer.digest == hashlib.sha512(data).hexdigest()
+
+    def test_unsafe_member(self, tmp_path, http_server):
+        http_server.data = make_tarball([("repo-master/../../escape", b"")])
+        path = tmp_path / "repo"
+        syncer = tar_syncer(str(path), f"{http_server.url}/repo.tar.gz")
+        with pytest.raises(base.SyncError, match="failed to unpack tarball"):
+            syncer.sync()
+        assert not (tmp_path / "escape").exists()
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from pkgcore.test import benchmark
+
+
+class TestBenchmark:
+    def test_measure(self):
+        calls = []
+
+        def functor():
+            calls.append(bytearray(1024 * 1024))
+            return {"extra": 1}
+
+        results = benchmark.measure(functor, repeat=2)
+        assert len(calls) == 3
+        assert results["runs"] == 2
+        assert results["min"] <= results["mean"] <= results["max"]
+        assert results["peak_memory"] >= 1024 * 1024
+        assert results["extra"] == 1
+
+    def test_run_benchmarks(self):
+        results = benchmark.run_benchmarks(
+            names=["resolver", "resolver-sat"], sizes=("small", "huge"), repeat=1
+        )
+        for name in ("resolver", "resolver-sat"):
+            data = results["benchmarks"][name]
+            assert list(data) == ["small"]
+            assert not data["small"]["failed"]
+            assert data["small"]["ops"]
+        assert results["pkgcore"]
+
+    def test_contents(self):
+        results = benchmark.run_benchmarks(names=["contents"], repeat=1)
+        data = results["benchmarks"]["contents"]["small"]
+        assert data["entries"] > 19000
+        assert data["symlinks"]
+
+    def test_tar(self):
+        results = benchmark.run_benchmarks(names=["tar"], repeat=1)
+        data = results["benchmarks"]["tar"]["small"]
+        assert data["members"] > 19000
+        assert data["entries"] >= data["members"]
+
+    def test_main(self, capsys, tmp_path):
+        assert benchmark.main(["-l"]) == 0
+        out, _ = capsys.readouterr()
+        assert "resolver: small, medium, large" in out.splitlines()
+
+        path = tmp_path / "results.json"
+        assert benchmark.main(["-r", "1", "--json", str(path), "resolver"]) == 0
+        with open(path) as f:
+            results = json.load(f)
+        assert list(results["benchmarks"]) == ["resolver"]
+
+        with pytest.raises(SystemExit):
+            benchmark.main(["nonexistent"])
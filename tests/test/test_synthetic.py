@@ -0,0 +1,69 @@
+from pkgcore.ebuild.resolver import upgrade_resolver
+from pkgcore.restrictions import packages
+from pkgcore.test.synthetic import generate_contents
+
+
+class TestGenerateRepos:
+    def test_deterministic(self, synthetic_repos):
+        repos = [synthetic_repos(pkgs=50, seed=1) for _ in range(2)]
+        for x in ("repo", "vdb"):
+            pkgs1, pkgs2 = (
+                [(pkg.cpvstr, pkg.rdepend) for pkg in getattr(r, x)] for r in repos
+            )
+            assert pkgs1 == pkgs2
+        assert repos[0].targets == repos[1].targets
+        other = synthetic_repos(pkgs=50, seed=2)
+        assert [pkg.rdepend for pkg in other.repo] != [
+            pkg.rdepend for pkg in repos[0].repo
+        ]
+
+    def test_layout(self, synthetic_repos):
+        repos = synthetic_repos(
+            pkgs=40, slots=2, versions=3, installed=1, targets=5, categories=4
+        )
+        assert len(repos.repo) == 40 * 2 * 3
+        assert len(repos.vdb) == 40 * 2
+        assert len(list(repos.repo.categories)) == 4
+        assert len(repos.targets) == 5
+        assert {pkg.slot for pkg in repos.repo} == {"0", "1"}
+        assert all(pkg.version.endswith(".0") for pkg in repos.vdb)
+        assert repos.vdb.livefs and not repos.repo.livefs
+        # the same instances are returned across queries
+        assert list(repos.repo.itermatch(packages.AlwaysTrue)) == list(repos.repo)
+        pkg = next(iter(repos.repo))
+        assert repos.repo.match(pkg.versioned_atom)[0] is pkg
+
+    def test_features(self, synthetic_repos):
+        repos = synthetic_repos(pkgs=200, or_groups=1, blockers=1, cycles=1)
+        assert any(pkg.pdepend for pkg in repos.repo)
+        deps = " ".join(str(pkg.rdepend) for pkg in repos.repo)
+        assert "||" in deps
+        assert "!=" in deps
+        assert not synthetic_repos(pkgs=200, installed=0).vdb.pkgs
+
+    def test_resolvable(self, synthetic_repos):
+        repos = synthetic_repos(pkgs=200, slots=2, targets=20)
+        resolver = upgrade_resolver([repos.vdb], [repos.repo], drop_cycles=True)
+        assert resolver.add_atoms(repos.targets, finalize=True) == ()
+        assert resolver.state.ops(only_real=True)
+
+
+class TestGenerateContents:
+    def test_layout(self):
+        contents = generate_contents(entries=2000, files_per_dir=9, symlinks=0.1)
+        assert 1900 <= len(contents.image) <= 2000
+        assert len(contents.image.files()) == 200 * 9
+        assert contents.image.links()
+        assert contents.livefs.links()
+        # symlinks aren't nested within symlinked directories
+        for cset in contents:
+            for link in cset.iterlinks():
+                assert not cset.child_nodes(link.location).links()
+
+    def test_deterministic(self):
+        assert sorted(generate_contents(seed=1).image) == sorted(
+            generate_contents(seed=1).image
+        )
+        assert sorted(generate_contents(seed=1).image) != sorted(
+            generate_contents(seed=2).image
+        )
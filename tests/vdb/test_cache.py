@@ -0,0 +1,119 @@
+import os
+import shutil
+
+import pytest
+
+from pkgcore.ebuild.atom import atom
+from pkgcore.vdb import ondisk
+from pkgcore.vdb.cache import metadata_cache
+
+
+class TestMetadataCache:
+    def mk_pkg(self, path, cpv, **data):
+        pkg_dir = path / cpv
+        pkg_dir.mkdir(parents=True)
+        for key, value in data.items():
+            (pkg_dir / key).write_text(value + "\n")
+        return pkg_dir
+
+    def test_get(self, tmp_path):
+        pkg_dir = self.mk_pkg(tmp_path / "vdb", "cat/pkg-1", SLOT="0", EAPI="8")
+        cache = metadata_cache(str(tmp_path / "cache"))
+        assert cache.get("cat/pkg-1", str(pkg_dir), "SLOT") == "0"
+        assert cache.get("cat/pkg-1", str(pkg_dir), "EAPI") == "8"
+        with pytest.raises(KeyError):
+            cache.get("cat/pkg-1", str(pkg_dir), "RDEPEND")
+
+    def test_persistence(self, tmp_path):
+        pkg_dir = self.mk_pkg(tmp_path / "vdb", "cat/pkg-1", SLOT="0")
+        cache = metadata_cache(str(tmp_path / "cache"))
+        assert cache.get("cat/pkg-1", str(pkg_dir), "SLOT") == "0"
+        cache.commit()
+        assert os.path.exists(cache.path)
+
+        # cached values are used while the pkg dir is unchanged
+        (pkg_dir / "SLOT").write_text("1\n")
+        st = os.stat(pkg_dir)
+        os.utime(pkg_dir, ns=(st.st_atime_ns, st.st_mtime_ns))
+        cache = metadata_cache(str(tmp_path / "cache"))
+        assert cache.get("cat/pkg-1", str(pkg_dir), "SLOT") == "0"
+
+        # and refreshed when it changes
+        os.utime(pkg_dir, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        cache = metadata_cache(str(tmp_path / "cache"))
+        assert cache.get("cat/pkg-1", str(pkg_dir), "SLOT") == "1"
+
+    def test_remove(self, tmp_path):
+        pkg_dir = self.mk_pkg(tmp_path / "vdb", "cat/pkg-1", SLOT="0")
+        cache = metadata_cache(str(tmp_path / "cache"))
+        cache.get("cat/pkg-1", str(pkg_dir), "SLOT")
+        cache.commit()
+        cache.remove("cat/pkg-1")
+        cache.commit()
+        assert metadata_cache(str(tmp_path / "cache")).entries == {}
+
+    def test_prune(self, tmp_path):
+        vdb = tmp_path / "vdb"
+        pkg_dirs = [
+            self.mk_pkg(vdb, cpv, SLOT="0")
+            for cpv in ("cat/pkg-1", "cat/pkg-2", "other/pkg-1")
+        ]
+        cache = metadata_cache(str(tmp_path / "cache"), str(vdb))
+        for pkg_dir in pkg_dirs:
+            cache.get(os.path.relpath(pkg_dir, vdb), str(pkg_dir), "SLOT")
+        cache.commit()
+
+        # pkgs removed or moved by other package managers are dropped on load
+        shutil.rmtree(pkg_dirs[1])
+        shutil.rmtree(vdb / "other")
+        cache = metadata_cache(str(tmp_path / "cache"), str(vdb))
+        assert list(cache.entries) == ["cat/pkg-1"]
+        cache.commit()
+        assert list(metadata_cache(str(tmp_path / "cache")).entries) == ["cat/pkg-1"]
+
+    def test_get_missing(self, tmp_path):
+        pkg_dir = self.mk_pkg(tmp_path / "vdb", "cat/pkg-1", SLOT="0")
+        cache = metadata_cache(str(tmp_path / "cache"))
+        cache.get("cat/pkg-1", str(pkg_dir), "SLOT")
+        cache.commit()
+        cache = metadata_cache(str(tmp_path / "cache"))
+        shutil.rmtree(pkg_dir)
+        with pytest.raises(KeyError):
+            cache.get("cat/pkg-1", str(pkg_dir), "SLOT")
+        assert cache.entries == {}
+
+    def test_corrupt(self, tmp_path):
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        (cache_dir / metadata_cache.filename).write_text("{")
+        assert metadata_cache(str(cache_dir)).entries == {}
+
+    def test_unwritable(self, tmp_path):
+        pkg_dir = self.mk_pkg(tmp_path / "vdb", "cat/pkg-1", SLOT="0")
+        (tmp_path / "file").touch()
+        cache = metadata_cache(str(tmp_path / "file" / "cache"))
+        cache.get("cat/pkg-1", str(pkg_dir), "SLOT")
+        # failures are ignored
+        cache.commit()
+
+    def test_vdb(self, tmp_path):
+        self.mk_pkg(
+            tmp_path / "vdb",
+            "cat/pkg-1",
+            SLOT="0",
+            EAPI="8",
+            RDEPEND="dev-libs/foo",
+            repository="gentoo",
+        )
+        repo = ondisk.tree(
+            str(tmp_path / "vdb"), cache_location=str(tmp_path / "cache")
+        )
+        pkg = repo.match(atom("cat/pkg"))[0]
+        assert pkg.slot == "0"
+        assert pkg.source_repository == "gentoo"
+        assert str(pkg.rdepend) == "dev-libs/foo"
+        assert "cat/pkg-1" in repo._metadata_cache.entries
+
+        repo = ondisk.tree(str(tmp_path / "vdb"), disable_cache=True)
+        assert repo._metadata_cache is None
+        assert repo.match(atom("cat/pkg"))[0].slot == "0"
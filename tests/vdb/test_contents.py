@@ -0,0 +1,126 @@
+import pytest
+
+from pkgcore.fs import fs
+from pkgcore.fs.contents import contentsSet
+from pkgcore.vdb.contents import ContentsFile
+
+CONTENTS = """\
+dir /usr
+dir /usr/bin
+obj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1234
+obj /usr/bin/with space 00000000000000000000000000000001 5
+sym /usr/bin/bar -> foo 1234
+sym /usr/lib/a link -> ../bin/with space 7
+fif /usr/fifo
+"""
+
+
+def mk_contents(tmp_path, data=CONTENTS):
+    path = tmp_path / "CONTENTS"
+    path.write_text(data)
+    return str(path)
+
+
+def expected():
+    return contentsSet(
+        [
+            fs.fsDir("/usr", strict=False),
+            fs.fsDir("/usr/bin", strict=False),
+            fs.fsFile(
+                "/usr/bin/foo",
+                chksums={"md5": 0xD41D8CD98F00B204E9800998ECF8427E},
+                mtime=1234,
+                strict=False,
+            ),
+            fs.fsFile("/usr/bin/with space", chksums={"md5": 1}, mtime=5, strict=False),
+            fs.fsLink("/usr/bin/bar", "foo", mtime=1234, strict=False),
+            fs.fsLink("/usr/lib/a link", "../bin/with space", mtime=7, strict=False),
+            fs.fsFifo("/usr/fifo", strict=False),
+        ]
+    )
+
+
+class TestContentsFile:
+    def test_parse(self, tmp_path):
+        cset = ContentsFile(mk_contents(tmp_path))
+        assert len(cset) == 7
+        assert sorted(cset) == sorted(expected())
+        foo = cset["/usr/bin/foo"]
+        assert foo.is_reg
+        assert foo.chksums["md5"] == 0xD41D8CD98F00B204E9800998ECF8427E
+        assert foo.mtime == 1234
+        link = cset["/usr/lib/a link"]
+        assert link.target == "../bin/with space"
+        assert link.mtime == 7
+        assert "/usr/bin/with space" in cset
+        assert "/usr/bin//foo" in cset
+        assert "/usr/bin/missing" not in cset
+        assert fs.fsDir("/usr/bin", strict=False) in cset
+
+    def test_lazy(self, tmp_path):
+        path = mk_contents(tmp_path, "bogus /foo\n")
+        cset = ContentsFile(path)
+        with pytest.raises(ValueError):
+            len(cset)
+
+    def test_type_iteration(self, tmp_path):
+        cset = ContentsFile(mk_contents(tmp_path))
+        orig = expected()
+        for attr in ("files", "dirs", "symlinks", "fifos", "devs"):
+            for invert in (False, True):
+                assert sorted(getattr(cset, attr)(invert=invert)) == sorted(
+                    getattr(orig, attr)(invert=invert)
+                )
+
+    def test_mutation(self, tmp_path):
+        cset = ContentsFile(mk_contents(tmp_path), mutable=True)
+        cset.remove("/usr/fifo")
+        cset.discard(fs.fsDir("/usr", strict=False))
+        new = fs.fsFile("/usr/bin/new", chksums={"md5": 2}, mtime=1, strict=False)
+        cset.add(new)
+        assert len(cset) == 6
+        assert cset["/usr/bin/new"] is new
+        assert "/usr/fifo" not in cset
+        assert "/usr" not in cset
+
+    @pytest.mark.parametrize(
+        ("old", "new"), (("/", "/image"), ("/usr", "/opt"), ("/usr/bin", "/"))
+    )
+    def test_change_offset(self, tmp_path, old, new):
+        cset = ContentsFile(mk_contents(tmp_path), mutable=True)
+        cset.add(fs.fsDir("/usr/bin/sub", strict=False))
+        orig = contentsSet(cset)
+        changed = cset.change_offset(old, new)
+        assert isinstance(changed, ContentsFile)
+        expected_cset = orig.change_offset(old, new)
+        assert sorted(x.location for x in changed) == sorted(
+            x.location for x in expected_cset
+        )
+        for obj in expected_cset:
+            assert changed[obj.location].__class__ is obj.__class__
+        assert sorted(cset.insert_offset("/image")) == sorted(
+            orig.insert_offset("/image")
+        )
+
+    def test_write(self, tmp_path):
+        cset = ContentsFile(mk_contents(tmp_path), mutable=True)
+        cset.add(fs.fsDir("/etc", strict=False))
+        cset.flush()
+        reread = ContentsFile(str(tmp_path / "CONTENTS"))
+        assert sorted(reread) == sorted(cset)
+        assert reread["/usr/bin/foo"].chksums == cset["/usr/bin/foo"].chksums
+        lines = (tmp_path / "CONTENTS").read_text().splitlines()
+        # entries are written sorted by location
+        assert lines[:4] == [
+            "dir /etc",
+            "dir /usr",
+            "dir /usr/bin",
+            "sym /usr/bin/bar -> foo 1234",
+        ]
+        assert "sym /usr/lib/a link -> ../bin/with space 7" in lines
+
+    def test_clone(self, tmp_path):
+        cset = ContentsFile(mk_contents(tmp_path))
+        clone = cset.clone()
+        assert sorted(clone) == sorted(cset)
+        assert not cset.clone(empty=True)
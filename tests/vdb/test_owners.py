@@ -0,0 +1,85 @@
+import os
+
+from pkgcore.vdb import ondisk
+from pkgcore.vdb.owners import owners_index
+
+
+class TestOwnersIndex:
+    def mk_pkg(self, vdb, cpv, *paths):
+        pkg_dir = vdb / cpv
+        pkg_dir.mkdir(parents=True, exist_ok=True)
+        lines = []
+        for path in paths:
+            if path.endswith("/"):
+                lines.append(f"dir {path.rstrip('/')}")
+            else:
+                lines.append(f"obj {path} d41d8cd98f00b204e9800998ecf8427e 1")
+        (pkg_dir / "CONTENTS").write_text("".join(f"{x}\n" for x in lines))
+        return pkg_dir
+
+    def test_sync(self, tmp_path):
+        vdb = tmp_path / "vdb"
+        self.mk_pkg(vdb, "cat/a-1", "/usr/", "/usr/bin/a")
+        self.mk_pkg(vdb, "cat/b-1", "/usr/", "/usr/bin/b")
+        self.mk_pkg(vdb, "cat/.tmp.c-1", "/usr/bin/c")
+        index = owners_index(str(tmp_path / "cache"), str(vdb))
+        assert index.sync()
+        assert len(index) == 2
+        assert index.owners(["/usr", "/usr/bin/a", "/usr/bin/c"]) == {
+            "/usr": {"cat/a-1", "cat/b-1"},
+            "/usr/bin/a": {"cat/a-1"},
+        }
+        assert index.owners_re(r"bin/[ab]$") == {"cat/a-1", "cat/b-1"}
+        assert index.owners_re(r"^/etc") == set()
+
+    def test_reconcile(self, tmp_path):
+        vdb = tmp_path / "vdb"
+        pkg_dir = self.mk_pkg(vdb, "cat/a-1", "/usr/bin/a")
+        self.mk_pkg(vdb, "cat/b-1", "/usr/bin/b")
+        index = owners_index(str(tmp_path / "cache"), str(vdb))
+        assert index.sync()
+        index.close()
+
+        # changes made outside of pkgcore are picked up on next use
+        (vdb / "cat/b-1/CONTENTS").unlink()
+        (vdb / "cat/b-1").rmdir()
+        self.mk_pkg(vdb, "cat/a-1", "/usr/bin/a2")
+        st = os.stat(pkg_dir / "CONTENTS")
+        os.utime(pkg_dir / "CONTENTS", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        index = owners_index(str(tmp_path / "cache"), str(vdb))
+        assert index.sync()
+        assert index.owners(["/usr/bin/a", "/usr/bin/a2", "/usr/bin/b"]) == {
+            "/usr/bin/a2": {"cat/a-1"}
+        }
+
+    def test_add_remove(self, tmp_path):
+        vdb = tmp_path / "vdb"
+        self.mk_pkg(vdb, "cat/a-1", "/usr/bin/a")
+        index = owners_index(str(tmp_path / "cache"), str(vdb))
+        assert index.sync()
+        self.mk_pkg(vdb, "cat/b-1", "/usr/bin/b")
+        index.add("cat/b-1", ["/usr/bin/b"])
+        assert index.owners(["/usr/bin/b"]) == {"/usr/bin/b": {"cat/b-1"}}
+        index.remove("cat/a-1")
+        assert index.owners(["/usr/bin/a"]) == {}
+        assert len(index) == 1
+
+    def test_rebuild(self, tmp_path):
+        vdb = tmp_path / "vdb"
+        self.mk_pkg(vdb, "cat/a-1", "/usr/bin/a")
+        index = owners_index(str(tmp_path / "cache"), str(vdb))
+        index.add("cat/a-1", ["/bogus"])
+        assert index.rebuild()
+        assert index.owners(["/bogus", "/usr/bin/a"]) == {"/usr/bin/a": {"cat/a-1"}}
+
+    def test_unusable(self, tmp_path):
+        (tmp_path / "file").touch()
+        index = owners_index(str(tmp_path / "file" / "cache"), str(tmp_path))
+        assert not index.sync()
+
+    def test_vdb(self, tmp_path):
+        vdb = tmp_path / "vdb"
+        self.mk_pkg(vdb, "cat/a-1", "/usr/bin/a")
+        repo = ondisk.tree(str(vdb), cache_location=str(tmp_path / "cache"))
+        assert repo.owners.owners(["/usr/bin/a"]) == {"/usr/bin/a": {"cat/a-1"}}
+        assert ondisk.tree(str(vdb), disable_cache=True).owners is None